@@ -0,0 +1,420 @@
+"""
+End to end benchmark of `PingLoggerController`: NMEA streamed into a pseudo-terminal opened by the
+real `GpsClient` (pyserial) and pings fired on the simulated relay backend. No hardware needed (Linux/macOS).
+
+Usage:
+    python benchmarks/bench_controller_stack.py [--rate 20] [--duration 30] [--ping-interval 1]
+        [--nmea capture.nmea] [--relay-latency 0.002] [--json results.json] [--baseline results.json]
+
+`--rate` is the GPS epochs per second (an epoch: RMC, GGA and HDT when synthetic, or the sentences
+from one RMC to the next of `--nmea`, replayed in a loop). `--rate 0` writes as fast as the pty
+takes them, to find the maximum throughput.
+
+Reported:
+ + NMEA throughput: sentences written to the pty and handled by the GPS thread per second.
+ + Fix latency: sentence written to the pty -> `FixEvent` published; track writer hand-off (fix -> written).
+ + Ping latency: relays closed -> record handed off to the writer; writer hand-off (-> written and flushed).
+ + Scheduler: lateness vs the deadlines and interval jitter between consecutive pings.
+ + CPU seconds per thread (from /proc, Linux only) and for the whole process.
+
+With `--baseline`, exits with 1 if a p50 latency or the CPU per thread got worse by more than `--tolerance`.
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+import datetime
+import tempfile
+import threading
+import statistics
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from hydrophone_ping_gps_logger import nmea, metrics, stats
+from hydrophone_ping_gps_logger.relay import RelayBackendType
+from hydrophone_ping_gps_logger.events import FixEvent, PingEvent
+from hydrophone_ping_gps_logger.pingloggercontroller import PingLoggerController, PingRunParameters
+
+ROOT = Path(__file__).resolve().parents[1]
+
+START_LATITUDE = 48.640953
+START_LONGITUDE = -68.157018
+SPEED = 4.  # m/s
+COURSE = 45.  # degrees
+EARTH_RADIUS = 6371000.  # m
+
+GPS_CONNECT_TIMEOUT = 5  # seconds
+CPU_SAMPLE_INTERVAL = 0.2  # seconds
+
+
+def with_checksum(body: str) -> str:
+    return f"${body}*{nmea.nmea_checksum(body.encode()):02X}\r\n"
+
+
+def synthetic_epochs(rate: float):
+    """Yields [sentences] of a vessel moving at `SPEED` on `COURSE`, one epoch per 1 / `rate` seconds of GPS time."""
+    interval = 1 / rate if rate else 0.05
+    start = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    n = 0
+    while True:
+        gps_time = datetime.datetime.fromtimestamp(start + n * interval, datetime.timezone.utc)
+        distance = SPEED * n * interval
+        latitude = START_LATITUDE + math.degrees(distance * math.cos(math.radians(COURSE)) / EARTH_RADIUS)
+        longitude = START_LONGITUDE + math.degrees(
+            distance * math.sin(math.radians(COURSE)) / (EARTH_RADIUS * math.cos(math.radians(latitude))))
+        latitude_text, latitude_direction = nmea.degrees_to_nmea(latitude, True, 5).split(" ")
+        longitude_text, longitude_direction = nmea.degrees_to_nmea(longitude, False, 5).split(" ")
+        timestamp = gps_time.strftime("%H%M%S.") + f"{gps_time.microsecond // 10000:02d}"
+        yield [
+            with_checksum(f"GNRMC,{timestamp},A,{latitude_text},{latitude_direction},{longitude_text},"
+                          f"{longitude_direction},{SPEED * 1.943844:.3f},{COURSE:.2f},{gps_time:%d%m%y},,,A,V"),
+            with_checksum(f"GNGGA,{timestamp},{latitude_text},{latitude_direction},{longitude_text},"
+                          f"{longitude_direction},1,12,0.61,12.3,M,-22.1,M,,"),
+            with_checksum(f"GPHDT,{COURSE + 2.5:.2f},T"),
+        ]
+        n += 1
+
+
+def recorded_epochs(path: str):
+    """Yields [sentences] from a capture file (one sentence per line), split before each RMC, in a loop."""
+    sentences = [line.strip() + "\r\n" for line in Path(path).read_text(errors="replace").splitlines()
+                 if line.startswith("$")]
+    if not sentences:
+        raise ValueError(f"No NMEA sentence in {path}")
+    epochs, epoch = [], []
+    for sentence in sentences:
+        if sentence[3:6] == "RMC" and epoch:
+            epochs.append(epoch)
+            epoch = []
+        epoch.append(sentence)
+    epochs.append(epoch)
+    while True:
+        yield from epochs
+
+
+def rmc_gps_time(sentence: str) -> float:
+    """:return: GPS time (epoch seconds) of a valid RMC, as `GpsController` computes it. None otherwise."""
+    try:
+        msg = nmea.decode(sentence.strip())
+    except nmea.NmeaDecodeError:
+        return None
+    if msg is None or msg.sentence_type != "RMC" or msg.status != "A" or not msg.date:
+        return None
+    return round(datetime.datetime.fromisoformat(f"{msg.date}T{msg.time}").timestamp(), 3)
+
+
+class PtyGps:
+    """Pseudo-terminal whose slave end is opened by `GpsClient`, fed by a thread at `rate` epochs per second."""
+
+    def __init__(self, epochs, rate: float):
+        self.master, self.slave = os.openpty()
+        self.port = os.ttyname(self.slave)
+        self.epochs = epochs
+        self.rate = rate
+
+        self.sentence_count = 0
+        self.byte_count = 0
+        self.rmc_write_times = {}  # {gps time: time.monotonic() when written}
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread: threading.Thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="pty_gps", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        start = time.monotonic()
+        for n, epoch in enumerate(self.epochs):
+            if not self.running:
+                break
+            if self.rate:
+                delay = start + n / self.rate - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            data = "".join(epoch).encode()
+            gps_time = rmc_gps_time(epoch[0]) if epoch[0][3:6] == "RMC" else None
+            if gps_time is not None:  # before the write: the GPS thread can handle it before `write` returns.
+                with self.lock:
+                    self.rmc_write_times[gps_time] = time.monotonic()
+            try:
+                os.write(self.master, data)  # blocks when the pty buffer is full (GPS thread behind).
+            except OSError:
+                break
+            self.sentence_count += len(epoch)
+            self.byte_count += len(data)
+
+    def pop_write_time(self, gps_time: float) -> float:
+        with self.lock:
+            return self.rmc_write_times.pop(round(gps_time, 3), None)
+
+    def stop(self):
+        self.running = False
+        os.close(self.master)  # unblocks a pending write.
+        if self.thread is not None:
+            self.thread.join()
+        os.close(self.slave)
+
+
+def thread_cpu_ticks() -> dict:
+    """:return: {native thread id: user + system clock ticks} of this process. Empty without /proc."""
+    ticks = {}
+    try:
+        task_ids = os.listdir("/proc/self/task")
+    except OSError:
+        return ticks
+    for task_id in task_ids:
+        try:
+            with open(f"/proc/self/task/{task_id}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue  # thread ended
+        ticks[int(task_id)] = int(fields[11]) + int(fields[12])  # utime, stime
+    return ticks
+
+
+class ThreadCpuSampler:
+    """Samples the CPU time of every thread until stopped, so short lived threads are accounted for too."""
+
+    def __init__(self, interval: float = CPU_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.initial = {}
+        self.last = {}  # {native id: ticks}
+        self.names = {}  # {native id: thread name}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="cpu_sampler", daemon=True)
+
+    def start(self):
+        self.initial = thread_cpu_ticks()
+        self.thread.start()
+
+    def _sample(self):
+        for thread in threading.enumerate():
+            if thread.native_id is not None:
+                self.names[thread.native_id] = thread.name
+        self.last.update(thread_cpu_ticks())
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+
+    def stop(self) -> dict:
+        """:return: {thread name: CPU seconds}, threads of the same kind (e.g. timers) summed."""
+        self.stop_event.set()
+        self.thread.join()
+        self._sample()
+        tick = os.sysconf("SC_CLK_TCK")
+        seconds = {}
+        for native_id, ticks in self.last.items():
+            name = re.sub(r"^Thread-\d+", "Thread", self.names.get(native_id, f"tid {native_id}"))
+            used = (ticks - self.initial.get(native_id, 0)) / tick
+            seconds[name] = seconds.get(name, 0) + used
+        return dict(sorted(seconds.items(), key=lambda item: item[1], reverse=True))
+
+
+def summarize(values: list) -> dict:
+    """:return: count, p50, p99 and max of `values` (seconds) in milliseconds."""
+    return from_rolling(stats.summarize(values))
+
+
+def from_rolling(summary: dict) -> dict:
+    """`RollingStatistics.summary` (seconds) in milliseconds."""
+    return {"count": summary["count"],
+            **{f"{key}_ms": summary[key] * 1e3 for key in ("p50", "p99", "max") if summary["count"]}}
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    epochs = recorded_epochs(args.nmea) if args.nmea else synthetic_epochs(args.rate)
+    pty_gps = PtyGps(epochs, args.rate)
+    controller = PingLoggerController()
+
+    fix_latencies, ping_events = [], []
+
+    def on_event(event):
+        if isinstance(event, FixEvent) and event.fix is not None:
+            write_time = pty_gps.pop_write_time(event.fix.gps_time)
+            if write_time is not None:
+                fix_latencies.append(event.time - write_time)
+        elif isinstance(event, PingEvent):
+            ping_events.append(event)
+
+    controller.events.subscribe_callback(on_event, (FixEvent, PingEvent))
+
+    output_directory = tempfile.mkdtemp(prefix="bench_controller_stack_")
+    sampler = ThreadCpuSampler()
+    sentences_before = sum(child.value for _, child in metrics.NMEA_SENTENCES.samples())
+    try:
+        controller.transponder_controller.pulse_width = min(args.pulse_width, args.ping_interval / 2)
+        controller.transponder_controller.connect(backend=RelayBackendType.SIMULATED)
+        controller.transponder_controller.client.device.latency = args.relay_latency
+
+        pty_gps.start()
+        controller.connect_gps(port=pty_gps.port, baudrate=args.baudrate)
+        deadline = time.monotonic() + GPS_CONNECT_TIMEOUT
+        while not controller.gps_controller.is_running and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not controller.gps_controller.is_running:
+            raise RuntimeError(f"GPS client could not read the pty {pty_gps.port}")
+        time.sleep(1)  # fix history filled for the interpolation of the first pings.
+
+        fix_latencies.clear()
+        sentences_start = sum(child.value for _, child in metrics.NMEA_SENTENCES.samples())
+        written_start = pty_gps.sentence_count
+        cpu_start, start = os.times(), time.monotonic()
+        sampler.start()
+
+        controller.start_ping_run(PingRunParameters(
+            output_directory_path=output_directory,
+            ship_name="bench",
+            transponder_depth=0,
+            ping_interval=args.ping_interval,
+            number_of_pings=max(int(args.duration / args.ping_interval), 1),
+            start_delay_seconds=0,
+            track_log=not args.no_track,
+        ))
+        if not controller.is_running:
+            raise RuntimeError("Ping run not started")
+        track_logger = controller.track_logger  # detached from the controller at the end of the run.
+        controller.ping_run_thread.join()
+
+        duration = time.monotonic() - start
+        cpu_end = os.times()
+        threads_cpu = sampler.stop()
+        sentences_handled = sum(child.value for _, child in metrics.NMEA_SENTENCES.samples()) - sentences_start
+        sentences_written = pty_gps.sentence_count - written_start
+    finally:
+        controller.stop_all()
+        pty_gps.stop()
+
+    ping_to_submit = [event.time - event.ping_time for event in ping_events]
+    ping_times = [event.ping_time for event in ping_events]
+    jitter = [b - a - args.ping_interval for a, b in zip(ping_times, ping_times[1:])]
+    scheduler = controller.scheduler
+
+    return {
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("json", "baseline")},
+        "duration_s": duration,
+        "nmea": {
+            "sentences_written": sentences_written,
+            "sentences_handled": sentences_handled,
+            "written_per_s": sentences_written / duration,
+            "handled_per_s": sentences_handled / duration,
+            "sentences_total_before_run": sentences_before,
+        },
+        "fix_latency": summarize(fix_latencies),
+        "track_writer_handoff": (from_rolling(track_logger.writer.handoff_latency.summary())
+                                 if track_logger is not None else {"count": 0}),
+        "ping": {
+            "count": len(ping_events),
+            "skipped": scheduler.skipped_count,
+            "to_submit": summarize(ping_to_submit),
+            "writer_handoff": from_rolling(controller.ping_writer.handoff_latency.summary()),
+            "relay": {name: from_rolling(summary)
+                      for name, summary in controller.transponder_controller.client.latency_summary().items()},
+        },
+        "scheduler": {
+            "lateness": from_rolling(scheduler.errors.summary()),
+            "interval_jitter": {**summarize([abs(j) for j in jitter]),
+                                "stdev_ms": statistics.pstdev(jitter) * 1e3 if jitter else None},
+        },
+        "cpu_s": {
+            "process": (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system),
+            "threads": threads_cpu,
+        },
+    }
+
+
+def git_commit() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """:return: Regressions as text."""
+    regressions = []
+    for path in (("fix_latency",), ("ping", "to_submit"), ("ping", "writer_handoff"), ("scheduler", "lateness")):
+        result, previous = results, baseline
+        for key in path:
+            result, previous = result.get(key, {}), previous.get(key, {})
+        if "p50_ms" in result and "p50_ms" in previous and result["p50_ms"] > previous["p50_ms"] * tolerance:
+            regressions.append(f"{'.'.join(path)} p50: {result['p50_ms']:.3f} > {previous['p50_ms']:.3f} ms x {tolerance}")
+
+    previous_threads = baseline.get("cpu_s", {}).get("threads", {})
+    for name, seconds in results["cpu_s"]["threads"].items():
+        if name in previous_threads and seconds > max(previous_threads[name], 0.01) * tolerance:
+            regressions.append(f"CPU {name}: {seconds:.2f} > {previous_threads[name]:.2f} s x {tolerance}")
+    return regressions
+
+
+def print_latency(name: str, summary: dict):
+    if not summary.get("count"):
+        print(f"  {name:26} -")
+        return
+    print(f"  {name:26} p50 {summary['p50_ms']:8.3f} ms, p99 {summary['p99_ms']:8.3f} ms, "
+          f"max {summary['max_ms']:8.3f} ms ({summary['count']})")
+
+
+def print_results(results: dict):
+    nmea_results = results["nmea"]
+    print(f"NMEA: {nmea_results['handled_per_s']:.0f} sentences/s handled, "
+          f"{nmea_results['written_per_s']:.0f} written ({results['duration_s']:.1f} s)")
+    print("Latency:")
+    print_latency("fix (pty -> event)", results["fix_latency"])
+    print_latency("track writer hand-off", results["track_writer_handoff"])
+    print_latency("ping -> record submitted", results["ping"]["to_submit"])
+    print_latency("ping writer hand-off", results["ping"]["writer_handoff"])
+    print_latency("relay write", results["ping"]["relay"]["write"])
+    print_latency("relay read", results["ping"]["relay"]["read"])
+    print(f"Scheduler: {results['ping']['count']} pings, {results['ping']['skipped']} skipped")
+    print_latency("lateness", results["scheduler"]["lateness"])
+    print_latency("interval jitter", results["scheduler"]["interval_jitter"])
+    print(f"CPU: {results['cpu_s']['process']:.2f} s process")
+    for name, seconds in results["cpu_s"]["threads"].items():
+        print(f"  {name:26} {seconds:6.2f} s")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=20, help="GPS epochs per second, 0: as fast as possible")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of ping run")
+    parser.add_argument("--ping-interval", type=float, default=1)
+    parser.add_argument("--pulse-width", type=float, default=0.05, help="seconds, at most half the ping interval")
+    parser.add_argument("--relay-latency", type=float, default=0.002, help="seconds per simulated USB transaction")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--nmea", help="capture file (one sentence per line) replayed instead of synthetic epochs")
+    parser.add_argument("--no-track", action="store_true", help="don't log the track")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown vs the baseline")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "openpty"):
+        print("Pseudo-terminals not available on this platform")
+        return 2
+
+    results = run_benchmark(args)
+    results["commit"] = git_commit()
+    print_results(results)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("parameters") != results["parameters"]:
+            print(f"Baseline run with other parameters: {baseline.get('parameters')}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
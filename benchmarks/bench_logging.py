@@ -0,0 +1,130 @@
+"""
+Cost of logging for the thread that logs (GPS, ping): DEBUG calls on the hot path with DEBUG
+disabled, and records actually written through a slow handler, directly vs through `logsetup`.
+
+Usage:
+    python benchmarks/bench_logging.py [--iterations 200000] [--handler-delay 0.001] [--json results.json]
+
+`--handler-delay` is the seconds each write takes in the slow handler (a stalled console or disk).
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from hydrophone_ping_gps_logger import logsetup, stats
+
+CLIENT_NAME = "GPS"
+SENTENCE = "$GPRMC,123554,A,4838.4572,N,06809.4211,W,007.5,045.2,240424,017.4,W,A*1A"
+HANDLER_RECORDS = 200
+
+
+class SlowStream:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+
+    def flush(self):
+        pass
+
+
+def eager_fstring():
+    logging.debug(f"[{CLIENT_NAME}] Serial input buffer: {SENTENCE}")
+
+
+def lazy_arguments():
+    logging.debug("[%s] Serial input buffer: %s", CLIENT_NAME, SENTENCE)
+
+
+def level_guarded():
+    if logging.root.isEnabledFor(logging.DEBUG):
+        logging.debug("[%s] Serial input buffer: %s", CLIENT_NAME, SENTENCE)
+
+
+def no_logging():
+    pass
+
+
+def time_call(function, iterations: int) -> float:
+    """:return: Nanoseconds per call."""
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def bench_disabled(iterations: int) -> dict:
+    """DEBUG calls with the root logger at INFO: nothing is written."""
+    logging.getLogger().setLevel(logging.INFO)
+    baseline = min(time_call(no_logging, iterations) for _ in range(3))
+    results = {}
+    for function in (eager_fstring, lazy_arguments, level_guarded):
+        per_call = min(time_call(function, iterations) for _ in range(3))
+        results[function.__name__] = {"ns_per_call": per_call, "overhead_ns": per_call - baseline}
+    return results
+
+
+def time_records(records: int) -> dict:
+    """:return: Seconds spent in the logging calls by the logging thread."""
+    times = []
+    for i in range(records):
+        start = time.perf_counter()
+        logging.info("Ping %d written", i)
+        times.append(time.perf_counter() - start)
+    summary = stats.summarize(times)
+    return {f"{key}_us": summary[key] * 1e6 for key in ("p50", "p99", "max")}
+
+
+def bench_slow_handler(delay: float) -> dict:
+    """INFO records written to a stream that takes `delay` seconds per write."""
+    root = logging.getLogger()
+
+    handler = logging.StreamHandler(SlowStream(delay))
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    direct = time_records(HANDLER_RECORDS)
+    root.removeHandler(handler)
+
+    logsetup.start_logging(logging.INFO, console=False)
+    logsetup.add_handler(logging.StreamHandler(SlowStream(delay)))
+    queued = time_records(HANDLER_RECORDS)
+    logsetup.stop_logging()
+    return {"direct": direct, "queued": queued}
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--handler-delay", type=float, default=0.001)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.NullHandler())  # else the first `logging.debug` call adds a console handler.
+
+    results = {"debug_disabled": bench_disabled(args.iterations)}
+    print("DEBUG call, DEBUG disabled:")
+    for name, result in results["debug_disabled"].items():
+        print(f"    {name:16} {result['ns_per_call']:7.1f} ns/call ({result['overhead_ns']:+.1f} ns vs no call)")
+
+    results["slow_handler"] = bench_slow_handler(args.handler_delay)
+    print(f"INFO record, handler taking {args.handler_delay * 1e3:g} ms per write (time in the logging thread):")
+    for name, result in results["slow_handler"].items():
+        print(f"    {name:16} p50 {result['p50_us']:8.1f} us, p99 {result['p99_us']:8.1f} us, "
+              f"max {result['max_us']:8.1f} us")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Sentences/second handled by `GpsController` from a serial port (pty), UDP datagrams and a TCP stream.
+
+Usage:
+    python benchmarks/bench_netgps.py [--epochs 20000] [--rate 0] [--transport serial udp tcp]
+
+Each epoch is the Garmin 19x HVS sentence mix of `bench_nmea_decoder.py` (one datagram per epoch
+for UDP). `--rate 0` sends as fast as the transport accepts: serial and TCP slow the sender down to the
+pace of the GPS thread, UDP has no such backpressure and drops the datagrams the socket receive
+buffer can't hold, reported as `lost`.
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from hydrophone_ping_gps_logger.gps import GpsController, GpsClient
+from hydrophone_ping_gps_logger.netgps import UdpGpsClient, TcpGpsClient
+from bench_nmea_decoder import GARMIN_19XHVS_STREAM, with_valid_checksum
+
+EPOCH = "".join(with_valid_checksum(s) + "\r\n" for s in GARMIN_19XHVS_STREAM).encode()
+SENTENCES_PER_EPOCH = len(GARMIN_19XHVS_STREAM)
+
+
+class CountingGpsController(GpsController):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.done = threading.Event()
+        self.expected = None
+        self.last_time: float = None  # time.perf_counter() of the last sentence handled.
+
+    def process_sentence(self, nmea_string: str):
+        super().process_sentence(nmea_string)
+        self.count += 1
+        self.last_time = time.perf_counter()
+        if self.count == self.expected:
+            self.done.set()
+
+
+def _pace(n: int, start: float, rate: float):
+    if rate:
+        delay = start + n / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def serial_source(epochs: int, rate: float):
+    master, slave = os.openpty()
+    client = GpsClient(port=os.ttyname(slave), baudrate=4800)
+
+    def feed():
+        start = time.monotonic()
+        for n in range(epochs):
+            _pace(n, start, rate)
+            os.write(master, EPOCH)
+
+    return client, feed, lambda: (os.close(master), os.close(slave))
+
+
+def udp_source(epochs: int, rate: float):
+    client = UdpGpsClient("127.0.0.1", 0)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def feed():
+        address = client.socket.getsockname()
+        start = time.monotonic()
+        for n in range(epochs):
+            _pace(n, start, rate)
+            sender.sendto(EPOCH, address)
+
+    return client, feed, sender.close
+
+
+def tcp_source(epochs: int, rate: float):
+    server = socket.create_server(("127.0.0.1", 0))
+    client = TcpGpsClient("127.0.0.1", server.getsockname()[1])
+
+    def feed():
+        connection, _ = server.accept()
+        start = time.monotonic()
+        for n in range(epochs):
+            _pace(n, start, rate)
+            connection.sendall(EPOCH)
+        connection.close()
+
+    return client, feed, server.close
+
+
+SOURCES = {"serial": serial_source, "udp": udp_source, "tcp": tcp_source}
+
+
+def run(transport: str, epochs: int, rate: float) -> dict:
+    client, feed, close = SOURCES[transport](epochs, rate)
+    controller = CountingGpsController()
+    controller.expected = epochs * SENTENCES_PER_EPOCH
+    controller.connect_client(client)
+    if not controller.is_connected:
+        raise RuntimeError(f"{transport}: client not connected")
+    time.sleep(0.2)  # `GpsClient.connect` drops the first line: start clean.
+    controller.count = 0
+
+    start = time.perf_counter()
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    feeder.join()
+    controller.done.wait(timeout=1 + epochs / 1000)  # lost UDP datagrams: never all handled.
+    elapsed = (controller.last_time or time.perf_counter()) - start
+    controller.disconnect()
+    close()
+    return {
+        "transport": transport,
+        "sentences": controller.count,
+        "lost": controller.expected - controller.count,
+        "seconds": elapsed,
+        "sentences/s": controller.count / elapsed,
+    }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--epochs", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=0, help="epochs per second, 0: as fast as possible")
+    parser.add_argument("--transport", nargs="+", choices=list(SOURCES), default=list(SOURCES))
+    args = parser.parse_args(argv)
+
+    print(f"{'transport':>10} {'sentences':>10} {'lost':>8} {'seconds':>8} {'sentences/s':>12}")
+    for transport in args.transport:
+        result = run(transport, args.epochs, args.rate)
+        print(f"{result['transport']:>10} {result['sentences']:>10} {result['lost']:>8} "
+              f"{result['seconds']:>8.2f} {result['sentences/s']:>12.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Sentences/second of the `nmea` fast path decoder vs `pynmea2.parse`.
+
+Usage:
+    python benchmarks/bench_nmea_decoder.py [capture.nmea ...]
+
+Without arguments, the two streams below are used. They mimic the sentence mix of a
+Garmin 19x HVS (GPS talker + Garmin proprietary) and of a GNSS receiver with a heading
+sensor (mixed talkers); checksums are recomputed. A capture file is one sentence per line.
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import pynmea2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from hydrophone_ping_gps_logger import nmea
+from hydrophone_ping_gps_logger.gps import from_pynmea2
+
+
+GARMIN_19XHVS_STREAM = [
+    "$GPRMC,123554,A,4838.4572,N,06809.4211,W,007.5,045.2,240424,017.4,W,A*1A",
+    "$GPGGA,123554,4838.4572,N,06809.4211,W,1,09,0.9,12.3,M,-22.1,M,,*7C",
+    "$GPGSA,A,3,02,05,12,13,15,18,20,25,29,,,,1.7,0.9,1.4*3A",
+    "$GPGSV,3,1,12,02,40,085,45,05,24,046,41,12,57,273,47,13,18,154,39*79",
+    "$GPGSV,3,2,12,15,66,215,48,18,28,311,42,20,06,118,33,25,34,258,44*73",
+    "$GPGSV,3,3,12,29,70,071,49,30,02,186,00,31,01,341,00,32,01,012,00*76",
+    "$PGRME,2.6,M,3.7,M,4.5,M*2E",
+    "$GPVTG,045.2,T,062.6,M,007.5,N,013.9,K,A*2C",
+]
+
+GNSS_STREAM = [
+    "$GNRMC,123554.50,A,4838.45721,N,06809.42113,W,7.512,45.21,240424,,,A,V*35",
+    "$GPHDT,274.07,T*03",
+    "$GNGGA,123554.50,4838.45721,N,06809.42113,W,1,12,0.61,12.3,M,-22.1,M,,*57",
+    "$GNVTG,45.21,T,,M,7.512,N,13.912,K,A*1F",
+    "$GNGSA,A,3,02,05,12,13,15,18,20,25,29,,,,1.21,0.61,1.05,1*0D",
+    "$GPGSV,3,1,11,02,40,085,45,05,24,046,41,12,57,273,47,13,18,154,39,1*6B",
+    "$GLGSV,2,1,07,65,42,045,44,66,71,312,46,72,19,097,38,74,11,021,34,1*75",
+    "$GNGLL,4838.45721,N,06809.42113,W,123554.50,A,A*6A",
+]
+
+
+def with_valid_checksum(sentence: str) -> str:
+    body = sentence[1:sentence.rindex("*")]
+    return f"${body}*{nmea.nmea_checksum(body.encode()):02X}"
+
+
+def run_fast(sentences: list) -> int:
+    decoded = 0
+    for sentence in sentences:
+        try:
+            if nmea.decode(sentence) is not None:
+                decoded += 1
+        except nmea.NmeaDecodeError:
+            pass
+    return decoded
+
+
+def run_pynmea2(sentences: list) -> int:
+    decoded = 0
+    for sentence in sentences:
+        try:
+            if from_pynmea2(pynmea2.parse(sentence)) is not None:
+                decoded += 1
+        except pynmea2.nmea.ParseError:
+            pass
+    return decoded
+
+
+def check_equivalence(sentences: list) -> int:
+    mismatches = 0
+    for sentence in set(sentences):
+        if nmea.decode(sentence) != from_pynmea2(pynmea2.parse(sentence)):
+            print(f"  mismatch: {sentence}")
+            mismatches += 1
+    return mismatches
+
+
+def bench(name: str, sentences: list, repeat: int = 5):
+    print(f"{name}: {len(sentences)} sentences, {check_equivalence(sentences)} mismatches")
+    for label, func in (("pynmea2", run_pynmea2), ("fast path", run_fast)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(sentences)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {label:>10}: {len(sentences) / best:12,.0f} sentences/s")
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("captures", nargs="*", help="NMEA files, one sentence per line")
+    args = parser.parse_args(argv)
+
+    if args.captures:
+        for path in args.captures:
+            sentences = [line.strip() for line in Path(path).read_text(errors="replace").splitlines() if line.strip()]
+            bench(path, sentences)
+    else:
+        for name, stream in (("Garmin 19x HVS", GARMIN_19XHVS_STREAM), ("GNSS", GNSS_STREAM)):
+            bench(name, [with_valid_checksum(s) for s in stream] * 20000)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
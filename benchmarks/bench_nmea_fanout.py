@@ -0,0 +1,154 @@
+"""
+Cost and latency of the NMEA fan-out for many local consumers.
+
+Usage:
+    python benchmarks/bench_nmea_fanout.py [--tcp-clients 32] [--udp-clients 8] [--slow-clients 1]
+        [--rate 20] [--duration 10] [--queue-size 200]
+
+A thread stands in for the GPS thread: it submits one burst (the Garmin 19x HVS sentence mix of
+`bench_nmea_decoder.py`) every 1/`--rate` seconds. Reported: the time `submit` takes in the GPS
+thread, and the delay from `submit` to the reception of the whole burst, for every client.
+Slow clients connect and never read; they are dropped once their kernel buffers and their
+fan-out queue are full (faster with a higher `--rate`).
+"""
+import sys
+import time
+import socket
+import argparse
+import selectors
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from hydrophone_ping_gps_logger.nmeafanout import NmeaFanout, FANOUT_QUEUE_SIZE
+from bench_nmea_decoder import GARMIN_19XHVS_STREAM, with_valid_checksum
+from bench_controller_stack import summarize
+
+SENTENCES = [with_valid_checksum(s) for s in GARMIN_19XHVS_STREAM]
+BURST_SIZE = len("".join(s + "\r\n" for s in SENTENCES).encode())
+
+
+class Receivers:
+    """Every client socket in one selector thread, bursts counted from the bytes received."""
+
+    def __init__(self, submit_times: list):
+        self.submit_times = submit_times
+        self.selector = selectors.DefaultSelector()
+        self.received = {}  # {socket: bytes received}
+        self.latencies = []
+        self.running = False
+        self.thread: threading.Thread = None
+
+    def add(self, sock: socket.socket):
+        sock.setblocking(False)
+        self.received[sock] = 0
+        self.selector.register(sock, selectors.EVENT_READ)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="receivers", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            for key, _ in self.selector.select(timeout=0.1):
+                sock = key.fileobj
+                try:
+                    data = sock.recv(65536)
+                except OSError:
+                    data = b""
+                now = time.perf_counter()
+                if not data:
+                    self.selector.unregister(sock)
+                    continue
+                before = self.received[sock] // BURST_SIZE
+                self.received[sock] += len(data)
+                for burst in range(before, self.received[sock] // BURST_SIZE):
+                    self.latencies.append(now - self.submit_times[burst])
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    bursts = int(args.rate * args.duration)
+    submit_times = [None] * bursts
+    receivers = Receivers(submit_times)
+
+    udp_sockets = []
+    for _ in range(args.udp_clients):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        udp_sockets.append(sock)
+        receivers.add(sock)
+
+    fanout = NmeaFanout(udp_targets=[s.getsockname() for s in udp_sockets], tcp_port=0,
+                        queue_size=args.queue_size)
+    fanout.start()
+
+    for _ in range(args.tcp_clients):
+        receivers.add(socket.create_connection(("127.0.0.1", fanout.tcp_port)))
+    slow_clients = []
+    for _ in range(args.slow_clients):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.connect(("127.0.0.1", fanout.tcp_port))
+        slow_clients.append(sock)
+    while len(fanout.clients) < args.tcp_clients + args.slow_clients:
+        time.sleep(0.01)
+    receivers.start()
+
+    submit_durations = []
+    start = time.perf_counter()
+    for n in range(bursts):
+        delay = start + n / args.rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        submit_times[n] = time.perf_counter()
+        fanout.submit(SENTENCES)
+        submit_durations.append(time.perf_counter() - submit_times[n])
+    time.sleep(0.5)
+
+    receivers.stop()
+    fanout.stop()
+    for sock in [*udp_sockets, *slow_clients, *receivers.received]:
+        sock.close()
+    expected = bursts * (args.tcp_clients + args.udp_clients)
+    return {
+        "bursts": bursts,
+        "deliveries": len(receivers.latencies),
+        "lost": expected - len(receivers.latencies),
+        "slow_clients_dropped": fanout.dropped_client_count,
+        "bursts_dropped": fanout.dropped_burst_count,
+        "submit": summarize(submit_durations),
+        "latency": summarize(receivers.latencies),
+    }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tcp-clients", type=int, default=32)
+    parser.add_argument("--udp-clients", type=int, default=8)
+    parser.add_argument("--slow-clients", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=20, help="bursts per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--queue-size", type=int, default=FANOUT_QUEUE_SIZE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args)
+    print(f"{results['bursts']} bursts to {args.tcp_clients} TCP + {args.udp_clients} UDP clients: "
+          f"{results['deliveries']} delivered, {results['lost']} lost, "
+          f"{results['slow_clients_dropped']}/{args.slow_clients} slow clients dropped, "
+          f"{results['bursts_dropped']} bursts dropped")
+    for name in ("submit", "latency"):
+        summary = results[name]
+        print(f"{name:>8}: p50 {summary['p50_ms']:.3f} ms, p99 {summary['p99_ms']:.3f} ms, "
+              f"max {summary['max_ms']:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Loads a synthetic `.ping` log with `pingreader` and with a line by line Python parser.
+
+Usage:
+    python benchmarks/bench_ping_reader.py [--lines 10000000] [--directory DIR]
+
+The file (~870 MB for 10 million lines) is written to a temporary directory and deleted afterwards.
+The line by line parser only reads the first million lines; its rate is extrapolated.
+"""
+import sys
+import time
+import argparse
+import tempfile
+import itertools
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from hydrophone_ping_gps_logger import pingreader
+from hydrophone_ping_gps_logger.nmea import degrees_to_nmea
+from hydrophone_ping_gps_logger.pingbinary import parse_timestamp
+from hydrophone_ping_gps_logger.pingloggercontroller import format_data_line, FIELD_NAME
+
+BLOCK_LINES = 100_000
+PYTHON_LINES = 1_000_000
+
+
+def write_synthetic_file(path: Path, number_of_lines: int):
+    """20 Hz track at ~10 knots; every 20th GPS time is on the second (mixed field widths)."""
+    rng = np.random.default_rng(0)
+    with open(path, "w") as f:
+        f.write("# datetime: 20240424T083551\n# ship_name: Synthetic\n# ping_interval_second: 0.05\n"
+                "# number_of_pings: -1\n# start_delay_second: 0\n# transponder_depth_meter: 3.0\n")
+        f.write(format_data_line(FIELD_NAME) + "\n")
+
+        lines = []
+        for i in range(BLOCK_LINES):
+            seconds = 30000 + i * 0.05
+            micro = round(seconds % 1 * 1e6)
+            gps_time = f"{int(seconds // 3600):02d}:{int(seconds % 3600 // 60):02d}:{int(seconds % 60):02d}"
+            gps_time += f".{micro:06d}+00:00" if micro else "+00:00"
+            lines.append(format_data_line([
+                f"20240424T{int(seconds // 3600) - 4:02d}{int(seconds % 3600 // 60):02d}{int(seconds % 60):02d}-0400",
+                "2024-04-24",
+                gps_time,
+                degrees_to_nmea(48.64 + i * 1e-6, True),
+                degrees_to_nmea(-68.15 + i * 1e-6, False),
+                f"{rng.uniform(0, 360):.2f}",
+            ]) + "\n")
+        block = "".join(lines)
+
+        for _ in range(number_of_lines // BLOCK_LINES):
+            f.write(block)
+        f.write("".join(lines[:number_of_lines % BLOCK_LINES]))
+
+
+def python_line_by_line(path: Path, max_lines: int) -> int:
+    count = 0
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+        for line in itertools.islice(f, max_lines):
+            timestamp, date, gps_time, lat, lon, heading = (v.strip() for v in line.split(","))
+            parse_timestamp(timestamp)
+            np.datetime64(f"{date}T{gps_time[:-6]}")
+            for value in (lat, lon):
+                number, direction = value.split()
+                degrees = float(number[:-7]) + float(number[-7:]) / 60
+                degrees = -degrees if direction in "SW" else degrees
+            float(heading) if heading else float("nan")
+            count += 1
+    return count
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=10_000_000, help="lines of the synthetic file")
+    parser.add_argument("--directory", help="where the temporary file is written, default: the system temp")
+    args = parser.parse_args(argv)
+    number_of_lines = args.lines
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as tmp:
+        path = Path(tmp) / "synthetic.ping"
+        start = time.perf_counter()
+        write_synthetic_file(path, number_of_lines)
+        print(f"Written {number_of_lines:,} lines ({path.stat().st_size / 1e6:,.0f} MB) "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        _, records = pingreader.read_ping_file(path)
+        elapsed = time.perf_counter() - start
+        assert len(records) == number_of_lines
+        print(f"  pingreader:   {elapsed:8.2f} s  {number_of_lines / elapsed:12,.0f} lines/s")
+
+        start = time.perf_counter()
+        count = python_line_by_line(path, PYTHON_LINES)
+        elapsed = time.perf_counter() - start
+        print(f"  line by line: {elapsed * number_of_lines / count:8.2f} s  {count / elapsed:12,.0f} lines/s "
+              f"(extrapolated from {count:,} lines)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Startup time of the package: import time per module (from `python -X importtime`) and GUI time to first frame.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--json results.json] [--baseline results.json]
+        [--executable dist/main/PingLogger]
+
+Each entry point is imported in a fresh interpreter `--runs` times; the median is reported with the
+slowest imports under it and the heavy optional dependencies it pulled in (which should only be loaded
+by the feature using them). The time to first frame is measured from the process start to the
+`main.FIRST_FRAME_MARKER` debug record the GUI logs to stderr once the window content is sent, either
+from the sources or from the PyInstaller build (`--executable`); it is skipped if flet is not installed.
+
+With `--baseline`, exits with 1 if a median got slower than the baseline by more than `--tolerance`.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+ENTRY_POINTS = [
+    "hydrophone_ping_gps_logger.gps",
+    "hydrophone_ping_gps_logger.transponder",
+    "hydrophone_ping_gps_logger.pingloggercontroller",
+    "hydrophone_ping_gps_logger.headless",
+    "hydrophone_ping_gps_logger.main",
+]
+HEAVY_DEPENDENCIES = ["serial", "pynmea2", "pywinusb", "numpy", "flet", "screeninfo"]
+
+# Same as `main.FIRST_FRAME_MARKER_VARIABLE` and `main.FIRST_FRAME_MARKER` (main imports flet).
+FIRST_FRAME_MARKER_VARIABLE = "PING_LOGGER_FIRST_FRAME_MARKER"
+FIRST_FRAME_MARKER = "first frame"
+FIRST_FRAME_TIMEOUT = 60  # seconds
+
+TOP_IMPORTS = 10
+
+
+def parse_importtime(stderr: str) -> dict:
+    """:return: {module: (self us, cumulative us)} from the `-X importtime` output."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = (int(self_us), int(cumulative_us))
+    return imports
+
+
+def measure_import(module: str) -> tuple:
+    """:return: (wall seconds, {module: (self us, cumulative us)}) or (None, error message)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": str(ROOT)}
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1]
+    return wall, parse_importtime(result.stderr)
+
+
+def bench_import(module: str, runs: int) -> dict:
+    walls, cumulative, imports = [], [], None
+    for _ in range(runs):
+        wall, imports = measure_import(module)
+        if wall is None:
+            return {"error": imports}
+        walls.append(wall)
+        cumulative.append(imports[module][1])
+
+    top = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "wall_ms": statistics.median(walls) * 1e3,
+        "import_ms": statistics.median(cumulative) / 1e3,
+        "modules": len(imports),
+        "heavy_dependencies": [name for name in HEAVY_DEPENDENCIES if name in imports],
+        "top": [(name, cumulative_us / 1e3) for name, (_, cumulative_us) in top[1:TOP_IMPORTS + 1]],
+    }
+
+
+def measure_first_frame(command: list) -> float:
+    """:return: Seconds from the process start to the first frame marker, None if it never came."""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        env={**os.environ, "PYTHONPATH": str(ROOT), FIRST_FRAME_MARKER_VARIABLE: "1"}
+    )
+    try:
+        for line in process.stderr:  # `logsetup.CONSOLE_FORMAT` lines: `... DEBUG MainThread: first frame`
+            if " DEBUG " in line and line.rstrip().endswith(f": {FIRST_FRAME_MARKER}"):
+                return time.perf_counter() - start
+            if time.perf_counter() - start > FIRST_FRAME_TIMEOUT:
+                break
+        return None
+    finally:
+        process.kill()
+        process.wait()
+
+
+def bench_first_frame(runs: int, executable: str = None) -> dict:
+    if executable is None:
+        check = subprocess.run([sys.executable, "-c", "import flet"], capture_output=True)
+        if check.returncode != 0:
+            return {"error": "flet not installed"}
+        command = [sys.executable, "-m", "hydrophone_ping_gps_logger.main"]
+    else:
+        command = [executable]
+
+    times = []
+    for _ in range(runs):
+        elapsed = measure_first_frame(command)
+        if elapsed is None:
+            return {"error": f"no first frame within {FIRST_FRAME_TIMEOUT} seconds"}
+        times.append(elapsed)
+    return {"first_frame_ms": statistics.median(times) * 1e3, "min_ms": min(times) * 1e3}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """:return: Regressions as text."""
+    regressions = []
+    for name, result in results.items():
+        for key in ("import_ms", "first_frame_ms"):
+            if key in result and key in baseline.get(name, {}):
+                if result[key] > baseline[name][key] * tolerance:
+                    regressions.append(f"{name} {key}: {result[key]:.1f} > {baseline[name][key]:.1f} x {tolerance}")
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown vs the baseline")
+    parser.add_argument("--executable", help="PyInstaller build to measure the first frame of")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for module in ENTRY_POINTS:
+        result = results[module] = bench_import(module, args.runs)
+        if "error" in result:
+            print(f"{module}: not importable ({result['error']})")
+            continue
+        print(f"{module}: {result['import_ms']:.1f} ms import, {result['wall_ms']:.1f} ms process, "
+              f"{result['modules']} modules, heavy: {', '.join(result['heavy_dependencies']) or '-'}")
+        for name, cumulative_ms in result["top"]:
+            print(f"    {cumulative_ms:8.1f} ms  {name}")
+
+    result = results["first_frame"] = bench_first_frame(args.runs, args.executable)
+    if "error" in result:
+        print(f"first frame: skipped ({result['error']})")
+    else:
+        print(f"first frame: {result['first_frame_ms']:.0f} ms (min {result['min_ms']:.0f} ms)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""
+Time source of the controllers: `Clock` (real time, the default `REAL_CLOCK`) or `VirtualClock`.
+
+Everything the controllers do with time goes through their clock: reading it (monotonic and wall
+time), sleeping, timed condition waits, timers, starting and joining threads.
+
+A `VirtualClock` only moves forward when every thread it knows of (started with `start_thread` or
+`timer`, or inside `participate()`) is waiting on it; it then jumps straight to the earliest deadline
+and wakes that single waiter. A mission of hours runs in seconds, and always in the same order.
+Threads the clock doesn't know of (e.g. the file writers) run in real time: the virtual time
+keeps moving while they run, they must not depend on it. Real blocking calls in a known thread
+(a serial port read, `Thread.join`) stop the virtual time until they return: use
+`simulation.SimulatedGpsClient` and `clock.join` in virtual mode.
+"""
+import time
+import heapq
+import weakref
+import itertools
+import threading
+from contextlib import contextmanager
+
+
+class Clock:
+    """Real time, from `time` and `threading`."""
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def time(self) -> float:
+        return time.time()
+
+    def time_ns(self) -> int:
+        return time.time_ns()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def wait(self, condition: threading.Condition, timeout: float = None) -> bool:
+        """`condition.wait(timeout)`, the condition acquired by the caller. :return: False on timeout."""
+        return condition.wait(timeout)
+
+    def notify_all(self, condition: threading.Condition):
+        """`condition.notify_all()`, the condition acquired by the caller."""
+        condition.notify_all()
+
+    def start_thread(self, target, name: str, args: tuple = ()) -> threading.Thread:
+        """:return: The started daemon thread."""
+        thread = threading.Thread(target=target, name=name, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    def timer(self, interval: float, function, args: tuple = ()) -> threading.Timer:
+        """:return: The started daemon timer calling `function(*args)` after `interval` seconds (`cancel`able)."""
+        timer = threading.Timer(interval, function, args=args)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def join(self, thread):
+        """Waits for a thread or timer of `start_thread` or `timer` to end."""
+        thread.join()
+
+
+REAL_CLOCK = Clock()
+
+
+class _Waiter:
+    __slots__ = ("deadline", "participant", "condition", "event", "woken", "notified")
+
+    def __init__(self, deadline: float, participant: bool, condition: threading.Condition = None):
+        self.deadline = deadline  # None: until woken
+        self.participant = participant
+        self.condition = condition
+        self.event = threading.Event() if condition is None else None
+        self.woken = False
+        self.notified = False
+
+
+class _VirtualTimer:
+    def __init__(self, clock: "VirtualClock", interval: float, function, args: tuple):
+        self.clock = clock
+        self.interval = interval
+        self.function = function
+        self.args = args
+        self.condition = threading.Condition()
+        self.cancelled = False
+        self.thread: threading.Thread = None
+
+    def _run(self):
+        with self.condition:
+            if not self.cancelled:
+                self.clock.wait(self.condition, self.interval)
+            if self.cancelled:
+                return
+        self.function(*self.args)
+
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.clock.notify_all(self.condition)
+
+    def is_alive(self) -> bool:
+        return self.thread.is_alive()
+
+    def join(self):
+        self.clock.join(self.thread)
+
+
+class VirtualClock(Clock):
+    def __init__(self, start_time: float = None, start_monotonic: float = None):
+        """
+        :param start_time: Wall time (epoch seconds) the clock starts at. Defaults to now.
+        :param start_monotonic: `monotonic()` the clock starts at. Defaults to the real one.
+        """
+        self.start_time = time.time() if start_time is None else start_time
+        self.start_monotonic = time.monotonic() if start_monotonic is None else start_monotonic
+        self.now = self.start_monotonic
+
+        self.lock = threading.Condition()  # guards the state below. The advancer waits on it.
+        self.deadlines = []  # heap of (deadline, sequence, _Waiter)
+        self.sequence = itertools.count()
+        self.condition_waiters = {}  # {condition: [_Waiter]}
+        self.joiners = {}  # {running thread started by the clock: [_Waiter]}
+        self.threads = weakref.WeakSet()  # every thread started by the clock
+        self.running = 0  # participant threads not waiting on the clock
+        self.local = threading.local()
+        self.closed = False
+
+        self.advancer = threading.Thread(target=self._advance, name="virtual_clock", daemon=True)
+        self.advancer.start()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.start_time + (self.now - self.start_monotonic)
+
+    def time_ns(self) -> int:
+        return round(self.time() * 1e9)
+
+    @property
+    def _is_participant(self) -> bool:
+        return getattr(self.local, "participant", False)
+
+    def _block(self, waiter: _Waiter):
+        """Under `lock`."""
+        if waiter.participant:
+            self.running -= 1
+        if waiter.deadline is not None:
+            heapq.heappush(self.deadlines, (waiter.deadline, next(self.sequence), waiter))
+        self.lock.notify_all()
+
+    def _wake(self, waiter: _Waiter, notified: bool) -> bool:
+        """Under `lock`. Call `_signal` once the lock is released. :return: False if already woken."""
+        if waiter.woken:
+            return False
+        waiter.woken = True
+        waiter.notified = notified
+        if waiter.participant:
+            self.running += 1
+        if waiter.condition is not None:
+            self.condition_waiters[waiter.condition].remove(waiter)
+        return True
+
+    @staticmethod
+    def _signal(waiter: _Waiter):
+        if waiter.condition is None:
+            waiter.event.set()
+        else:
+            with waiter.condition:
+                waiter.condition.notify_all()
+
+    def sleep(self, seconds: float):
+        waiter = _Waiter(self.now + max(seconds, 0), self._is_participant)
+        with self.lock:
+            self._block(waiter)
+        waiter.event.wait()
+
+    def wait(self, condition: threading.Condition, timeout: float = None) -> bool:
+        waiter = _Waiter(None if timeout is None else self.now + max(timeout, 0), self._is_participant, condition)
+        with self.lock:
+            self.condition_waiters.setdefault(condition, []).append(waiter)
+            self._block(waiter)
+        while not waiter.woken:
+            condition.wait()
+        return waiter.notified
+
+    def notify_all(self, condition: threading.Condition):
+        with self.lock:
+            for waiter in list(self.condition_waiters.get(condition, ())):
+                self._wake(waiter, True)
+        condition.notify_all()  # acquired by the caller.
+
+    def start_thread(self, target, name: str, args: tuple = ()) -> threading.Thread:
+        def run():
+            self.local.participant = True
+            try:
+                target(*args)
+            finally:
+                with self.lock:
+                    joiners = [w for w in self.joiners.pop(thread) if self._wake(w, True)]
+                    self.running -= 1
+                    self.lock.notify_all()
+                for waiter in joiners:
+                    self._signal(waiter)
+
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        with self.lock:
+            self.running += 1
+            self.joiners[thread] = []
+            self.threads.add(thread)
+        thread.start()
+        return thread
+
+    def timer(self, interval: float, function, args: tuple = ()) -> _VirtualTimer:
+        timer = _VirtualTimer(self, interval, function, args)
+        timer.thread = self.start_thread(timer._run, name=f"virtual_timer({getattr(function, '__name__', '')})")
+        return timer
+
+    def join(self, thread):
+        if isinstance(thread, _VirtualTimer):
+            thread = thread.thread
+        with self.lock:
+            if thread not in self.threads:
+                waiter = None
+            elif thread not in self.joiners:
+                return  # ended
+            else:
+                waiter = _Waiter(None, self._is_participant)
+                self.joiners[thread].append(waiter)
+                self._block(waiter)
+        if waiter is None:
+            thread.join()
+        else:
+            waiter.event.wait()
+
+    @contextmanager
+    def participate(self):
+        """The calling thread (e.g. the one driving a simulation) is waited for before the time moves forward."""
+        with self.lock:
+            self.running += 1
+        self.local.participant = True
+        try:
+            yield self
+        finally:
+            self.local.participant = False
+            with self.lock:
+                self.running -= 1
+                self.lock.notify_all()
+
+    def close(self):
+        """Stops the time. Threads still waiting on the clock never wake up."""
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+        self.advancer.join()
+
+    def _next_waiter(self) -> _Waiter:
+        """Under `lock`. :return: The earliest waiter still waiting, None if none."""
+        while self.deadlines and self.deadlines[0][2].woken:
+            heapq.heappop(self.deadlines)
+        return self.deadlines[0][2] if self.deadlines else None
+
+    def _advance(self):
+        while True:
+            with self.lock:
+                while not self.closed and (self.running > 0 or self._next_waiter() is None):
+                    self.lock.wait()
+                if self.closed:
+                    return
+                deadline, _, waiter = heapq.heappop(self.deadlines)
+                self.now = max(self.now, deadline)
+                self._wake(waiter, False)
+            self._signal(waiter)
@@ -0,0 +1,177 @@
+"""
+In-process publish/subscribe of the controllers state changes.
+
+`GpsController`, `TransponderController` and `PingLoggerController` publish typed events on an
+`EventBus` (the controllers of a `PingLoggerController` share its bus). Consumers either:
+
+ + `subscribe`: get the events from their own bounded queue, on their own thread. When the queue
+   is full, the oldest event is dropped (`Backpressure.DROP_OLDEST`, the publisher never waits)
+   or the publisher waits for room (`Backpressure.BLOCK`, for consumers that must see every event).
+ + `subscribe_callback`: are called right away on the publisher thread (GPS, ping, ...);
+   callbacks must be quick and never block.
+"""
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+EVENT_QUEUE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class Event:
+    pass
+
+
+@dataclass(frozen=True)
+class FixEvent(Event):
+    """`GpsController.nmea_data` was replaced (RMC or HDT received)."""
+    nmea_data: "NmeaData"
+    fix: "Fix" = None  # decimal degrees position of a valid RMC, added to the fix history. None otherwise.
+    time: float = field(default_factory=time.monotonic)
+
+
+@dataclass(frozen=True)
+class PingEvent(Event):
+    ping_number: int  # 1 for the first ping of the run.
+    ping_time: float  # time.monotonic() when the relays were closed.
+    time: float = field(default_factory=time.monotonic)
+
+
+class Device:
+    GPS = "gps"
+    TRANSPONDER = "transponder"
+
+
+@dataclass(frozen=True)
+class ConnectionEvent(Event):
+    device: str  # `Device`
+    connected: bool  # GPS: connected and reading, transponder: relay board opened.
+    time: float = field(default_factory=time.monotonic)
+
+
+class RunState:
+    STARTED = "started"
+    PAUSED = "paused"
+    RESUMED = "resumed"
+    STOPPED = "stopped"
+
+
+@dataclass(frozen=True)
+class RunStateEvent(Event):
+    state: str  # `RunState`
+    ping_count: int
+    time: float = field(default_factory=time.monotonic)
+
+
+class Backpressure:
+    DROP_OLDEST = "drop_oldest"
+    BLOCK = "block"
+
+
+class Subscription:
+    def __init__(self, bus: "EventBus", event_types: tuple, maxsize: int = EVENT_QUEUE_SIZE,
+                 backpressure: str = Backpressure.DROP_OLDEST, block_timeout: float = None):
+        """
+        :param event_types: Event classes received. None: every event.
+        :param block_timeout: `Backpressure.BLOCK` only. Seconds the publisher waits for room before
+            dropping the event. None: waits as long as needed.
+        """
+        self.bus = bus
+        self.event_types = event_types
+        self.maxsize = maxsize
+        self.backpressure = backpressure
+        self.block_timeout = block_timeout
+
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped_count = 0
+
+    def put(self, event: Event):
+        """Called on the publisher thread."""
+        with self.condition:
+            if len(self.queue) >= self.maxsize:
+                if self.backpressure == Backpressure.BLOCK:
+                    if not self.condition.wait_for(lambda: len(self.queue) < self.maxsize or self.closed,
+                                                   self.block_timeout):
+                        self.dropped_count += 1
+                        return
+                else:
+                    self.queue.popleft()
+                    self.dropped_count += 1
+            if self.closed:
+                return
+            self.queue.append(event)
+            self.condition.notify_all()
+
+    def get(self, timeout: float = None) -> Event:
+        """:return: The oldest event, None on timeout or once closed."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.queue or self.closed, timeout)
+            if not self.queue:
+                return None
+            event = self.queue.popleft()
+            self.condition.notify_all()
+            return event
+
+    def get_all(self, timeout: float = None) -> list:
+        """Waits for at least one event then takes every event queued. Empty on timeout or once closed."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.queue or self.closed, timeout)
+            events = list(self.queue)
+            self.queue.clear()
+            self.condition.notify_all()
+            return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class CallbackSubscription:
+    def __init__(self, bus: "EventBus", event_types: tuple, callback):
+        self.bus = bus
+        self.event_types = event_types
+        self.callback = callback
+
+    def put(self, event: Event):
+        try:
+            self.callback(event)
+        except Exception as e:
+            logging.error(f"Event callback {self.callback} failed: {e}")
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self):
+        self.subscriptions = ()  # replaced, never modified: `publish` iterates it without locking.
+        self.lock = threading.Lock()
+
+    def subscribe(self, event_types: tuple = None, maxsize: int = EVENT_QUEUE_SIZE,
+                  backpressure: str = Backpressure.DROP_OLDEST, block_timeout: float = None) -> Subscription:
+        """See `Subscription`."""
+        return self._add(Subscription(self, event_types, maxsize, backpressure, block_timeout))
+
+    def subscribe_callback(self, callback, event_types: tuple = None) -> CallbackSubscription:
+        """:param callback: Called with each event on the publisher thread."""
+        return self._add(CallbackSubscription(self, event_types, callback))
+
+    def _add(self, subscription):
+        with self.lock:
+            self.subscriptions += (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+
+    def publish(self, event: Event):
+        for subscription in self.subscriptions:
+            if subscription.event_types is None or isinstance(event, subscription.event_types):
+                subscription.put(event)
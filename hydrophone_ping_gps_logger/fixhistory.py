@@ -0,0 +1,153 @@
+"""
+Fixed capacity history of the latest GPS fixes, used to get the position at the exact
+(monotonic) time a ping was fired instead of the last fix received before it.
+
+Columns are preallocated `array('d')` so memory stays the same however long the mission runs.
+"""
+import math
+import threading
+from array import array
+from typing import NamedTuple
+
+FIX_HISTORY_CAPACITY = 1200  # 60 seconds at the Garmin 19x HVS 20 Hz rate.
+MAX_EXTRAPOLATION = 2.0  # seconds
+
+
+class Fix(NamedTuple):
+    receive_time: float  # time.monotonic() when the sentence was received.
+    gps_time: float  # UTC epoch seconds.
+    latitude: float  # decimal degrees
+    longitude: float  # decimal degrees
+    heading: float  # degrees, nan if unknown.
+
+
+def _angle_delta(a0: float, a1: float) -> float:
+    """Shortest signed arc from a0 to a1 (degrees)."""
+    return (a1 - a0 + 180) % 360 - 180
+
+
+class FixHistory:
+    def __init__(self, capacity: int = FIX_HISTORY_CAPACITY, max_extrapolation: float = MAX_EXTRAPOLATION):
+        """
+        :param capacity: Number of fixes kept.
+        :param max_extrapolation: Seconds past the last fix the position is still extrapolated.
+        """
+        self.capacity = capacity
+        self.max_extrapolation = max_extrapolation
+
+        self.receive_times = array("d", bytes(8 * capacity))
+        self.gps_times = array("d", bytes(8 * capacity))
+        self.latitudes = array("d", bytes(8 * capacity))
+        self.longitudes = array("d", bytes(8 * capacity))
+        self.headings = array("d", bytes(8 * capacity))
+
+        self.start = 0  # index of the oldest fix.
+        self.size = 0
+
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        with self.lock:
+            self.start = 0
+            self.size = 0
+
+    def append(self, receive_time: float, gps_time: float, latitude: float, longitude: float, heading: float):
+        with self.lock:
+            if self.size and receive_time < self.receive_times[(self.start + self.size - 1) % self.capacity]:
+                return  # out of order, keeps the receive times sorted.
+
+            if self.size < self.capacity:
+                index = (self.start + self.size) % self.capacity
+                self.size += 1
+            else:  # overwrites the oldest fix.
+                index = self.start
+                self.start = (self.start + 1) % self.capacity
+
+            self.receive_times[index] = receive_time
+            self.gps_times[index] = gps_time
+            self.latitudes[index] = latitude
+            self.longitudes[index] = longitude
+            self.headings[index] = heading
+
+    def _get(self, i: int) -> Fix:
+        index = (self.start + i) % self.capacity
+        return Fix(
+            self.receive_times[index],
+            self.gps_times[index],
+            self.latitudes[index],
+            self.longitudes[index],
+            self.headings[index],
+        )
+
+    def latest(self) -> Fix:
+        with self.lock:
+            if not self.size:
+                return None
+            return self._get(self.size - 1)
+
+    def fixes(self, start_time: float, end_time: float) -> list:
+        """:return: The fixes received between `start_time` and `end_time` (monotonic), oldest first."""
+        with self.lock:
+            first = self._bisect(start_time)
+            last = self._bisect(end_time)
+            while last < self.size and self.receive_times[(self.start + last) % self.capacity] == end_time:
+                last += 1
+            return [self._get(i) for i in range(first, last)]
+
+    def _bisect(self, receive_time: float) -> int:
+        """Index (oldest = 0) of the first fix received at or after `receive_time`."""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.receive_times[(self.start + middle) % self.capacity] < receive_time:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def interpolate(self, receive_time: float) -> Fix:
+        """
+        Position and heading at `receive_time` (monotonic), linearly interpolated between the two
+        surrounding fixes. Past the last fix, the last two fixes are extrapolated for up to
+        `max_extrapolation` seconds.
+
+        :return: The interpolated fix or None if `receive_time` is not covered by the history.
+        """
+        with self.lock:
+            if not self.size:
+                return None
+
+            i = self._bisect(receive_time)
+            if i == self.size:  # after the last fix
+                if receive_time - self.receive_times[(self.start + i - 1) % self.capacity] > self.max_extrapolation:
+                    return None
+                if self.size == 1:
+                    return self._get(0)._replace(receive_time=receive_time)
+                before, after = self._get(i - 2), self._get(i - 1)
+            elif self.receive_times[(self.start + i) % self.capacity] == receive_time:
+                return self._get(i)
+            elif i == 0:  # older than the history
+                return None
+            else:
+                before, after = self._get(i - 1), self._get(i)
+
+        span = after.receive_time - before.receive_time
+        fraction = (receive_time - before.receive_time) / span if span > 0 else 1.
+
+        if math.isnan(before.heading):
+            heading = after.heading
+        elif math.isnan(after.heading):
+            heading = before.heading
+        else:
+            heading = (before.heading + _angle_delta(before.heading, after.heading) * fraction) % 360
+
+        return Fix(
+            receive_time=receive_time,
+            gps_time=before.gps_time + (after.gps_time - before.gps_time) * fraction,
+            latitude=before.latitude + (after.latitude - before.latitude) * fraction,
+            longitude=(before.longitude + _angle_delta(before.longitude, after.longitude) * fraction + 180) % 360 - 180,
+            heading=heading,
+        )
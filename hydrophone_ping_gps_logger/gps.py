@@ -1,34 +1,117 @@
 """
-Only looks for RMC nmea strings.
+Only looks for RMC and HDT nmea strings.
 """
+import math
 import time
-import serial
 import logging
+import datetime
 import threading
-from dataclasses import dataclass
 
-import pynmea2
+try:
+    from hydrophone_ping_gps_logger import nmea, metrics
+    from hydrophone_ping_gps_logger.fixhistory import FixHistory, Fix
+    from hydrophone_ping_gps_logger.tracklogger import TrackLogger
+    from hydrophone_ping_gps_logger.events import EventBus, FixEvent, ConnectionEvent, Device
+    from hydrophone_ping_gps_logger.clock import Clock, REAL_CLOCK
+    from hydrophone_ping_gps_logger.nmeacapture import NmeaCapture, CaptureReader
+except ImportError:
+    import nmea
+    import metrics
+    from fixhistory import FixHistory, Fix
+    from tracklogger import TrackLogger
+    from events import EventBus, FixEvent, ConnectionEvent, Device
+    from clock import Clock, REAL_CLOCK
+    from nmeacapture import NmeaCapture, CaptureReader
 
-GPS_REFRESH_RATE = 0.001
+NMEA_MAX_SENTENCE_LENGTH = 128  # NMEA 0183 caps sentences at 82 chars; leaves room for proprietary ones.
+
+
+def _serial():
+    """`pyserial`, only imported once a GPS is connected (or an exception has to be matched)."""
+    import serial
+    return serial
 
 
-@dataclass
 class NmeaData:
-    date: str = ""
-    time: str = ""
-    latitude: str = ""
-    longitude: str = ""
-    heading: str = ""
+    """
+    Immutable GPS fix snapshot.
+
+    The GPS thread never modifies a snapshot, it publishes a new one (see `replace`) with a
+    single reference assignment so readers get consistent fields without locking.
+    `sequence` is incremented for every snapshot published; compare it to know if anything changed.
+    """
+    __slots__ = ("date", "time", "latitude", "longitude", "heading", "sequence")
+
+    def __init__(self, date: str = "", time: str = "", latitude: str = "", longitude: str = "",
+                 heading: str = "", sequence: int = 0):
+        object.__setattr__(self, "date", date)
+        object.__setattr__(self, "time", time)
+        object.__setattr__(self, "latitude", latitude)
+        object.__setattr__(self, "longitude", longitude)
+        object.__setattr__(self, "heading", heading)
+        object.__setattr__(self, "sequence", sequence)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(date={self.date!r}, time={self.time!r}, latitude={self.latitude!r}, '
+                f'longitude={self.longitude!r}, heading={self.heading!r}, sequence={self.sequence!r})')
 
     def __str__(self):
         return f'{self.date}, {self.time}, {self.latitude}, {self.longitude}'
 
+    def replace(self, **changes) -> "NmeaData":
+        """:return: A new snapshot with the `changes` applied and the next sequence number."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes, sequence=self.sequence + 1)
+        return NmeaData(**fields)
+
+
+class NmeaFramer:
+    """
+    Incrementally splits a raw serial byte stream into complete `$...*hh` sentences.
+
+    Bytes are accumulated in a single reusable bytearray; a partial sentence at the end of
+    a chunk is kept until the rest of it arrives with the next chunk.
+    """
+    def __init__(self, max_sentence_length: int = NMEA_MAX_SENTENCE_LENGTH):
+        self.max_sentence_length = max_sentence_length
+        self.buffer = bytearray()
+
     def clear(self):
-        self.date = ""
-        self.time = ""
-        self.latitude = ""
-        self.longitude = ""
-        self.heading = ""
+        self.buffer.clear()
+
+    def feed(self, data: bytes) -> list:
+        """
+        :param data: Raw bytes received from the GPS.
+        :return: List of the complete sentences (bytes, without the line ending) found so far.
+        """
+        buffer = self.buffer
+        buffer += data
+
+        sentences = []
+        position = 0
+        while True:
+            end = buffer.find(b"\n", position)
+            if end == -1:
+                break
+            start = buffer.rfind(b"$", position, end)  # the last `$` drops truncated sentences.
+            if start != -1:
+                sentences.append(bytes(buffer[start:end]).rstrip(b"\r"))
+            position = end + 1
+
+        if position:
+            del buffer[:position]
+
+        if len(buffer) > self.max_sentence_length:  # no line ending in sight, drop the garbage.
+            start = buffer.rfind(b"$")
+            del buffer[:start if start != -1 else len(buffer)]
+
+        return sentences
 
 
 class GpsClient:
@@ -36,116 +119,395 @@ class GpsClient:
     buffer_size = 1024
     timeout = 0.5
 
-    def __init__(self, port: str, baudrate: int):
+    def __init__(self, port: str, baudrate: int, capture_path=None):
         """
         :param port: Usb port address (path)
+        :param capture_path: Every byte received is also written to this `nmeacapture` file.
         """
         self.port = port
         self.baudrate = baudrate
-        self.serial: serial.Serial = None
-        self.serial_input_buffer: str = ""
+        self.capture_path = capture_path
+        self.capture: NmeaCapture = None
+        self.serial: "serial.Serial" = None
+        self.framer = NmeaFramer()
+        self.receive_time: float = None  # time.monotonic() of the last read.
 
         self.client_name = str(self.__class__).split('.')[-1][:-2]  # for logging purposes
 
+    def start_capture(self):
+        if self.capture_path is None:
+            return
+        self.capture = NmeaCapture(self.capture_path, [f"# port: {self.port}", f"# baudrate: {self.baudrate}"])
+        try:
+            self.capture.start()
+            logging.info(f"[{self.client_name}] Capturing to {self.capture_path}")
+        except OSError as e:
+            logging.error(f"[{self.client_name}] Could not start the capture: {e}")
+            self.capture = None
+
+    def stop_capture(self):
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+
     def connect(self):
         """
 
         :return: `1` if connected else `0`
         """
         try:
-            self.serial = serial.Serial(port=self.port, baudrate=self.baudrate, timeout=self.timeout)
+            self.serial = _serial().Serial(port=self.port, baudrate=self.baudrate, timeout=self.timeout)
             self.serial.readline()  # clears input buffer
+            self.framer.clear()
             logging.info(f"[{self.client_name}] Client connected")
+            self.start_capture()
             return 1
-        except serial.serialutil.SerialException:
+        except _serial().SerialException:
             logging.error(f"[{self.client_name}] Could not connect")
             return 0
 
     def disconnect(self):
         self.serial.close()
+        self.stop_capture()
         logging.info(f"[{self.client_name}] Client closed")
 
-    def read(self) -> str:
+    def read_sentences(self) -> list:
+        """
+        Blocks until data arrives (or `timeout`), then drains everything waiting in the serial
+        input buffer in one read.
+
+        :return: List of the complete NMEA sentences received. Can be empty.
+        """
         try:
-            self.serial_input_buffer = self.serial.readline().decode(self.encoding).strip("\n")
-            logging.debug(f"[{self.client_name}] Serial input buffer: {self.serial_input_buffer}")
-        except serial.SerialTimeoutException:
-            self.serial_input_buffer = ""
-            logging.warning(f"[{self.client_name}] (Timeout) Serial Disconnected")
-            # Raise ERROR FIXME
-        except UnicodeDecodeError:
-            self.serial_input_buffer = ""
-            logging.warning(f"[{self.client_name}] (Decode Error)")
+            data = self.serial.read(self.serial.in_waiting or 1)
+            if self.serial.in_waiting:
+                data += self.serial.read(self.serial.in_waiting)
+        except _serial().SerialException:
+            metrics.GPS_READ_ERRORS.inc()
+            logging.warning(f"[{self.client_name}] (Read Error) Serial Disconnected")
             # Raise ERROR FIXME
-
-        return self.serial_input_buffer
+            return []
+        self.receive_time = time.monotonic()
+        if self.capture is not None and data:
+            self.capture.submit(self.receive_time, data)
+
+        return self.split_sentences(data)
+
+    def split_sentences(self, data: bytes) -> list:
+        """:return: The complete sentences (str) of `data` and of the partial sentence left by the previous call."""
+        sentences = []
+        for sentence in self.framer.feed(data):
+            try:
+                sentences.append(sentence.decode(self.encoding))
+            except UnicodeDecodeError:
+                metrics.GPS_DECODE_ERRORS.inc()
+                logging.warning(f"[{self.client_name}] (Decode Error)")
+        return sentences
 
     def write(self, msg: str):
         try:
             self.serial.write(msg.encode(self.encoding))
             logging.info(f"[{self.client_name}] Serial write: {msg}")
-        except serial.serialutil.SerialException:
+        except _serial().SerialException:
             logging.warning(f"[{self.client_name}] Serial write failed")
 
 
+class ReplayGpsClient(GpsClient):
+    """
+    Feeds an `nmeacapture` file instead of a serial port, chunk by chunk, with the timing of the capture.
+    """
+
+    def __init__(self, capture_path, speed: float = 1, loop: bool = False, clock: Clock = REAL_CLOCK):
+        """
+        :param capture_path: `nmeacapture` file to replay.
+        :param speed: 1: as captured, N: N times faster, 0: as fast as the GPS thread reads.
+        :param loop: Starts over at the end of the capture, else the client idles (`finished`).
+        :param clock: Time source of the replay, see `clock`.
+        """
+        super().__init__(port=str(capture_path), baudrate=None)
+        self.replay_path = capture_path
+        self.speed = speed
+        self.loop = loop
+        self.clock = clock
+
+        self.reader: CaptureReader = None
+        self.chunks = None
+        self.replay_start: float = None  # `clock.monotonic()` of the start of the capture.
+        self.finished = False
+        self.sentence_count = 0
+        self.byte_count = 0
+
+    def connect(self):
+        try:
+            self._open()
+        except (OSError, ValueError) as e:
+            logging.error(f"[{self.client_name}] Could not open {self.replay_path}: {e}")
+            return 0
+        logging.info(f"[{self.client_name}] Replaying {self.replay_path} at x{self.speed or 'max'}")
+        return 1
+
+    def _open(self):
+        self.reader = CaptureReader(self.replay_path)
+        self.chunks = iter(self.reader)
+        self.framer.clear()
+        self.replay_start = self.clock.monotonic()
+
+    def disconnect(self):
+        if self.reader is not None:
+            self.reader.close()
+        logging.info(f"[{self.client_name}] Client closed")
+
+    def read_sentences(self) -> list:
+        """Waits for the next chunk of the capture. :return: Its complete sentences. Empty once finished."""
+        chunk = next(self.chunks, None)
+        if chunk is None and self.loop:
+            self.reader.close()
+            self._open()
+            chunk = next(self.chunks, None)
+        if chunk is None:
+            self.finished = True
+            self.clock.sleep(self.timeout)  # idles like a silent serial port.
+            return []
+
+        offset, data = chunk
+        if self.speed:
+            delay = self.replay_start + offset / self.speed - self.clock.monotonic()
+            if delay > 0:
+                self.clock.sleep(delay)
+        self.receive_time = self.clock.monotonic()
+        sentences = self.split_sentences(data)
+        self.byte_count += len(data)
+        self.sentence_count += len(sentences)
+        return sentences
+
+    def write(self, msg: str):
+        pass
+
 
 class GpsController:
-    def __init__(self):
+    use_fast_decoder = True
+
+    def __init__(self, clock: Clock = REAL_CLOCK):
+        """:param clock: Time source of the GPS thread, see `clock`."""
+        self.clock = clock
         self.client: GpsClient = None
         self.run_thread: threading.Thread = None
 
         self.is_connected = False
         self.is_running = False
 
-        self.nmea_msg: pynmea2.talker.TalkerSentence = None
-        self.nmea_data = NmeaData("", "", "", "")
+        self.nmea_msg: "pynmea2.talker.TalkerSentence" = None
+        self.nmea_data = NmeaData()  # replaced, never modified, by the GPS thread.
+
+        self.fix_history = FixHistory()
+        self.heading = math.nan
+
+        self.track_logger: TrackLogger = None  # every fix is handed off to it when set (see `PingLoggerController`).
+        self.fanout: "NmeaFanout" = None  # every burst of sentences is handed off to it when set (see `nmeafanout`).
 
-    def connect(self, port: str, baudrate: int):
-        self.client = GpsClient(port=port, baudrate=baudrate)
+        self.events = EventBus()  # `FixEvent`, `ConnectionEvent`. Shared with `PingLoggerController`.
+
+    def connect(self, port: str, baudrate: int, capture_path=None):
+        """
+        :param port: Serial port, or a `udp://host:port` / `tcp://host:port` NMEA source (see `netgps`).
+        :param baudrate: Ignored for a network source.
+        :param capture_path: Raw serial data also written to this `nmeacapture` file.
+        """
+        if "://" in str(port):
+            try:
+                from hydrophone_ping_gps_logger.netgps import network_gps_client
+            except ImportError:
+                from netgps import network_gps_client
+            try:
+                client = network_gps_client(port, capture_path=capture_path)
+            except ValueError as e:
+                logging.error(f"Invalid GPS source: {e}")
+                self.events.publish(ConnectionEvent(Device.GPS, False))
+                return
+        else:
+            client = GpsClient(port=port, baudrate=baudrate, capture_path=capture_path)
+        self.connect_client(client)
+
+    def connect_client(self, client: "GpsClient"):
+        """
+        :param client: `GpsClient` or an equivalent (`connect`, `read_sentences`, `receive_time`, `disconnect`),
+            e.g. `simulation.SimulatedGpsClient`.
+        """
+        self.client = client
 
         if self.client.connect() == 1:  # client connected started.
             self.is_connected = True
-            self.run_thread = threading.Thread(
-                target=self.run, name="GPS", daemon=True
-            )
-            self.run_thread.start()
+            self.run_thread = self.clock.start_thread(self.run, name="GPS")  # publishes the connection once reading.
+        else:
+            self.events.publish(ConnectionEvent(Device.GPS, False))
 
     def disconnect(self):
         self.is_running = False
         logging.info(f"GPS sampling stopped")
         if self.run_thread:
-            self.run_thread.join()  # Wait for the thread to exit
+            self.clock.join(self.run_thread)  # Wait for the thread to exit
 
         if self.is_connected:
             self.client.disconnect()
             self.is_connected = False
 
-        self.nmea_data.clear()
+        self.nmea_data = NmeaData(sequence=self.nmea_data.sequence + 1)
+        self.fix_history.clear()
+        self.heading = math.nan
+        self.events.publish(ConnectionEvent(Device.GPS, False))
 
     def run(self):
         """
         To be run as a separate thread from the main thread.
         """
         self.is_running = True
+        self.events.publish(ConnectionEvent(Device.GPS, True))
 
         while self.is_running:
+            # Blocks on the serial port; a whole burst of sentences is handled per wakeup.
+            sentences = self.client.read_sentences()
+            fanout = self.fanout
+            if fanout is not None and sentences:
+                fanout.submit(sentences)
+            for nmea_string in sentences:
+                self.process_sentence(nmea_string)
+
+    def process_sentence(self, nmea_string: str):
+        sentence_type = nmea_string[3:6]  # `$GPRMC,...` -> RMC, not validated yet: bounded label values.
+        metrics.NMEA_SENTENCES.labels(sentence_type if sentence_type in nmea.DECODERS else "other").inc()
+        msg = self.decode_sentence(nmea_string)
+
+        if msg is None:
+            return
+
+        if msg.sentence_type == "RMC":  # GARMIN & SMALL
+            self.nmea_data = self.nmea_data.replace(
+                date=msg.date,
+                time=msg.time,
+                latitude=msg.latitude + " " + msg.latitude_direction,
+                longitude=msg.longitude + " " + msg.longitude_direction,
+            )
 
-            nmea_string = self.client.read()
-
-            if nmea_string:
+            fix = None
+            if msg.status == "A" and msg.latitude and msg.longitude and msg.date:
                 try:
-                    msg = pynmea2.parse(nmea_string)
-                except pynmea2.nmea.ParseError: # FIXME
-                    logging.warning("pynmea2 Parsing Error")
-                    continue
-                if msg.sentence_type == "RMC":  # GARMIN & SMALL
+                    fix = Fix(
+                        receive_time=self.client.receive_time,
+                        gps_time=datetime.datetime.fromisoformat(f"{msg.date}T{msg.time}").timestamp(),
+                        latitude=nmea.nmea_to_degrees(msg.latitude, msg.latitude_direction),
+                        longitude=nmea.nmea_to_degrees(msg.longitude, msg.longitude_direction),
+                        heading=self.heading,
+                    )
+                except ValueError:
+                    logging.warning("Invalid RMC fix not added to the history")
+
+            if fix is not None:
+                self.fix_history.append(*fix)
+
+                track_logger = self.track_logger
+                if track_logger is not None:
+                    track_logger.submit(fix)
+
+            self.events.publish(FixEvent(self.nmea_data, fix))
+
+        elif msg.sentence_type == "HDT":
+            self.nmea_data = self.nmea_data.replace(heading=msg.heading)
+            try:
+                self.heading = float(msg.heading)
+            except ValueError:
+                self.heading = math.nan
+
+            self.events.publish(FixEvent(self.nmea_data))
+
+    def nmea_data_at(self, receive_time: float) -> NmeaData:
+        """
+        Fix interpolated at `receive_time`, formatted like `nmea_data`.
 
-                    self.nmea_data.date = str(msg.datestamp)
-                    self.nmea_data.time = str(msg.timestamp)
-                    self.nmea_data.latitude = msg.lat + " " + msg.lat_dir
-                    self.nmea_data.longitude = msg.lon + " " + msg.lon_dir
+        :param receive_time: time.monotonic() timestamp, e.g. when the transponder was pinged.
+        :return: None if the fix history doesn't cover `receive_time`.
+        """
+        fix = self.fix_history.interpolate(receive_time)
+        if fix is None:
+            return None
+
+        nmea_data = self.nmea_data
+        # Same resolution as the GPS: whole seconds keep the `.ping` time column at its width.
+        gps_time = round(fix.gps_time, 6) if "." in nmea_data.time else round(fix.gps_time)
+        gps_datetime = datetime.datetime.fromtimestamp(gps_time, tz=datetime.timezone.utc)
+        return NmeaData(
+            date=str(gps_datetime.date()),
+            time=str(gps_datetime.timetz()),
+            latitude=nmea.degrees_to_nmea(fix.latitude, True, _decimals(nmea_data.latitude)),
+            longitude=nmea.degrees_to_nmea(fix.longitude, False, _decimals(nmea_data.longitude)),
+            heading="" if math.isnan(fix.heading) else f"{fix.heading:.{_decimals(nmea_data.heading)}f}",
+            sequence=nmea_data.sequence,
+        )
+
+    def decode_sentence(self, nmea_string: str):
+        """
+        Uses the `nmea` fast path decoder and falls back on `pynmea2` if it can't decode the sentence.
 
-                elif msg.sentence_type == "HDT":
-                    self.nmea_data.heading = msg.heading
+        :return: The decoded sentence or None if it is not supported or invalid.
+        """
+        if self.use_fast_decoder:
+            try:
+                return nmea.decode(nmea_string)
+            except nmea.NmeaChecksumError:
+                metrics.NMEA_PARSE_ERRORS.labels("checksum").inc()
+                logging.warning("NMEA Checksum Error")
+                return None
+            except nmea.NmeaDecodeError:
+                logging.debug("Fast decoder failed, falling back on pynmea2")
+
+        import pynmea2  # only needed by the sentences the fast path doesn't decode.
 
-            time.sleep(GPS_REFRESH_RATE)
+        try:
+            return from_pynmea2(pynmea2.parse(nmea_string))
+        except pynmea2.nmea.ParseError: # FIXME
+            metrics.NMEA_PARSE_ERRORS.labels("pynmea2").inc()
+            logging.warning("pynmea2 Parsing Error")
+            return None
+
+
+def _decimals(value: str, default: int = 4) -> int:
+    """Number of decimals of the text value `4838.4572 N` -> 4"""
+    value = str(value).split(" ")[0]
+    return len(value) - value.index(".") - 1 if "." in value else default
+
+
+def from_pynmea2(msg: "pynmea2.talker.TalkerSentence"):
+    """Converts a `pynmea2` sentence to its `nmea` fast path equivalent. None if not supported."""
+    sentence_type = getattr(msg, "sentence_type", None)
+    if sentence_type == "RMC":
+        return nmea.RmcSentence(
+            date=str(msg.datestamp) if msg.datestamp else "",
+            time=str(msg.timestamp) if msg.timestamp else "",
+            status=msg.status,
+            latitude=msg.lat,
+            latitude_direction=msg.lat_dir,
+            longitude=msg.lon,
+            longitude_direction=msg.lon_dir,
+            speed_over_ground=msg.data[6],
+            true_course=msg.data[7],
+        )
+    if sentence_type == "HDT":
+        return nmea.HdtSentence(heading=msg.data[0])
+    if sentence_type == "GGA":
+        return nmea.GgaSentence(
+            time=str(msg.timestamp) if msg.timestamp else "",
+            latitude=msg.lat,
+            latitude_direction=msg.lat_dir,
+            longitude=msg.lon,
+            longitude_direction=msg.lon_dir,
+            gps_quality=msg.data[5],
+            number_of_satellites=msg.data[6],
+            horizontal_dilution=msg.data[7],
+            altitude=msg.data[8],
+        )
+    if sentence_type == "VTG":
+        return nmea.VtgSentence(
+            true_track=msg.data[0],
+            speed_over_ground_knots=msg.data[4],
+            speed_over_ground_kmph=msg.data[6],
+        )
+    return None
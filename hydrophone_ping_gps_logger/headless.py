@@ -0,0 +1,269 @@
+"""
+Headless ping run, for unattended computers without a display. Never imports the GUI (flet, screeninfo).
+
+Connects the transponder and the GPS, starts the ping run and waits for it to end (number of
+pings reached) or for SIGINT/SIGTERM, then stops everything cleanly.
+
+Settings come from an INI file and/or command line flags (flags override the file):
+
+    [gps]
+    port = /dev/ttyUSB0  ; or a network source: udp://:10110, tcp://192.168.1.20:10110
+    baudrate = 4800
+    bypass_gps = false
+    capture_path = /data/pings/gps.nmeacap.gz  ; optional raw capture of the serial data
+    ; replay = /data/pings/gps.nmeacap.gz  ; instead of `port`: replays a capture
+    ; replay_speed = 1  ; N: N times faster, 0: max speed
+
+    [transponder]
+    backend = auto
+    pulse_width = 1
+
+    [run]  ; any `PingRunParameters` field
+    output_directory_path = /data/pings
+    ship_name = Leim
+    transponder_depth = 5
+    ping_interval = 15
+    number_of_pings = 0
+    start_delay_seconds = 0
+
+    [fanout]  ; optional rebroadcast of the GPS sentences to other software
+    udp = 127.0.0.1:10110, 192.168.1.255:10110
+    tcp_port = 10110
+    tcp_host = 127.0.0.1  ; 0.0.0.0 to serve the LAN
+    sentence_types = RMC, HDT  ; every sentence if empty
+
+    [metrics]  ; optional Prometheus endpoint on http://127.0.0.1:<port>/metrics
+    port = 9464
+
+Usage:
+    python -m hydrophone_ping_gps_logger.headless --config ping.ini [--ship-name Leim ...]
+"""
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+import dataclasses
+import configparser
+
+try:
+    from hydrophone_ping_gps_logger.pingloggercontroller import PingLoggerController, PingRunParameters
+    from hydrophone_ping_gps_logger.relay import RelayBackendType
+    from hydrophone_ping_gps_logger.metrics import MetricsServer
+    from hydrophone_ping_gps_logger.gps import ReplayGpsClient
+    from hydrophone_ping_gps_logger.nmeafanout import NmeaFanout, parse_udp_targets, parse_sentence_types
+    from hydrophone_ping_gps_logger import logsetup
+except ImportError:
+    from pingloggercontroller import PingLoggerController, PingRunParameters
+    from relay import RelayBackendType
+    from metrics import MetricsServer
+    from gps import ReplayGpsClient
+    from nmeafanout import NmeaFanout, parse_udp_targets, parse_sentence_types
+    import logsetup
+
+STATUS_INTERVAL = 60  # seconds between the status log lines.
+POLL_INTERVAL = 0.5  # seconds between the checks of the end of the run.
+
+GPS_CONNECT_TIMEOUT = 5  # seconds
+
+
+def _boolean(value: str) -> bool:
+    value = str(value).strip().lower()
+    if value not in configparser.ConfigParser.BOOLEAN_STATES:
+        raise ValueError(f"Not a boolean: {value}")
+    return configparser.ConfigParser.BOOLEAN_STATES[value]
+
+
+def _converter(_type):
+    return _boolean if _type is bool else _type
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="headless", description="Headless hydrophone ping run.")
+    parser.add_argument("--config", help="INI file with [gps], [transponder] and [run] sections")
+    parser.add_argument("--port", help="GPS serial port, or udp://host:port / tcp://host:port")
+    parser.add_argument("--baudrate", type=int, help="GPS baud rate")
+    parser.add_argument("--bypass-gps", type=_boolean, metavar="BOOL", help="ping without GPS")
+    parser.add_argument("--capture-path", help="also write the raw GPS data to this capture file")
+    parser.add_argument("--replay", help="replay this GPS capture file instead of reading the port")
+    parser.add_argument("--replay-speed", type=float, help="1: as captured, N: N times faster, 0: max speed")
+    parser.add_argument("--backend", choices=[RelayBackendType.AUTO, RelayBackendType.WINUSB,
+                                              RelayBackendType.HIDRAW, RelayBackendType.SIMULATED],
+                        help="relay backend")
+    parser.add_argument("--pulse-width", type=float, help="seconds the relays stay closed")
+    parser.add_argument("--fanout-udp", metavar="HOST:PORT,...", help="rebroadcast the GPS sentences to these")
+    parser.add_argument("--fanout-tcp-port", type=int, help="serve the GPS sentences on this TCP port")
+    parser.add_argument("--fanout-tcp-host", help="interface of the TCP server (default 127.0.0.1)")
+    parser.add_argument("--fanout-sentence-types", metavar="TYPES", help="only rebroadcast these, e.g. RMC,HDT")
+    parser.add_argument("--metrics-port", type=int, help="serve the metrics on localhost at this port")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--json-log", help="also write the log records to this file as JSON lines")
+
+    run = parser.add_argument_group("run", "PingRunParameters")
+    for field in dataclasses.fields(PingRunParameters):
+        run.add_argument(f"--{field.name.replace('_', '-')}", dest=field.name, type=_converter(field.type),
+                         metavar=field.type.__name__.upper())
+    return parser
+
+
+def load_settings(args: argparse.Namespace) -> tuple:
+    """
+    :return: ({gps and transponder settings}, PingRunParameters) from the config file then the flags.
+    """
+    config = configparser.ConfigParser()
+    if args.config:
+        if not config.read(args.config):
+            raise FileNotFoundError(f"Config file not found: {args.config}")
+
+    settings = {
+        "port": config.get("gps", "port", fallback=None),
+        "baudrate": config.getint("gps", "baudrate", fallback=4800),
+        "bypass_gps": config.getboolean("gps", "bypass_gps", fallback=False),
+        "capture_path": config.get("gps", "capture_path", fallback=None),
+        "replay": config.get("gps", "replay", fallback=None),
+        "replay_speed": config.getfloat("gps", "replay_speed", fallback=1),
+        "backend": config.get("transponder", "backend", fallback=RelayBackendType.AUTO),
+        "pulse_width": config.getfloat("transponder", "pulse_width", fallback=None),
+        "fanout_udp": config.get("fanout", "udp", fallback=""),
+        "fanout_tcp_port": config.getint("fanout", "tcp_port", fallback=None),
+        "fanout_tcp_host": config.get("fanout", "tcp_host", fallback="127.0.0.1"),
+        "fanout_sentence_types": config.get("fanout", "sentence_types", fallback=""),
+        "metrics_port": config.getint("metrics", "port", fallback=None),
+    }
+    for key in settings:
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+
+    run_parameters = PingRunParameters()
+    for field in dataclasses.fields(PingRunParameters):
+        value = getattr(args, field.name)
+        if value is None and config.has_option("run", field.name):
+            value = _converter(field.type)(config.get("run", field.name))
+        if value is not None:
+            setattr(run_parameters, field.name, value)
+
+    missing = [name for name in ("output_directory_path", "ship_name", "ping_interval")
+               if getattr(run_parameters, name) is None]
+    if missing:
+        raise ValueError(f"Missing run parameters: {', '.join(missing)}")
+    if run_parameters.number_of_pings is None:
+        run_parameters.number_of_pings = 0
+    if run_parameters.start_delay_seconds is None:
+        run_parameters.start_delay_seconds = 0
+
+    settings["fanout_udp"] = parse_udp_targets(settings["fanout_udp"])
+    settings["fanout_sentence_types"] = parse_sentence_types(settings["fanout_sentence_types"])
+
+    return settings, run_parameters
+
+
+def run(settings: dict, run_parameters: PingRunParameters, stop_event: threading.Event) -> int:
+    """
+    Runs until the ping run ends or `stop_event` is set.
+
+    :return: Exit code.
+    """
+    controller = PingLoggerController()
+
+    metrics_server = None
+    if settings["metrics_port"] is not None:
+        metrics_server = MetricsServer(port=settings["metrics_port"])
+        try:
+            metrics_server.start()
+        except OSError as e:
+            logging.error(f"Could not serve the metrics on port {settings['metrics_port']}: {e}")
+            metrics_server = None
+
+    fanout = None
+    if settings["fanout_udp"] or settings["fanout_tcp_port"] is not None:
+        fanout = NmeaFanout(udp_targets=settings["fanout_udp"], tcp_port=settings["fanout_tcp_port"],
+                            tcp_host=settings["fanout_tcp_host"], sentence_types=settings["fanout_sentence_types"])
+        try:
+            fanout.start()
+            controller.gps_controller.fanout = fanout
+        except OSError as e:
+            logging.error(f"Could not start the NMEA fan-out: {e}")
+            fanout = None
+
+    try:
+        return _run(controller, settings, run_parameters, stop_event)
+    finally:
+        if fanout is not None:
+            controller.gps_controller.fanout = None
+            fanout.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+
+
+def _run(controller: PingLoggerController, settings: dict, run_parameters: PingRunParameters,
+         stop_event: threading.Event) -> int:
+    if settings["pulse_width"] is not None:
+        controller.transponder_controller.pulse_width = settings["pulse_width"]
+    controller.transponder_controller.connect(backend=settings["backend"])
+    if not controller.transponder_controller.is_connected:
+        logging.error("Transponder not connected")
+        return 1
+
+    if settings["replay"] or settings["port"]:
+        if settings["replay"]:
+            controller.gps_controller.connect_client(ReplayGpsClient(settings["replay"], speed=settings["replay_speed"]))
+        else:
+            controller.connect_gps(port=settings["port"], baudrate=settings["baudrate"],
+                                   capture_path=settings["capture_path"])
+        # The GPS thread sets `is_running` once started. A TCP source always passes this check: its
+        # client connects in the background until the server answers (see `netgps.TcpGpsClient`).
+        for _ in range(GPS_CONNECT_TIMEOUT * 10):
+            if controller.gps_controller.is_running or stop_event.wait(0.1):
+                break
+    if not controller.gps_controller.is_running and not settings["bypass_gps"]:
+        logging.error("GPS not connected (set bypass_gps to ping without it)")
+        controller.stop_all()
+        return 1
+
+    controller.start_ping_run(run_parameters, bypass_gps=settings["bypass_gps"])
+    if not controller.is_running:
+        controller.stop_all()
+        return 1
+    logging.info(f"Ping run started: {controller.output_filename}")
+
+    try:
+        status_time = time.monotonic()
+        while controller.is_running and not stop_event.wait(POLL_INTERVAL):
+            if time.monotonic() - status_time >= STATUS_INTERVAL:
+                status_time = time.monotonic()
+                logging.info(f"Pings: {controller.ping_count}, GPS: {controller.gps_controller.nmea_data}")
+    finally:
+        if stop_event.is_set():
+            logging.info("Stop requested")
+        ping_count = controller.ping_count
+        controller.stop_all()
+        logging.info(f"Ping run ended, {ping_count} pings: {controller.output_filename}")
+    return 0
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    logsetup.start_logging(level=args.log_level.upper(), json_log_path=args.json_log)
+    try:
+        return _main(args)
+    finally:
+        logsetup.stop_logging()
+
+
+def _main(args: argparse.Namespace) -> int:
+    try:
+        settings, run_parameters = load_settings(args)
+    except (OSError, ValueError, configparser.Error) as e:
+        logging.error(str(e))
+        return 2
+
+    stop_event = threading.Event()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signal_number, lambda *_: stop_event.set())
+
+    return run(settings, run_parameters, stop_event)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
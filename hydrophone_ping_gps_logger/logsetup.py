@@ -0,0 +1,161 @@
+"""
+Non-blocking logging: the GPS, ping and writer threads only put their log records on a bounded
+queue; a `QueueListener` thread formats them and writes them to the console and files.
+
+    start_logging(logging.INFO, json_log_path="run.log.jsonl")
+    ...
+    stop_logging()  # writes the records still queued.
+
+When the queue is full (a handler stalled for a long time), records are dropped rather than
+blocking the thread logging them (see `metrics.LOG_RECORDS_DROPPED`).
+
+Hot paths must still avoid formatting what isn't logged: pass arguments lazily
+(`logging.debug("... %s", value)`) or guard with `logging.root.isEnabledFor(logging.DEBUG)`.
+"""
+import sys
+import json
+import queue
+import logging
+import datetime
+import threading
+import logging.handlers
+
+try:
+    from hydrophone_ping_gps_logger import metrics
+except ImportError:
+    import metrics
+
+LOG_QUEUE_SIZE = 10000
+CONSOLE_FORMAT = "%(asctime)s %(levelname)s %(threadName)s: %(message)s"
+
+# Attributes of every `LogRecord`, the others were passed with `extra=` and are added to the JSON lines.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: logging.handlers.QueueListener = None
+_queue_handler: "DroppingQueueHandler" = None
+_lock = threading.Lock()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """`QueueHandler` that drops the record instead of blocking (or raising) when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped_count = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time (UTC ISO 8601), level, thread, logger, message and the `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def json_lines_handler(path) -> logging.FileHandler:
+    handler = logging.FileHandler(path, mode="a", encoding="utf-8")
+    handler.setFormatter(JsonLinesFormatter())
+    return handler
+
+
+def start_logging(level=logging.INFO, json_log_path=None, console: bool = True,
+                  queue_size: int = LOG_QUEUE_SIZE):
+    """
+    Routes the root logger through a queue drained by a background thread. Replaces the root handlers.
+
+    :param level: Root logger level.
+    :param json_log_path: Also writes the records to this file as JSON lines.
+    :param console: Human readable records on stderr.
+    """
+    global _listener, _queue_handler
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+    if json_log_path is not None:
+        handlers.append(json_lines_handler(json_log_path))
+
+    with _lock:
+        _stop_listener()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+
+def stop_logging():
+    """Writes the records still queued, closes the handlers and logs directly to stderr again."""
+    global _listener, _queue_handler
+
+    with _lock:
+        root = logging.getLogger()
+        if _queue_handler is not None:
+            root.removeHandler(_queue_handler)
+            _queue_handler = None
+        _stop_listener()
+        if not root.handlers:
+            logging.basicConfig(format=CONSOLE_FORMAT)
+
+
+def _stop_listener():
+    global _listener
+
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def add_handler(handler: logging.Handler):
+    """
+    Adds a handler, on the listener thread when `start_logging` was called (on the logging
+    thread otherwise, like any root handler).
+    """
+    with _lock:
+        if _listener is not None:
+            _listener.handlers = _listener.handlers + (handler,)  # replaced: read without lock by the listener.
+        else:
+            logging.getLogger().addHandler(handler)
+
+
+def remove_handler(handler: logging.Handler):
+    """Waits for the records already queued to be written, then removes and closes a handler added by `add_handler`."""
+    if _listener is not None:
+        _listener.queue.join()
+    with _lock:
+        if _listener is not None and handler in _listener.handlers:
+            _listener.handlers = tuple(h for h in _listener.handlers if h is not handler)
+        else:
+            logging.getLogger().removeHandler(handler)
+    handler.close()
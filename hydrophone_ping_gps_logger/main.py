@@ -25,6 +25,7 @@ TODO
 
 """
 
+import os
 import logging
 import sys
 import time
@@ -35,30 +36,44 @@ import flet as ft
 from flet import TextField, ElevatedButton, Text, Row, Column, IconButton, Dropdown, Divider, Checkbox
 from flet_core.control_event import ControlEvent
 
-import screeninfo
-
 try:
     from hydrophone_ping_gps_logger.utils import list_serial_ports
+    from hydrophone_ping_gps_logger.netgps import DEFAULT_NETWORK_SOURCES
     from hydrophone_ping_gps_logger.pingloggercontroller import PingLoggerController, PingRunParameters
+    from hydrophone_ping_gps_logger.events import Backpressure
+    from hydrophone_ping_gps_logger import logsetup
 except ImportError:
     from utils import list_serial_ports
+    from netgps import DEFAULT_NETWORK_SOURCES
     from pingloggercontroller import PingLoggerController, PingRunParameters
+    from events import Backpressure
+    import logsetup
 
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.WARNING)
+logsetup.start_logging(level=logging.WARNING)
 
 DEFAULT_MONITOR_WIDTH = 1920
 DEFAULT_MONITOR_HEIGHT = 1080
 
-monitors = screeninfo.get_monitors()
-HEIGHT_SCALING = (monitors[0].height - DEFAULT_MONITOR_HEIGHT) / DEFAULT_MONITOR_HEIGHT
-WIDTH_SCALING = (monitors[0].width - DEFAULT_MONITOR_WIDTH) / DEFAULT_MONITOR_WIDTH
 
-# scales half as much on height vs width
-SCALE_FACTOR = max([HEIGHT_SCALING, WIDTH_SCALING])  # in percent
+def get_scale_factor() -> float:
+    """GUI scaling from the size of the first monitor. 0 if it can't be found (e.g. no display)."""
+    import screeninfo
+
+    try:
+        monitors = screeninfo.get_monitors()
+        height_scaling = (monitors[0].height - DEFAULT_MONITOR_HEIGHT) / DEFAULT_MONITOR_HEIGHT
+        width_scaling = (monitors[0].width - DEFAULT_MONITOR_WIDTH) / DEFAULT_MONITOR_WIDTH
+    except (screeninfo.ScreenInfoError, IndexError):
+        logging.warning("Monitor size not found, GUI not scaled")
+        return 0
+
+    # scales half as much on height vs width
+    return max([height_scaling, width_scaling]) / 100  # in percent
 
-SCALE_FACTOR /= 100
+
+SCALE_FACTOR = get_scale_factor()
 
 ICON_SIZE = 30 * (1 + SCALE_FACTOR)
 
@@ -88,6 +103,16 @@ VERSION = '1.0.0'
 
 SCALE = 1 * (1 + SCALE_FACTOR)
 
+# Set to log `FIRST_FRAME_MARKER` (DEBUG) once the window content is sent, see `benchmarks/bench_startup.py`.
+FIRST_FRAME_MARKER_VARIABLE = "PING_LOGGER_FIRST_FRAME_MARKER"
+FIRST_FRAME_MARKER = "first frame"
+if os.environ.get(FIRST_FRAME_MARKER_VARIABLE):
+    logger.setLevel(logging.DEBUG)  # this module only: flet is verbose at DEBUG.
+
+
+GUI_MAX_UPDATE_RATE = 10  # page updates per second, at most.
+GUI_EVENT_QUEUE_SIZE = 100
+TRANSPONDER_RECONNECT_INTERVAL = 2  # seconds between the attempts while the transponder is disconnected.
 
 APP_IS_RUNNING = True
 ping_controller = PingLoggerController()
@@ -103,13 +128,10 @@ def main(page: ft.Page):
 
     page.scroll = True
 
-    ###### BackEnd ######
-    ping_controller.transponder_controller.connect()
-
     ###### CONNECT GPS FIELD ######
 
     def refresh_comports(e: ControlEvent):
-        comport_list = list_serial_ports()
+        comport_list = list_serial_ports() + DEFAULT_NETWORK_SOURCES
         used_comports = []
         if ping_controller.gps_controller.is_connected:
             used_comports.append(ping_controller.gps_controller.client.port)
@@ -169,7 +191,7 @@ def main(page: ft.Page):
         height=FIELD_HEIGHT_M,
         text_size=FONT_SIZE_M,
         alignment=ft.alignment.center,
-        options=list(ft.dropdown.Option(comport) for comport in list_serial_ports()),
+        options=list(ft.dropdown.Option(comport) for comport in list_serial_ports() + DEFAULT_NETWORK_SOURCES),
         on_change=validate_gps_parameters,
         bgcolor=ft.colors.GREY_50,
         scale=SCALE
@@ -614,53 +636,99 @@ def main(page: ft.Page):
     page.add(
         main_layout
     )
+    logger.debug(FIRST_FRAME_MARKER)
 
-    def refresh_gps_values():
-        text_gps_date.value = ping_controller.gps_controller.nmea_data.date
-        text_gps_time.value = ping_controller.gps_controller.nmea_data.time
-        text_gps_lat.value = ping_controller.gps_controller.nmea_data.latitude
-        text_gps_lon.value = ping_controller.gps_controller.nmea_data.longitude
-        text_gps_heading.value = ping_controller.gps_controller.nmea_data.heading
-        text_ping_count.value = str(int(ping_controller.ping_count))
-        #page.update()
+    ###### BackEnd ######
+    # Connected once the window is shown: looking up the USB device doesn't delay the first frame.
+    ping_controller.transponder_controller.connect()
 
-    while APP_IS_RUNNING:
-        refresh_gps_values()
+    last_nmea_sequence = None
+    last_state = None
+    changed_controls = []
+    transponder_retry_time = 0
+
+    def set_control(control, value, attribute="value"):
+        """Only the controls actually changed are sent to the page."""
+        if getattr(control, attribute) != value:
+            setattr(control, attribute, value)
+            if control not in changed_controls:
+                changed_controls.append(control)
 
+    def refresh_gps_values():
+        nonlocal last_nmea_sequence
+        nmea_data = ping_controller.gps_controller.nmea_data  # consistent snapshot
+        if nmea_data.sequence != last_nmea_sequence:
+            last_nmea_sequence = nmea_data.sequence
+            set_control(text_gps_date, nmea_data.date)
+            set_control(text_gps_time, nmea_data.time)
+            set_control(text_gps_lat, nmea_data.latitude)
+            set_control(text_gps_lon, nmea_data.longitude)
+            set_control(text_gps_heading, nmea_data.heading)
+
+    def refresh_run_state():
+        nonlocal last_state, transponder_retry_time
+        set_control(text_ping_count, str(int(ping_controller.ping_count)))
         if ping_controller.is_running:
-            text_ping_count.value = str(int(ping_controller.ping_count))
-            text_countdown_delay.value = str(int(ping_controller.count_down_delay)) or "----"
-            #page.update()
-        else:
-            not_running_state_run()
+            set_control(text_countdown_delay, str(int(ping_controller.count_down_delay)) or "----")
+
+        transponder_connected = ping_controller.transponder_controller.is_connected
+        set_control(icon_transponder_status, ft.icons.CIRCLE if transponder_connected else ft.icons.CIRCLE_OUTLINED, "icon")
+        set_control(icon_transponder_status,
+                    ft.colors.GREEN_200 if transponder_connected else ft.colors.RED_200, "icon_color")
+        set_control(button_connect_transponder, transponder_connected, "disabled")
+
+        state = (ping_controller.is_running, ping_controller.gps_controller.is_running, transponder_connected)
+        if state != last_state:  # these update the whole page themselves.
+            if not ping_controller.is_running:
+                not_running_state_run()
             validate_ping_run()
+            last_state = state
 
-   #     if ping_controller.transponder_controller.is_connected:
-   #         ping_controller.transponder_controller.check_connection()
+        if not transponder_connected and time.monotonic() >= transponder_retry_time:
+            transponder_retry_time = time.monotonic() + TRANSPONDER_RECONNECT_INTERVAL
+            ping_controller.connect_transponder()
 
+    def wait_timeout():
+        """Seconds until the page has to be refreshed without any change notified. None: idle."""
+        timeouts = []
         if not ping_controller.transponder_controller.is_connected:
-            icon_transponder_status.icon = ft.icons.CIRCLE_OUTLINED
-            icon_transponder_status.icon_color = ft.colors.RED_200
-            button_connect_transponder.disabled = False
-            ping_controller.connect_transponder()
-        else:
-            icon_transponder_status.icon = ft.icons.CIRCLE
-            icon_transponder_status.icon_color = ft.colors.GREEN_200
-            button_connect_transponder.disabled = True
+            timeouts.append(max(transponder_retry_time - time.monotonic(), 0))
+        if ping_controller.is_running and ping_controller.scheduler is not None:
+            time_until_start = ping_controller.scheduler.time_until_start()
+            if time_until_start > 0:  # countdown, refreshed on each second.
+                timeouts.append(time_until_start % 1 or 1)
+        return min(timeouts) if timeouts else None
+
+    # Sleeps until the controllers publish an event; bursts of events (e.g. 20 Hz GPS) are coalesced
+    # to at most `GUI_MAX_UPDATE_RATE` page updates per second. Only the latest state is shown so
+    # the oldest events can be dropped.
+    subscription = ping_controller.events.subscribe(maxsize=GUI_EVENT_QUEUE_SIZE, backpressure=Backpressure.DROP_OLDEST)
+    update_time = 0
+    while APP_IS_RUNNING:
+        subscription.get_all(timeout=wait_timeout())
 
+        delay = update_time + 1 / GUI_MAX_UPDATE_RATE - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        update_time = time.monotonic()
 
-        page.update()
-        time.sleep(0.05)
+        refresh_gps_values()
+        refresh_run_state()
 
+        if changed_controls:
+            page.update(*changed_controls)
+            changed_controls.clear()
 
-try:
-    ft.app(target=main)
-finally:
-    APP_IS_RUNNING = False
-    logger.info("App Closed")
+if __name__ == "__main__":
     try:
-        ping_controller.transponder_controller.client.close_device()
-    except Exception:
-        pass
+        ft.app(target=main)
     finally:
-        ping_controller.stop_all()
+        APP_IS_RUNNING = False  # the refresh loop wakes up on the disconnection events of `stop_all`.
+        logger.info("App Closed")
+        try:
+            ping_controller.transponder_controller.client.close_device()
+        except Exception:
+            pass
+        finally:
+            ping_controller.stop_all()
+            logsetup.stop_logging()
@@ -0,0 +1,339 @@
+"""
+Health metrics of the logger: counters, gauges and fixed-bucket histograms kept in a `MetricsRegistry`.
+
+Updating a metric is a dict lookup (labels) and a few additions under an uncontended lock, cheap
+enough for the GPS, ping and writer threads. The registry is exposed in the Prometheus text format
+by an optional localhost `MetricsServer` (`http://127.0.0.1:<port>/metrics`) and summarized as JSON
+at the end of each ping run (see `PingLoggerController`).
+
+The metrics of the package are defined at the bottom of this module, on the default `REGISTRY`.
+"""
+import json
+import math
+import bisect
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+try:
+    from hydrophone_ping_gps_logger.stats import percentile
+except ImportError:
+    from stats import percentile
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+FIX_AGE_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class Metric(ABC):
+    type = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.children = {}  # {label values: child}
+        self.lock = threading.Lock()
+        if not self.label_names:
+            self.children[()] = self._new_child()
+
+    @abstractmethod
+    def _new_child(self):
+        """:return: The value of one set of label values."""
+
+    def labels(self, *values):
+        """:return: The metric for these label values, created on first use."""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name}: expected labels {self.label_names}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> list:
+        """:return: [(label dict, child)]"""
+        return [(dict(zip(self.label_names, (str(v) for v in values))), child)
+                for values, child in list(self.children.items())]
+
+
+class _CounterValue:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self.children[()].inc(amount)
+
+    @property
+    def value(self):
+        return self.children[()].value
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value: float):
+        self.children[()].set(value)
+
+    def dec(self, amount: float = 1):
+        self.children[()].dec(amount)
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "count", "sum", "lock")
+
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # last: +Inf
+        self.count = 0
+        self.sum = 0.
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        """:param buckets: Upper bounds, sorted."""
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+
+def _histogram_summary(upper_bounds: tuple, counts: list, total: float) -> dict:
+    count = sum(counts)
+    upper_bounds = upper_bounds + (math.inf,)
+
+    def _percentile(q: float):
+        """Upper bound of the bucket holding the `q` percentile. None if there are no samples."""
+        value = percentile(upper_bounds, q, counts)
+        if math.isnan(value):
+            return None
+        return _format_value(value) if math.isinf(value) else value
+
+    return {
+        "count": count,
+        "sum": total,
+        "mean": total / count if count else None,
+        "p50": _percentile(50),
+        "p99": _percentile(99),
+        "buckets": {_format_value(b): c for b, c in zip(upper_bounds, counts)},
+    }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, label_names: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def collect(self) -> dict:
+        """
+        :return: Raw values {(metric name, ((label name, value), ...)): value}, with
+            value as (bucket counts, sum) for histograms. See `summary`.
+        """
+        values = {}
+        for metric in list(self.metrics.values()):
+            for labels, child in metric.samples():
+                key = (metric.name, tuple(labels.items()))
+                if metric.type == "histogram":
+                    with child.lock:
+                        values[key] = (list(child.counts), child.sum)
+                else:
+                    values[key] = child.value
+        return values
+
+    def summary(self, since: dict = None) -> dict:
+        """
+        :param since: `collect` result: counters and histograms are the changes since then (gauges: current value).
+        :return: {metric name: {label string: value or histogram summary}}, JSON serializable.
+        """
+        since = since or {}
+        summary = {}
+        for (name, labels), value in self.collect().items():
+            metric = self.metrics[name]
+            previous = since.get((name, labels))
+            if metric.type == "histogram":
+                counts, total = value
+                if previous is not None:
+                    counts = [c - p for c, p in zip(counts, previous[0])]
+                    total -= previous[1]
+                value = _histogram_summary(metric.buckets, counts, total)
+            elif metric.type == "counter" and previous is not None:
+                value -= previous
+            summary.setdefault(name, {})[_format_labels(dict(labels))] = value
+        return summary
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for labels, child in metric.samples():
+                if metric.type != "histogram":
+                    lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(child.value)}")
+                    continue
+                with child.lock:
+                    counts, count, total = list(child.counts), child.count, child.sum
+                cumulative = 0
+                for upper_bound, bucket_count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels({**labels, "le": _format_value(upper_bound)})
+                    lines.append(f"{metric.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path, since: dict = None, **extra):
+        """Writes `summary(since)` with the `extra` fields to `path`."""
+        with open(path, "w") as f:
+            json.dump({**extra, "metrics": self.summary(since)}, f, indent=2, default=str)
+
+
+class MetricsServer:
+    def __init__(self, registry: "MetricsRegistry" = None, port: int = 9464, host: str = "127.0.0.1"):
+        """:param host: Only reachable from this computer by default."""
+        self.registry = registry or REGISTRY
+        self.port = port
+        self.host = host
+        self.server: "ThreadingHTTPServer" = None
+        self.thread: threading.Thread = None
+
+    def start(self):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  # only when served
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.debug(f"[metrics] {format % args}")
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]  # when started on port 0
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics_server", daemon=True)
+        self.thread.start()
+        logging.info(f"Metrics served on http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+
+
+REGISTRY = MetricsRegistry()
+
+NMEA_SENTENCES = REGISTRY.counter(
+    "nmea_sentences_total", "NMEA sentences received, by sentence type (`other`: not decoded).", ("type",))
+NMEA_PARSE_ERRORS = REGISTRY.counter(
+    "nmea_parse_errors_total", "NMEA sentences rejected: bad checksum or not parsed by pynmea2.", ("reason",))
+GPS_DECODE_ERRORS = REGISTRY.counter(
+    "gps_decode_errors_total", "Serial data from the GPS that isn't valid text.")
+GPS_READ_ERRORS = REGISTRY.counter(
+    "gps_read_errors_total", "GPS serial port read failures.")
+FIX_AGE_AT_PING = REGISTRY.histogram(
+    "fix_age_at_ping_seconds", "Seconds between the last GPS fix received and the ping.", buckets=FIX_AGE_BUCKETS)
+PINGS = REGISTRY.counter(
+    "pings_total", "Transponder pings fired.")
+PINGS_SKIPPED = REGISTRY.counter(
+    "pings_skipped_total", "Pings skipped: schedule late or previous pulse still active.")
+PING_SCHEDULE_ERROR = REGISTRY.histogram(
+    "ping_schedule_error_seconds", "Seconds a ping fired after its deadline.")
+RELAY_PING_LATENCY = REGISTRY.histogram(
+    "relay_ping_seconds", "Seconds to close the relays for a ping, status read back included.")
+RELAY_IO_LATENCY = REGISTRY.histogram(
+    "relay_io_seconds", "Seconds per USB relay transaction.", ("operation",))
+FILE_WRITE_LATENCY = REGISTRY.histogram(
+    "file_write_seconds", "Seconds to write (and flush/sync) a record, by writer.", ("writer",))
+FILE_RECORDS_DROPPED = REGISTRY.counter(
+    "file_records_dropped_total", "Records dropped because the writer queue was full, by writer.", ("writer",))
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "log_records_dropped_total", "Log records dropped because the logging queue was full.")
+NMEA_FANOUT_CLIENTS = REGISTRY.gauge(
+    "nmea_fanout_clients", "TCP clients of the NMEA fan-out.")
+NMEA_FANOUT_CLIENTS_DROPPED = REGISTRY.counter(
+    "nmea_fanout_clients_dropped_total", "NMEA fan-out TCP clients disconnected for not keeping up.")
+NMEA_FANOUT_BURSTS_DROPPED = REGISTRY.counter(
+    "nmea_fanout_bursts_dropped_total", "GPS bursts dropped because the NMEA fan-out thread fell behind.")
@@ -0,0 +1,269 @@
+"""
+NMEA 0183 over the network, for ships whose GNSS is only on the bridge LAN: `UdpGpsClient` (broadcast,
+unicast or multicast datagrams) and `TcpGpsClient` (NMEA server, reconnected automatically).
+Both are drop-in `GpsClient`s, selected by the port string:
+
+    udp://:10110             every interface, port 10110 (the IEC 61162-450 / NMEA over IP default)
+    udp://239.192.0.1:60001  multicast group
+    tcp://192.168.1.20:10110
+
+Data is received into a preallocated buffer (`recv_into`), framed by the shared `NmeaFramer`.
+"""
+import time
+import socket
+import struct
+import select
+import logging
+import ipaddress
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+try:
+    from hydrophone_ping_gps_logger import metrics
+    from hydrophone_ping_gps_logger.gps import GpsClient
+except ImportError:
+    import metrics
+    from gps import GpsClient
+
+NMEA_UDP_PORT = 10110
+NMEA_DATAGRAM_MAX_SIZE = 65508  # IPv4 UDP payload, plus a line ending.
+NETWORK_SCHEMES = ("udp", "tcp")
+DEFAULT_NETWORK_SOURCES = [f"udp://:{NMEA_UDP_PORT}"]  # offered next to the serial ports in the GUI.
+
+
+class NetworkAddress(NamedTuple):
+    scheme: str
+    host: str  # "" for every interface (udp)
+    port: int
+
+
+def parse_network_address(address: str) -> NetworkAddress:
+    """:raise ValueError: Not a `udp://host:port` or `tcp://host:port` address."""
+    parts = urlsplit(address)
+    scheme = parts.scheme.lower()
+    if scheme not in NETWORK_SCHEMES:
+        raise ValueError(f"Unknown GPS network scheme: {address}")
+    port = parts.port or (NMEA_UDP_PORT if scheme == "udp" else None)
+    if port is None:
+        raise ValueError(f"A TCP GPS source needs a port: {address}")
+    if scheme == "tcp" and not parts.hostname:
+        raise ValueError(f"A TCP GPS source needs a host: {address}")
+    return NetworkAddress(scheme, parts.hostname or "", port)
+
+
+def _is_multicast(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_multicast
+    except ValueError:  # a host name
+        return False
+
+
+def network_gps_client(address: str, capture_path=None) -> GpsClient:
+    """:return: `UdpGpsClient` or `TcpGpsClient` from a `udp://` or `tcp://` address."""
+    scheme, host, port = parse_network_address(address)
+    client_class = UdpGpsClient if scheme == "udp" else TcpGpsClient
+    return client_class(host, port, capture_path=capture_path)
+
+
+class _SocketGpsClient(GpsClient, ABC):
+    scheme: str = None
+    buffer_size = 65536  # a whole datagram, never truncated.
+
+    def __init__(self, host: str, port: int, capture_path=None):
+        """
+        :param host: Address to bind (udp) or connect to (tcp).
+        :param port: Network port.
+        :param capture_path: Every byte received is also written to this `nmeacapture` file.
+        """
+        super().__init__(port=f"{self.scheme}://{host}:{port}", baudrate=None, capture_path=capture_path)
+        self.host = host
+        self.network_port = port
+        self.socket: socket.socket = None
+        self.buffer = bytearray(self.buffer_size)
+        self.view = memoryview(self.buffer)
+
+    @abstractmethod
+    def _open(self) -> socket.socket:
+        """:return: The socket, bound (udp) or connected (tcp). :raise OSError:"""
+
+    def connect(self):
+        """
+
+        :return: `1` if connected else `0`
+        """
+        try:
+            self.socket = self._open()
+        except OSError as e:
+            logging.error(f"[{self.client_name}] Could not connect to {self.port}: {e}")
+            return 0
+        self.framer.clear()
+        logging.info(f"[{self.client_name}] Client connected to {self.port}")
+        self.start_capture()
+        return 1
+
+    def _close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def disconnect(self):
+        self._close()
+        self.stop_capture()
+        logging.info(f"[{self.client_name}] Client closed")
+
+    def _received(self, size: int) -> list:
+        self.receive_time = time.monotonic()
+        data = self.view[:size]
+        if self.capture is not None:
+            self.capture.submit(self.receive_time, bytes(data))
+        return self.split_sentences(data)
+
+    def write(self, msg: str):
+        logging.warning(f"[{self.client_name}] Writing to a network GPS is not supported: {msg}")
+
+
+class UdpGpsClient(_SocketGpsClient):
+    """
+    NMEA datagrams, each holding one or more whole sentences. A sentence without a line ending is
+    complete at the end of its datagram.
+    """
+    scheme = "udp"
+    buffer_size = 262144  # datagrams drained per wakeup (at least one whole datagram).
+    receive_buffer_size = 1048576  # SO_RCVBUF: datagrams queued by the OS while sentences are handled.
+
+    def _open(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # shared with other listeners.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size)
+            if _is_multicast(self.host):
+                sock.bind(("", self.network_port))
+                membership = struct.pack("4s4s", socket.inet_aton(self.host), socket.inet_aton("0.0.0.0"))
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            else:
+                sock.bind((self.host, self.network_port))
+            sock.setblocking(False)  # waits in `select`, then drains.
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def read_sentences(self) -> list:
+        """
+        Blocks until a datagram arrives (or `timeout`), then drains every datagram waiting in the
+        socket into the buffer, one after the other.
+
+        :return: List of the complete NMEA sentences received. Can be empty.
+        """
+        view = self.view
+        size = 0
+        try:
+            if not select.select([self.socket], [], [], self.timeout)[0]:
+                return []
+            while len(view) - size >= NMEA_DATAGRAM_MAX_SIZE:
+                received = self.socket.recv_into(view[size:])
+                size += received
+                if received and view[size - 1] != 0x0A:  # no line ending: the datagram is the sentence.
+                    view[size] = 0x0A
+                    size += 1
+        except BlockingIOError:  # drained
+            pass
+        except OSError:
+            metrics.GPS_READ_ERRORS.inc()
+            logging.warning(f"[{self.client_name}] (Read Error) Socket error")
+            time.sleep(self.timeout)  # e.g. network down: don't spin.
+        if not size:
+            return []
+        return self._received(size)
+
+
+class TcpGpsClient(_SocketGpsClient):
+    """NMEA stream from a TCP server, (re)connected every `reconnect_interval` seconds until it answers."""
+    scheme = "tcp"
+    buffer_size = 4096
+    reconnect_interval = 2.
+    reconnect_warning_interval = 60.  # failed attempts are logged at most that often, at WARNING.
+
+    def __init__(self, host: str, port: int, capture_path=None):
+        super().__init__(host, port, capture_path=capture_path)
+        self.next_reconnect: float = None  # time.monotonic() of the next attempt. None while connected.
+        self.reconnect_count = 0
+        self.failed_reconnect_count = 0  # since the connection was lost (or never made).
+        self.next_reconnect_warning: float = None  # time.monotonic() the next failed attempt is logged after.
+
+    def _open(self) -> socket.socket:
+        sock = socket.create_connection((self.host, self.network_port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return sock
+
+    def connect(self):
+        """
+        A server not reachable yet is retried like a lost connection, so the logger can start before it.
+        The failed attempts are logged at WARNING, at most every `reconnect_warning_interval` seconds.
+
+        :return: `1`, even when the server isn't reachable yet: check `socket` for the actual state.
+        """
+        if not super().connect():
+            self.start_capture()
+            self.next_reconnect = time.monotonic() + self.reconnect_interval
+            self.failed_reconnect_count = 0
+            self.next_reconnect_warning = None
+            logging.warning(f"[{self.client_name}] Retrying every {self.reconnect_interval} s")
+        return 1
+
+    def _lost(self, reason: str):
+        metrics.GPS_READ_ERRORS.inc()
+        logging.warning(f"[{self.client_name}] (Read Error) {reason}, reconnecting to {self.port}")
+        self._close()
+        self.framer.clear()  # the partial sentence is lost with the connection.
+        self.next_reconnect = time.monotonic()
+        self.failed_reconnect_count = 0
+        self.next_reconnect_warning = None
+
+    def _reconnect(self):
+        """Waits for the next attempt (at most `timeout`), then tries once."""
+        delay = self.next_reconnect - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, self.timeout))
+            return
+        try:
+            self.socket = self._open()
+        except OSError as e:
+            now = time.monotonic()
+            self.failed_reconnect_count += 1
+            if self.next_reconnect_warning is None or now >= self.next_reconnect_warning:
+                logging.warning(f"[{self.client_name}] Reconnection to {self.port} failed "
+                                f"({self.failed_reconnect_count} attempts): {e}")
+                self.next_reconnect_warning = now + self.reconnect_warning_interval
+            else:
+                logging.debug("[%s] Reconnection failed: %s", self.client_name, e)
+            self.next_reconnect = now + self.reconnect_interval
+            return
+        self.next_reconnect = None
+        self.reconnect_count += 1
+        logging.info(f"[{self.client_name}] Client reconnected to {self.port} "
+                     f"after {self.failed_reconnect_count + 1} attempts")
+
+    def read_sentences(self) -> list:
+        """
+        Blocks until data arrives (or `timeout`). Reconnects when the connection is lost.
+
+        :return: List of the complete NMEA sentences received. Can be empty.
+        """
+        if self.socket is None:
+            self._reconnect()
+            return []
+        try:
+            size = self.socket.recv_into(self.buffer)
+        except socket.timeout:
+            return []
+        except OSError as e:
+            self._lost(f"Socket error: {e}")
+            return []
+        if size == 0:
+            self._lost("Connection closed by the server")
+            return []
+        return self._received(size)
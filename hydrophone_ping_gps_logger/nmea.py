@@ -0,0 +1,197 @@
+"""
+Fast path decoder for the few NMEA sentences the logger uses (RMC, HDT, GGA, VTG).
+
+Only the needed fields are extracted, as text, formatted the same way as the
+values read from `pynmea2` so the two can be used interchangeably:
+ date: `2024-04-24`, time: `12:35:54+00:00`, latitude: `4838.4572`.
+
+Other sentence types are rejected from their id alone before anything is parsed.
+"""
+from typing import NamedTuple
+
+
+class NmeaDecodeError(ValueError):
+    pass
+
+
+class NmeaChecksumError(NmeaDecodeError):
+    pass
+
+
+class RmcSentence(NamedTuple):
+    date: str
+    time: str
+    status: str
+    latitude: str
+    latitude_direction: str
+    longitude: str
+    longitude_direction: str
+    speed_over_ground: str
+    true_course: str
+
+    sentence_type = "RMC"
+
+
+class HdtSentence(NamedTuple):
+    heading: str
+
+    sentence_type = "HDT"
+
+
+class GgaSentence(NamedTuple):
+    time: str
+    latitude: str
+    latitude_direction: str
+    longitude: str
+    longitude_direction: str
+    gps_quality: str
+    number_of_satellites: str
+    horizontal_dilution: str
+    altitude: str
+
+    sentence_type = "GGA"
+
+
+class VtgSentence(NamedTuple):
+    true_track: str
+    speed_over_ground_knots: str
+    speed_over_ground_kmph: str
+
+    sentence_type = "VTG"
+
+
+def nmea_checksum(body: bytes) -> int:
+    """XOR of all the bytes, folded in halves on a single int instead of looping over each byte."""
+    value = int.from_bytes(body, "little")
+    width = len(body) * 8
+    while width > 8:
+        width = (width + 15) // 16 * 8
+        value = (value >> width) ^ (value & ((1 << width) - 1))
+    return value
+
+
+def format_nmea_date(datestamp: str) -> str:
+    """`ddmmyy` -> `yyyy-mm-dd` (same century rule as `strptime('%y')`)"""
+    if not datestamp:
+        return ""
+    if len(datestamp) != 6 or not datestamp.isdigit():
+        raise ValueError(f"Invalid datestamp: {datestamp}")
+    century = "19" if datestamp[4:6] >= "69" else "20"
+    return f"{century}{datestamp[4:6]}-{datestamp[2:4]}-{datestamp[0:2]}"
+
+
+def format_nmea_time(timestamp: str) -> str:
+    """`hhmmss[.ss]` -> `hh:mm:ss[.ffffff]+00:00` (same as `str(datetime.time)`)"""
+    if not timestamp:
+        return ""
+    if len(timestamp) < 6 or not timestamp[:6].isdigit():
+        raise ValueError(f"Invalid timestamp: {timestamp}")
+    microsecond = timestamp[6:] and int(float(timestamp[6:]) * 1000000) or 0
+    if microsecond:
+        return f"{timestamp[0:2]}:{timestamp[2:4]}:{timestamp[4:6]}.{microsecond:06d}+00:00"
+    return f"{timestamp[0:2]}:{timestamp[2:4]}:{timestamp[4:6]}+00:00"
+
+
+def _decode_rmc(fields: list) -> RmcSentence:
+    return RmcSentence(
+        date=format_nmea_date(fields[9]),
+        time=format_nmea_time(fields[1]),
+        status=fields[2],
+        latitude=fields[3],
+        latitude_direction=fields[4],
+        longitude=fields[5],
+        longitude_direction=fields[6],
+        speed_over_ground=fields[7],
+        true_course=fields[8],
+    )
+
+
+def _decode_hdt(fields: list) -> HdtSentence:
+    return HdtSentence(heading=fields[1])
+
+
+def _decode_gga(fields: list) -> GgaSentence:
+    return GgaSentence(
+        time=format_nmea_time(fields[1]),
+        latitude=fields[2],
+        latitude_direction=fields[3],
+        longitude=fields[4],
+        longitude_direction=fields[5],
+        gps_quality=fields[6],
+        number_of_satellites=fields[7],
+        horizontal_dilution=fields[8],
+        altitude=fields[9],
+    )
+
+
+def _decode_vtg(fields: list) -> VtgSentence:
+    return VtgSentence(
+        true_track=fields[1],
+        speed_over_ground_knots=fields[5],
+        speed_over_ground_kmph=fields[7],
+    )
+
+
+DECODERS = {
+    "RMC": _decode_rmc,
+    "HDT": _decode_hdt,
+    "GGA": _decode_gga,
+    "VTG": _decode_vtg,
+}
+
+
+def decode(sentence: str):
+    """
+    :param sentence: A single sentence, e.g. `$GPHDT,274.07,T*03`
+    :return: The decoded sentence or None if the sentence type is not supported.
+    :raises NmeaChecksumError: The checksum is present but doesn't match.
+    :raises NmeaDecodeError: The sentence is malformed.
+    """
+    # `$ttsss,` talker (tt) is ignored. Proprietary sentences (`$P...`) never match.
+    if len(sentence) < 7 or sentence[0] != "$" or sentence[1] == "P":
+        return None
+
+    decoder = DECODERS.get(sentence[3:6])
+    if decoder is None:
+        return None
+
+    star = sentence.rfind("*")
+    if star == -1:  # no checksum, accepted like pynmea2 does.
+        body = sentence[1:]
+    else:
+        body = sentence[1:star]
+        try:
+            checksum = int(sentence[star + 1:star + 3], 16)
+        except ValueError:
+            raise NmeaChecksumError(f"Invalid checksum: {sentence}")
+        if nmea_checksum(body.encode("ascii", "replace")) != checksum:
+            raise NmeaChecksumError(f"Checksum mismatch: {sentence}")
+
+    try:
+        return decoder(body.split(","))
+    except (IndexError, ValueError) as e:
+        raise NmeaDecodeError(f"Could not decode {sentence}: {e}")
+
+
+def nmea_to_degrees(value: str, direction: str) -> float:
+    """`4838.4572`, `N` -> 48.640953... (signed decimal degrees)"""
+    dot = value.find(".")
+    if dot == -1:
+        dot = len(value)
+    degrees = float(value[:dot - 2]) + float(value[dot - 2:]) / 60
+    return -degrees if direction in ("S", "W") else degrees
+
+
+def degrees_to_nmea(value: float, is_latitude: bool, decimals: int = 4) -> str:
+    """48.640953..., True -> `4838.4572 N` (same text layout as `NmeaData` coordinates)"""
+    if is_latitude:
+        direction = "N" if value >= 0 else "S"
+    else:
+        direction = "E" if value >= 0 else "W"
+    value = abs(value)
+    degrees = int(value)
+    minutes = round((value - degrees) * 60, decimals)
+    if minutes >= 60:
+        degrees, minutes = degrees + 1, minutes - 60
+    width = 2 + decimals + (1 if decimals else 0)
+    return f"{degrees:0{2 if is_latitude else 3}d}{minutes:0{width}.{decimals}f} {direction}"
@@ -0,0 +1,203 @@
+"""
+Raw GPS capture (`.nmeacap`): every chunk of bytes read from the serial port, with the time it was
+received, so a field session can be replayed exactly (see `gps.ReplayGpsClient`).
+
+Layout (little-endian), gzip compressed if the file name ends with `.gz`:
+    header: magic `NMEACAPT`, version (u16), metadata size (u16), start time (f8, UTC epoch seconds),
+            start monotonic (f8, seconds), metadata: `# key: value` lines (utf-8).
+    chunks: receive time (f8, seconds since the start monotonic), size (u4), the raw bytes.
+
+Usage:
+    python -m hydrophone_ping_gps_logger.nmeacapture info <file.nmeacap>
+    python -m hydrophone_ping_gps_logger.nmeacapture export <file.nmeacap> [<file.nmea>]
+    python -m hydrophone_ping_gps_logger.nmeacapture replay <file.nmeacap> [--speed 0]
+"""
+import sys
+import gzip
+import time
+import struct
+import logging
+import argparse
+import datetime
+from pathlib import Path
+
+try:
+    from hydrophone_ping_gps_logger.writer import RecordWriter, DurabilityPolicy
+except ImportError:
+    from writer import RecordWriter, DurabilityPolicy
+
+MAGIC = b"NMEACAPT"
+VERSION = 1
+
+HEADER_STRUCT = struct.Struct("<8sHHdd")
+CHUNK_STRUCT = struct.Struct("<dI")
+
+CAPTURE_DURABILITY = DurabilityPolicy(flush_every_record=False, fsync_every_seconds=10)
+
+
+def _opener(path):
+    return gzip.open if str(path).endswith(".gz") else open
+
+
+class NmeaCapture:
+    def __init__(self, path, metadata_lines: list = (), durability: DurabilityPolicy = CAPTURE_DURABILITY):
+        """
+        :param path: Capture file, overwritten by `start`. gzip compressed if it ends with `.gz`.
+        :param metadata_lines: `# key: value` lines (e.g. port and baud rate).
+        """
+        self.path = path
+        self.metadata_lines = list(metadata_lines)
+        self.start_monotonic: float = None
+        self.writer = RecordWriter(
+            path,
+            format_record=self._format_chunk,
+            mode="ab",
+            durability=durability,
+            name="capture_writer",
+            opener=_opener(path),
+        )
+
+    def start(self):
+        self.start_monotonic = time.monotonic()
+        metadata = "".join(line + "\n" for line in self.metadata_lines).encode("utf-8")
+        with _opener(self.path)(self.path, "wb") as f:
+            f.write(HEADER_STRUCT.pack(MAGIC, VERSION, len(metadata), time.time(), self.start_monotonic))
+            f.write(metadata)
+        self.writer.start()
+
+    def submit(self, receive_time: float, data: bytes) -> bool:
+        """
+        Called from the GPS thread for every read. Never blocks.
+
+        :param receive_time: time.monotonic() when `data` was read.
+        """
+        return self.writer.submit((receive_time, data))
+
+    def stop(self):
+        self.writer.stop()
+
+    def _format_chunk(self, chunk: tuple) -> bytes:
+        receive_time, data = chunk
+        return CHUNK_STRUCT.pack(receive_time - self.start_monotonic, len(data)) + data
+
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.file = _opener(path)(path, "rb")
+        try:
+            magic, version, metadata_size, self.start_time, self.start_monotonic = HEADER_STRUCT.unpack(
+                self.file.read(HEADER_STRUCT.size))
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError(f"Not an NMEA capture file: {path}")
+        if version > VERSION:
+            self.file.close()
+            raise ValueError(f"Unsupported NMEA capture version {version}")
+        self.metadata_lines = self.file.read(metadata_size).decode("utf-8").splitlines()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        """:return: Iterator of (seconds since the start of the capture, raw bytes). A truncated last chunk is dropped."""
+        read = self.file.read
+        while True:
+            header = read(CHUNK_STRUCT.size)
+            if len(header) < CHUNK_STRUCT.size:
+                return
+            receive_time, size = CHUNK_STRUCT.unpack(header)
+            data = read(size)
+            if len(data) < size:
+                return
+            yield receive_time, data
+
+    def close(self):
+        self.file.close()
+
+
+def _info(path) -> int:
+    with CaptureReader(path) as reader:
+        start = datetime.datetime.fromtimestamp(reader.start_time, datetime.timezone.utc)
+        chunks = size = lines = 0
+        duration = 0.
+        for duration, data in reader:
+            chunks += 1
+            size += len(data)
+            lines += data.count(b"\n")
+        for line in reader.metadata_lines:
+            print(line)
+    print(f"start: {start.isoformat()}, duration: {duration:.1f} s, chunks: {chunks}, bytes: {size}, lines: {lines}")
+    return 0
+
+
+def _export(path, output) -> int:
+    """Writes the sentences, one per line (e.g. for `benchmarks/bench_nmea_decoder.py`)."""
+    try:
+        from hydrophone_ping_gps_logger.gps import NmeaFramer
+    except ImportError:
+        from gps import NmeaFramer
+
+    output = output or Path(path).with_suffix(".nmea")
+    framer = NmeaFramer()
+    count = 0
+    with CaptureReader(path) as reader, open(output, "wb") as f:
+        for _, data in reader:
+            for sentence in framer.feed(data):
+                f.write(sentence + b"\n")
+                count += 1
+    print(f"{count} sentences written to {output}")
+    return 0
+
+
+def _replay(path, speed: float) -> int:
+    """Feeds a capture to a `GpsController`, reports the sentences handled per second."""
+    try:
+        from hydrophone_ping_gps_logger.gps import GpsController, ReplayGpsClient
+    except ImportError:
+        from gps import GpsController, ReplayGpsClient
+
+    controller = GpsController()
+    client = ReplayGpsClient(path, speed=speed)
+    start = time.perf_counter()
+    controller.connect_client(client)
+    while controller.is_connected and not client.finished:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    controller.disconnect()
+    print(f"{client.sentence_count} sentences, {client.byte_count} bytes in {elapsed:.2f} s: "
+          f"{client.sentence_count / elapsed:.0f} sentences/s")
+    return 0
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="nmeacapture", description="Raw GPS capture tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="capture summary").add_argument("capture")
+    export = subparsers.add_parser("export", help="sentences as text, one per line")
+    export.add_argument("capture")
+    export.add_argument("output", nargs="?")
+    replay = subparsers.add_parser("replay", help="replay through a GpsController and measure its throughput")
+    replay.add_argument("capture")
+    replay.add_argument("--speed", type=float, default=0, help="1: real time, N: N times faster, 0: max speed")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    try:
+        if args.command == "info":
+            return _info(args.capture)
+        if args.command == "export":
+            return _export(args.capture, args.output)
+        return _replay(args.capture, args.speed)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+"""
+Rebroadcast of the GPS sentences to the other software of the computer or of the LAN (navigation,
+acoustic processing, a second logger), since `GpsController` holds the serial port.
+
+`GpsController` hands every burst of sentences read to `NmeaFanout.submit` (when its `fanout` is
+set), before decoding them. The fan-out thread sends them to UDP targets (unicast or broadcast,
+one datagram per burst) and to the TCP clients of its server. Each TCP client has a bounded queue;
+a client that doesn't keep up is disconnected, the GPS thread never waits for it. The bursts waiting
+for the fan-out thread are bounded the same way: when it falls behind, the oldest are dropped.
+"""
+import socket
+import logging
+import selectors
+import threading
+from collections import deque
+
+try:
+    from hydrophone_ping_gps_logger import metrics
+except ImportError:
+    import metrics
+
+FANOUT_QUEUE_SIZE = 200  # bursts per TCP client, 10 s of a 20 Hz GPS.
+UDP_DATAGRAM_SIZE = 1400  # bytes, below the Ethernet MTU: bigger bursts are split between sentences.
+
+
+def parse_udp_targets(text: str) -> list:
+    """:return: [(host, port)] from `host:port, host:port`."""
+    targets = []
+    for target in filter(None, (t.strip() for t in text.split(","))):
+        host, _, port = target.rpartition(":")
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid UDP target (host:port): {target}")
+        targets.append((host, int(port)))
+    return targets
+
+
+def parse_sentence_types(text: str) -> set:
+    """:return: {"RMC", "HDT"} from `RMC, HDT`. None (every sentence) if empty."""
+    types = {t.strip().upper() for t in text.split(",") if t.strip()}
+    return types or None
+
+
+def _datagrams(data: bytes) -> list:
+    """:return: `data` split between sentences in chunks of at most `UDP_DATAGRAM_SIZE` (unless a line is bigger)."""
+    if len(data) <= UDP_DATAGRAM_SIZE:
+        return [data]
+    datagrams = []
+    start = 0
+    while start < len(data):
+        end = data.rfind(b"\n", start, start + UDP_DATAGRAM_SIZE) + 1
+        if end <= start:  # a single line bigger than a datagram.
+            end = data.find(b"\n", start + UDP_DATAGRAM_SIZE) + 1 or len(data)
+        datagrams.append(data[start:end])
+        start = end
+    return datagrams
+
+
+class _TcpClient:
+    __slots__ = ("socket", "address", "queue", "writing")
+
+    def __init__(self, sock: socket.socket, address: tuple):
+        self.socket = sock
+        self.address = address
+        self.queue = deque()  # bytes or memoryview (rest of a partial send)
+        self.writing = False  # registered for EVENT_WRITE
+
+
+class NmeaFanout:
+    encoding = "utf-8"
+
+    def __init__(self, udp_targets: list = (), tcp_port: int = None, tcp_host: str = "127.0.0.1",
+                 sentence_types: set = None, queue_size: int = FANOUT_QUEUE_SIZE):
+        """
+        :param udp_targets: [(host, port)], broadcast addresses included.
+        :param tcp_port: Port of the TCP server. None: no server.
+        :param tcp_host: Interface of the TCP server. `0.0.0.0` to serve the LAN.
+        :param sentence_types: Only forwards these types (e.g. {"RMC", "HDT"}). None: every sentence.
+        :param queue_size: Bursts queued per TCP client before it is disconnected, and bursts waiting for
+            the fan-out thread before the oldest are dropped.
+        """
+        self.udp_targets = list(udp_targets)
+        self.tcp_port = tcp_port
+        self.tcp_host = tcp_host
+        self.sentence_types = set(sentence_types) if sentence_types else None
+        self.queue_size = queue_size
+
+        self.pending = deque(maxlen=queue_size)  # bursts from the GPS thread, not yet sent.
+        self.selector: selectors.BaseSelector = None
+        self.server: socket.socket = None
+        self.udp_socket: socket.socket = None
+        self.wakeup_receiver: socket.socket = None
+        self.wakeup_sender: socket.socket = None
+        self.clients = {}  # {socket: _TcpClient}
+        self.thread: threading.Thread = None
+        self.is_running = False
+
+        self.burst_count = 0
+        self.dropped_client_count = 0
+        self.dropped_burst_count = 0
+
+    def start(self):
+        """:raise OSError: e.g. the TCP port is already in use."""
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()
+        self.wakeup_receiver.setblocking(False)
+        self.wakeup_sender.setblocking(False)
+        self.selector.register(self.wakeup_receiver, selectors.EVENT_READ)
+        try:
+            if self.udp_targets:
+                self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                self.udp_socket.setblocking(False)
+            if self.tcp_port is not None:
+                self.server = socket.create_server((self.tcp_host, self.tcp_port))
+                self.server.setblocking(False)
+                self.tcp_port = self.server.getsockname()[1]  # when started on port 0
+                self.selector.register(self.server, selectors.EVENT_READ)
+        except OSError:
+            self._close()
+            raise
+
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name="nmea_fanout", daemon=True)
+        self.thread.start()
+        targets = [f"udp://{host}:{port}" for host, port in self.udp_targets]
+        if self.server is not None:
+            targets.append(f"tcp://{self.tcp_host}:{self.tcp_port}")
+        logging.info(f"[nmea_fanout] Rebroadcasting {', '.join(sorted(self.sentence_types or ['all']))} "
+                     f"sentences to {', '.join(targets) or 'nobody'}")
+
+    def stop(self):
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._wakeup()
+        self.thread.join()
+        self._close()
+        logging.info(f"[nmea_fanout] Stopped: {self.burst_count} bursts, {self.dropped_burst_count} dropped, "
+                     f"{self.dropped_client_count} slow clients dropped")
+
+    def submit(self, sentences: list):
+        """
+        Called from the GPS thread for every burst read. Never blocks.
+
+        :param sentences: NMEA sentences (str), without line endings.
+        """
+        if not self.is_running:
+            return
+        if self.sentence_types is not None:
+            sentences = [s for s in sentences if s[3:6] in self.sentence_types]
+            if not sentences:
+                return
+        if len(self.pending) == self.queue_size:  # the oldest burst is pushed out by the append.
+            self.dropped_burst_count += 1
+            metrics.NMEA_FANOUT_BURSTS_DROPPED.inc()
+            logging.warning("[nmea_fanout] Fan-out behind, burst dropped")
+        self.pending.append("".join(s + "\r\n" for s in sentences).encode(self.encoding))
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self.wakeup_sender.send(b"\0")
+        except OSError:  # full: the thread has plenty of wakeups pending.
+            pass
+
+    def _close(self):
+        for client in list(self.clients.values()):
+            self._drop(client, "fan-out stopped", slow=False)
+        for sock in (self.server, self.udp_socket, self.wakeup_receiver, self.wakeup_sender):
+            if sock is not None:
+                sock.close()
+        self.server = self.udp_socket = self.wakeup_receiver = self.wakeup_sender = None
+        self.selector.close()
+
+    def _run(self):
+        while self.is_running:
+            for key, events in self.selector.select():
+                sock = key.fileobj
+                if sock is self.wakeup_receiver:
+                    self._drain_wakeups()
+                    self._send_pending()
+                elif sock is self.server:
+                    self._accept()
+                elif sock in self.clients:  # not dropped earlier in this loop
+                    client = self.clients[sock]
+                    if events & selectors.EVENT_READ:
+                        self._read(client)
+                    if events & selectors.EVENT_WRITE and sock in self.clients:
+                        self._flush(client)
+
+    def _drain_wakeups(self):
+        try:
+            while self.wakeup_receiver.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _send_pending(self):
+        pending = self.pending
+        while pending:
+            data = pending.popleft()
+            self.burst_count += 1
+            if self.udp_socket is not None:
+                for datagram in _datagrams(data):
+                    for target in self.udp_targets:
+                        try:
+                            self.udp_socket.sendto(datagram, target)
+                        except OSError as e:  # e.g. network down: the next burst tries again.
+                            logging.debug("[nmea_fanout] UDP send to %s failed: %s", target, e)
+            for client in list(self.clients.values()):
+                if len(client.queue) >= self.queue_size:
+                    self._drop(client, "too slow")
+                    continue
+                client.queue.append(data)
+                if not client.writing:
+                    self._flush(client)
+
+    def _accept(self):
+        try:
+            sock, address = self.server.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.clients[sock] = _TcpClient(sock, address)
+        self.selector.register(sock, selectors.EVENT_READ)
+        metrics.NMEA_FANOUT_CLIENTS.inc()
+        logging.info(f"[nmea_fanout] Client connected: {address[0]}:{address[1]}")
+
+    def _read(self, client: _TcpClient):
+        """Clients only listen: their data is discarded, an end of file closes them."""
+        try:
+            if client.socket.recv(4096):
+                return
+            reason = "closed by the client"
+        except BlockingIOError:
+            return
+        except OSError as e:
+            reason = str(e)
+        self._drop(client, reason, slow=False)
+
+    def _flush(self, client: _TcpClient):
+        """Sends what the socket takes without blocking, the rest once it is writable."""
+        queue = client.queue
+        try:
+            while queue:
+                data = queue[0]
+                sent = client.socket.send(data)
+                if sent < len(data):
+                    queue[0] = memoryview(data)[sent:]
+                    break
+                queue.popleft()
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            self._drop(client, str(e), slow=False)
+            return
+
+        if bool(queue) != client.writing:
+            client.writing = bool(queue)
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.writing else 0)
+            self.selector.modify(client.socket, events)
+
+    def _drop(self, client: _TcpClient, reason: str, slow: bool = True):
+        del self.clients[client.socket]
+        self.selector.unregister(client.socket)
+        client.socket.close()
+        metrics.NMEA_FANOUT_CLIENTS.dec()
+        address = f"{client.address[0]}:{client.address[1]}"
+        if slow:
+            self.dropped_client_count += 1
+            metrics.NMEA_FANOUT_CLIENTS_DROPPED.inc()
+            logging.warning(f"[nmea_fanout] Client {address} disconnected: {reason}")
+        else:
+            logging.info(f"[nmea_fanout] Client {address} disconnected: {reason}")
@@ -0,0 +1,251 @@
+"""
+Compact binary ping log (`.pingb`), an optional alternative to the text `.ping` file.
+
+Layout (little-endian):
+    header:  magic `PINGLOGB`, version (u16), record size (u16), metadata size (u32),
+             metadata: the same `# key: value` lines as the text header (utf-8),
+             zero padded so the records start on an 8 bytes boundary.
+    records: epoch_ns (i8), gps_time (f8, UTC epoch seconds), latitude (f8), longitude (f8),
+             heading (f8), utc_offset_minutes (i2), flags (u2), 4 padding bytes.
+
+A GPS time without a date (e.g. a GGA only receiver) is kept as the UTC seconds since midnight
+in `gps_time`, flagged `FLAG_GPS_TIME_OF_DAY` instead of `FLAG_GPS_TIME`.
+
+Latitude and longitude are signed decimal degrees. Missing values are nan with their flag unset.
+The flags also keep the number of decimals of the text coordinates and heading so the text
+layout is rebuilt exactly: text -> binary -> text is lossless. The binary records keep the
+computer time at nanosecond precision, the text timestamp is truncated to the second.
+
+The records can be memory-mapped as a numpy structured array, see `load`.
+
+Usage:
+    python -m hydrophone_ping_gps_logger.pingbinary to-binary <file.ping> [<file.pingb>]
+    python -m hydrophone_ping_gps_logger.pingbinary to-text <file.pingb> [<file.ping>]
+"""
+import os
+import sys
+import math
+import logging
+import struct
+import datetime
+from pathlib import Path
+
+try:
+    from hydrophone_ping_gps_logger import nmea
+except ImportError:
+    import nmea
+
+MAGIC = b"PINGLOGB"
+VERSION = 1
+
+HEADER_STRUCT = struct.Struct("<8sHHI")
+RECORD_STRUCT = struct.Struct("<qddddhH4x")
+
+RECORD_FIELDS = [
+    ("epoch_ns", "<i8"),
+    ("gps_time", "<f8"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("heading", "<f8"),
+    ("utc_offset_minutes", "<i2"),
+    ("flags", "<u2"),
+    ("padding", "V4"),
+]
+
+FLAG_GPS_TIME = 0x1
+FLAG_POSITION = 0x2
+FLAG_HEADING = 0x4
+FLAG_GPS_TIME_OF_DAY = 0x8  # gps_time is the seconds since midnight, the date is unknown.
+LATITUDE_DECIMALS_SHIFT = 4
+LONGITUDE_DECIMALS_SHIFT = 8
+HEADING_DECIMALS_SHIFT = 12
+
+TEXT_TIMESTAMP_FORMAT = "%Y%m%dT%H%M%S%z"
+
+
+def encode_header(metadata_lines: list) -> bytes:
+    """:param metadata_lines: `# key: value` lines, without line endings."""
+    metadata = "".join(line + "\n" for line in metadata_lines).encode("utf-8")
+    header = HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_STRUCT.size, len(metadata)) + metadata
+    return header + bytes(-len(header) % 8)
+
+
+def read_header(f) -> tuple:
+    """
+    :param f: Binary file object positioned at the start of the file.
+    :return: (metadata lines, offset of the first record). The file is left at that offset.
+    """
+    magic, version, record_size, metadata_size = HEADER_STRUCT.unpack(f.read(HEADER_STRUCT.size))
+    if magic != MAGIC:
+        raise ValueError("Not a binary ping file")
+    if version > VERSION or record_size != RECORD_STRUCT.size:
+        raise ValueError(f"Unsupported binary ping file version {version} (record size {record_size})")
+    metadata_lines = f.read(metadata_size).decode("utf-8").splitlines()
+    offset = HEADER_STRUCT.size + metadata_size
+    offset += -offset % 8
+    f.seek(offset)
+    return metadata_lines, offset
+
+
+def _decimals(value: str) -> int:
+    return min(len(value) - value.index(".") - 1, 15) if "." in value else 0
+
+
+def pack_record(epoch_ns: int, utc_offset_minutes: int, date: str, time: str,
+                latitude: str, longitude: str, heading: str) -> bytes:
+    """
+    :param date, time, latitude, longitude, heading: Text values as in `NmeaData`,
+        e.g. `2024-04-24`, `12:35:54+00:00`, `4838.4572 N`, `06809.4211 W`, `274.07`.
+        A value that can't be parsed (garbled GPS text) is stored as missing, the record is kept.
+    """
+    flags = 0
+    gps_time = lat = lon = head = math.nan
+
+    if time:
+        try:
+            gps_datetime = datetime.datetime.fromisoformat(f"{date or '1970-01-01'}T{time}")
+            if gps_datetime.tzinfo is None:
+                gps_datetime = gps_datetime.replace(tzinfo=datetime.timezone.utc)
+            gps_time = gps_datetime.timestamp()
+        except ValueError:
+            pass
+        else:
+            if date:
+                flags |= FLAG_GPS_TIME
+            else:
+                gps_time %= 86400
+                flags |= FLAG_GPS_TIME_OF_DAY
+
+    if latitude.strip() and longitude.strip():
+        try:
+            lat_value, lat_direction = latitude.split()
+            lon_value, lon_direction = longitude.split()
+            lat = nmea.nmea_to_degrees(lat_value, lat_direction)
+            lon = nmea.nmea_to_degrees(lon_value, lon_direction)
+        except ValueError:
+            lat = lon = math.nan
+        else:
+            flags |= (FLAG_POSITION
+                      | _decimals(lat_value) << LATITUDE_DECIMALS_SHIFT
+                      | _decimals(lon_value) << LONGITUDE_DECIMALS_SHIFT)
+
+    heading = str(heading).strip()
+    if heading:
+        try:
+            head = float(heading)
+        except ValueError:
+            pass
+        else:
+            flags |= FLAG_HEADING | _decimals(heading) << HEADING_DECIMALS_SHIFT
+
+    return RECORD_STRUCT.pack(epoch_ns, gps_time, lat, lon, head, utc_offset_minutes, flags)
+
+
+def unpack_record(data: bytes) -> tuple:
+    """:return: (epoch_ns, utc_offset_minutes, date, time, latitude, longitude, heading), the inverse of `pack_record`."""
+    epoch_ns, gps_time, lat, lon, head, utc_offset_minutes, flags = RECORD_STRUCT.unpack(data)
+
+    date = time = latitude = longitude = heading = ""
+    if flags & FLAG_GPS_TIME:
+        gps_datetime = datetime.datetime.fromtimestamp(round(gps_time, 6), tz=datetime.timezone.utc)
+        date, time = str(gps_datetime.date()), str(gps_datetime.timetz())
+    elif flags & FLAG_GPS_TIME_OF_DAY:
+        time = str(datetime.datetime.fromtimestamp(round(gps_time, 6), tz=datetime.timezone.utc).timetz())
+    if flags & FLAG_POSITION:
+        latitude = nmea.degrees_to_nmea(lat, True, flags >> LATITUDE_DECIMALS_SHIFT & 0xF)
+        longitude = nmea.degrees_to_nmea(lon, False, flags >> LONGITUDE_DECIMALS_SHIFT & 0xF)
+    if flags & FLAG_HEADING:
+        heading = f"{head:.{flags >> HEADING_DECIMALS_SHIFT & 0xF}f}"
+
+    return epoch_ns, utc_offset_minutes, date, time, latitude, longitude, heading
+
+
+def format_timestamp(epoch_ns: int, utc_offset_minutes: int) -> str:
+    """Computer time as written in the text file: `20240424T083551-0400`"""
+    tz = datetime.timezone(datetime.timedelta(minutes=utc_offset_minutes))
+    return datetime.datetime.fromtimestamp(epoch_ns // 1_000_000_000, tz=tz).strftime(TEXT_TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(timestamp: str) -> tuple:
+    """:return: (epoch_ns, utc_offset_minutes) of a text timestamp."""
+    value = datetime.datetime.strptime(timestamp, TEXT_TIMESTAMP_FORMAT)
+    return int(value.timestamp()) * 1_000_000_000, int(value.utcoffset().total_seconds() // 60)
+
+
+def record_dtype():
+    """numpy structured dtype of the records (numpy is only needed for this and `load`)."""
+    import numpy as np
+
+    return np.dtype(RECORD_FIELDS)
+
+
+def load(path) -> tuple:
+    """
+    :return: (metadata lines, records memory-mapped as a numpy structured array). A partial
+        last record (interrupted write) is left out, like `binary_to_text` does.
+    """
+    import numpy as np
+
+    with open(path, "rb") as f:
+        metadata_lines, offset = read_header(f)
+        count, tail = divmod(max(os.fstat(f.fileno()).st_size - offset, 0), RECORD_STRUCT.size)
+    if tail:
+        logging.warning(f"{path}: {tail} bytes of a partial last record ignored")
+    return metadata_lines, np.memmap(path, dtype=record_dtype(), mode="r", offset=offset, shape=(count,))
+
+
+def _text_format():
+    try:
+        from hydrophone_ping_gps_logger import pingloggercontroller
+    except ImportError:
+        import pingloggercontroller
+    return pingloggercontroller
+
+
+def text_to_binary(text_path, binary_path):
+    with open(text_path) as src, open(binary_path, "wb") as dst:
+        metadata_lines = []
+        for line in src:  # header, up to the column names
+            if not line.startswith("#"):
+                break
+            metadata_lines.append(line.rstrip("\n"))
+        dst.write(encode_header(metadata_lines))
+
+        for line in src:
+            if not line.strip():
+                continue
+            timestamp, date, time, latitude, longitude, heading = (v.strip() for v in line.rstrip("\n").split(","))
+            dst.write(pack_record(*parse_timestamp(timestamp), date, time, latitude, longitude, heading))
+
+
+def binary_to_text(binary_path, text_path):
+    text_format = _text_format()
+    with open(binary_path, "rb") as src, open(text_path, "w") as dst:
+        metadata_lines, _ = read_header(src)
+        for line in metadata_lines:
+            dst.write(line + "\n")
+        dst.write(text_format.format_data_line(text_format.FIELD_NAME) + "\n")
+
+        while data := src.read(RECORD_STRUCT.size):
+            if len(data) < RECORD_STRUCT.size:  # interrupted write
+                break
+            epoch_ns, utc_offset_minutes, *fields = unpack_record(data)
+            dst.write(text_format.format_data_line([format_timestamp(epoch_ns, utc_offset_minutes), *fields]) + "\n")
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (2, 3) or argv[0] not in ("to-binary", "to-text"):
+        print(__doc__)
+        return 1
+
+    src = Path(argv[1])
+    if argv[0] == "to-binary":
+        text_to_binary(src, argv[2] if len(argv) == 3 else src.with_suffix(".pingb"))
+    else:
+        binary_to_text(src, argv[2] if len(argv) == 3 else src.with_suffix(".ping"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
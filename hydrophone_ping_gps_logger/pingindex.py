@@ -0,0 +1,412 @@
+"""
+Index of a directory tree of ping files (`.ping` and `.pingb`), for time and position lookups
+across runs without opening every file.
+
+The index is a sqlite database. For each file it keeps the size and mtime (only files that
+changed are indexed again by `update`), the ship name, the time range and the bounding box of
+the positions. The records of each file are grouped in blocks of `BLOCK_RECORDS` consecutive
+records, each with its byte offset, length, time range and bounding box, so a query only
+reads the blocks that can match.
+
+Times are the computer timestamps (UTC epoch seconds), always present even without GPS.
+Records without a position only match queries without a bounding box.
+
+Usage:
+    python -m hydrophone_ping_gps_logger.pingindex update <index.sqlite> <directory> [<directory> ...]
+    python -m hydrophone_ping_gps_logger.pingindex query <index.sqlite> [--start 2024-04-24T08:00]
+        [--end 2024-04-24T09:00] [--bbox LAT_MIN LON_MIN LAT_MAX LON_MAX] [--ship NAME]
+"""
+import sys
+import math
+import sqlite3
+import logging
+import argparse
+import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    from hydrophone_ping_gps_logger import pingbinary
+    from hydrophone_ping_gps_logger import pingreader
+except ImportError:
+    import pingbinary
+    import pingreader
+
+BLOCK_RECORDS = 256
+FILE_SUFFIXES = {".ping": "text", ".pingb": "binary"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    ship_name TEXT,
+    record_count INTEGER NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    lat_min REAL,
+    lat_max REAL,
+    lon_min REAL,
+    lon_max REAL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    byte_offset INTEGER NOT NULL,
+    byte_length INTEGER NOT NULL,
+    record_count INTEGER NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    lat_min REAL,
+    lat_max REAL,
+    lon_min REAL,
+    lon_max REAL
+);
+CREATE INDEX IF NOT EXISTS blocks_file_time ON blocks(file_id, start_time);
+"""
+
+RANGE_COLUMNS = "start_time, end_time, lat_min, lat_max, lon_min, lon_max"
+
+
+class IndexedFile(NamedTuple):
+    id: int
+    path: str
+    format: str
+    ship_name: str
+    record_count: int
+    start_time: float
+    end_time: float
+    lat_min: float
+    lat_max: float
+    lon_min: float
+    lon_max: float
+
+
+class BoundingBox(NamedTuple):
+    """Decimal degrees. `lon_min > lon_max` crosses the antimeridian."""
+    lat_min: float
+    lon_min: float
+    lat_max: float
+    lon_max: float
+
+
+def _nullable(value: float):
+    return None if math.isnan(value) else float(value)
+
+
+def _binary_to_ping_records(raw: np.ndarray) -> np.ndarray:
+    """`pingbinary` records -> `pingreader.PING_DTYPE`"""
+    records = np.empty(len(raw), pingreader.PING_DTYPE)
+    records["timestamp"] = (raw["epoch_ns"] // 1_000_000_000).astype("M8[s]")
+    records["utc_offset_minutes"] = raw["utc_offset_minutes"]
+    gps_time = np.round(raw["gps_time"] * 1_000_000)
+    has_gps_time = (raw["flags"] & pingbinary.FLAG_GPS_TIME) != 0
+    records["gps_datetime"] = np.where(has_gps_time, gps_time, 0).astype(np.int64).astype("M8[us]")
+    records["gps_datetime"][~has_gps_time] = np.datetime64("NaT")
+    records["latitude"] = raw["latitude"]
+    records["longitude"] = raw["longitude"]
+    records["heading"] = raw["heading"]
+    return records
+
+
+def _epoch_seconds(records: np.ndarray) -> np.ndarray:
+    """Computer timestamps of `PING_DTYPE` records as float seconds, nan if missing."""
+    timestamp = records["timestamp"]
+    seconds = timestamp.astype(np.int64).astype(np.float64)
+    seconds[np.isnat(timestamp)] = np.nan
+    return seconds
+
+
+def _read_metadata(path, file_format: str) -> dict:
+    """:return: {key: value} of the `# key: value` header."""
+    if file_format == "binary":
+        with open(path, "rb") as f:
+            lines, _ = pingbinary.read_header(f)
+        header = {}
+        for line in lines:
+            key, _, value = line.lstrip("#").partition(":")
+            header[key.strip()] = value.strip()
+        return header
+
+    with open(path, "rb") as f:
+        _, header = pingreader.read_header(f, path)
+    return header
+
+
+def _iter_chunks(path, file_format: str):
+    """:return: (generator of (records as `PING_DTYPE`, byte offset of each record), end offset of the records)"""
+    if file_format == "binary":
+        with open(path, "rb") as f:
+            _, offset = pingbinary.read_header(f)
+        _, raw = pingbinary.load(path)
+        size, step = pingbinary.RECORD_STRUCT.size, pingreader.CHUNK_SIZE // pingbinary.RECORD_STRUCT.size
+        chunks = (
+            (_binary_to_ping_records(raw[start:start + step]),
+             offset + np.arange(start, min(start + step, len(raw)), dtype=np.int64) * size)
+            for start in range(0, len(raw), step)
+        )
+        return chunks, offset + len(raw) * size
+
+    chunks = ((records, offsets) for _, records, offsets in pingreader.iter_ping_chunks(path, with_offsets=True))
+    return chunks, Path(path).stat().st_size
+
+
+def _block_rows(path, file_format: str, block_records: int):
+    """:return: Generator of (byte_offset, byte_length, record_count, start_time, end_time, lat_min, ...)"""
+    chunks, end = _iter_chunks(path, file_format)
+    pending = None  # (records, offsets) of the last block, carried over to the next chunk to know where it ends.
+    for records, offsets in chunks:
+        if pending is not None:
+            records = np.concatenate((pending[0], records))
+            offsets = np.concatenate((pending[1], offsets))
+        if not len(records):
+            continue
+
+        complete = (len(records) - 1) // block_records * block_records
+        pending = records[complete:], offsets[complete:]
+        yield from _summarize_blocks(records[:complete], offsets[:complete], offsets[complete], block_records)
+
+    if pending is not None:
+        yield from _summarize_blocks(*pending, end, block_records)
+
+
+def _summarize_blocks(records: np.ndarray, offsets: np.ndarray, end: int, block_records: int):
+    if not len(records):
+        return
+    starts = np.arange(0, len(records), block_records)
+    block_ends = np.append(offsets[starts[1:]], end)
+    times = _epoch_seconds(records)
+    positions = ~(np.isnan(records["latitude"]) | np.isnan(records["longitude"]))
+    latitude = np.where(positions, records["latitude"], np.nan)
+    longitude = np.where(positions, records["longitude"], np.nan)
+
+    with np.errstate(invalid="ignore"):
+        columns = (
+            np.fmin.reduceat(times, starts), np.fmax.reduceat(times, starts),
+            np.fmin.reduceat(latitude, starts), np.fmax.reduceat(latitude, starts),
+            np.fmin.reduceat(longitude, starts), np.fmax.reduceat(longitude, starts),
+        )
+    counts = np.diff(np.append(starts, len(records)))
+    for i, start in enumerate(starts):
+        yield (int(offsets[start]), int(block_ends[i] - offsets[start]), int(counts[i]),
+               *(_nullable(column[i]) for column in columns))
+
+
+def _range_condition(start_time: float, end_time: float, bbox: BoundingBox) -> tuple:
+    """:return: (sql condition on the `RANGE_COLUMNS`, parameters)"""
+    conditions, parameters = ["1"], []
+    if start_time is not None:
+        conditions.append("end_time >= ?")
+        parameters.append(start_time)
+    if end_time is not None:
+        conditions.append("start_time <= ?")
+        parameters.append(end_time)
+    if bbox is not None:
+        conditions.append("lat_max >= ? AND lat_min <= ?")
+        parameters += [bbox.lat_min, bbox.lat_max]
+        conditions.append("(lon_max >= ? AND lon_min <= ?)" if bbox.lon_min <= bbox.lon_max
+                          else "(lon_max >= ? OR lon_min <= ?)")
+        parameters += [bbox.lon_min, bbox.lon_max]
+    return " AND ".join(conditions), parameters
+
+
+def _record_mask(records: np.ndarray, start_time: float, end_time: float, bbox: BoundingBox) -> np.ndarray:
+    times = _epoch_seconds(records)
+    mask = np.ones(len(records), bool)
+    with np.errstate(invalid="ignore"):
+        if start_time is not None:
+            mask &= times >= start_time
+        if end_time is not None:
+            mask &= times <= end_time
+        if bbox is not None:
+            latitude, longitude = records["latitude"], records["longitude"]
+            mask &= (latitude >= bbox.lat_min) & (latitude <= bbox.lat_max)
+            if bbox.lon_min <= bbox.lon_max:
+                mask &= (longitude >= bbox.lon_min) & (longitude <= bbox.lon_max)
+            else:
+                mask &= (longitude >= bbox.lon_min) | (longitude <= bbox.lon_max)
+    return mask
+
+
+class PingIndex:
+    def __init__(self, index_path, block_records: int = BLOCK_RECORDS):
+        """
+        :param index_path: sqlite database, created if needed.
+        :param block_records: Records per block for the files indexed from now on.
+        """
+        self.index_path = index_path
+        self.block_records = block_records
+        self.connection = sqlite3.connect(str(index_path))
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, root) -> dict:
+        """
+        Indexes the ping files under `root` that are new or whose size or mtime changed,
+        and forgets the indexed files under `root` that no longer exist.
+
+        :return: Number of files {indexed, unchanged, removed, failed}.
+        """
+        root = Path(root).resolve()
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        known = {
+            path: (file_id, size, mtime_ns)
+            for file_id, path, size, mtime_ns in self.connection.execute("SELECT id, path, size, mtime_ns FROM files")
+        }
+
+        seen = set()
+        for path in sorted(root.rglob("*")):
+            file_format = FILE_SUFFIXES.get(path.suffix)
+            if file_format is None or not path.is_file():
+                continue
+            seen.add(str(path))
+            stat = path.stat()
+            previous = known.get(str(path))
+            if previous is not None and previous[1:] == (stat.st_size, stat.st_mtime_ns):
+                counts["unchanged"] += 1
+                continue
+            try:
+                self._index_file(path, file_format, stat)
+            except (OSError, ValueError) as e:
+                counts["failed"] += 1
+                logging.warning(f"Ping index: {path} not indexed: {e}")
+                continue
+            counts["indexed"] += 1
+
+        with self.connection:
+            for path, (file_id, _, _) in known.items():
+                if path not in seen and Path(path).is_relative_to(root):
+                    self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                    counts["removed"] += 1
+
+        logging.info(f"Ping index updated ({root}): {counts}")
+        return counts
+
+    def _index_file(self, path: Path, file_format: str, stat):
+        ship_name = _read_metadata(path, file_format).get("ship_name")
+        rows = list(_block_rows(path, file_format, self.block_records))
+
+        def _reduce(function, column):
+            values = [row[column] for row in rows if row[column] is not None]
+            return function(values) if values else None
+
+        with self.connection:  # one transaction per file: never half indexed.
+            self.connection.execute("DELETE FROM files WHERE path = ?", (str(path),))
+            file_id = self.connection.execute(
+                f"INSERT INTO files (path, size, mtime_ns, format, ship_name, record_count, {RANGE_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, file_format, ship_name, sum(row[2] for row in rows),
+                 _reduce(min, 3), _reduce(max, 4), _reduce(min, 5), _reduce(max, 6), _reduce(min, 7), _reduce(max, 8))
+            ).lastrowid
+            self.connection.executemany(
+                f"INSERT INTO blocks (file_id, byte_offset, byte_length, record_count, {RANGE_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((file_id, *row) for row in rows)
+            )
+
+    def files(self, start_time: float = None, end_time: float = None, bbox: BoundingBox = None,
+              ship_name: str = None) -> list:
+        """
+        :param start_time, end_time: UTC epoch seconds.
+        :return: `IndexedFile` that may have records in the time window and bounding box, by start time.
+        """
+        condition, parameters = _range_condition(start_time, end_time, bbox)
+        if ship_name is not None:
+            condition += " AND ship_name = ?"
+            parameters.append(ship_name)
+        rows = self.connection.execute(
+            f"SELECT id, path, format, ship_name, record_count, {RANGE_COLUMNS} FROM files "
+            f"WHERE record_count > 0 AND {condition} ORDER BY start_time", parameters
+        )
+        return [IndexedFile(*row) for row in rows]
+
+    def query(self, start_time: float = None, end_time: float = None, bbox: BoundingBox = None,
+              ship_name: str = None):
+        """
+        Reads only the blocks of records that can match.
+
+        :param start_time, end_time: UTC epoch seconds.
+        :return: Generator of (`IndexedFile`, structured array of `pingreader.PING_DTYPE`) for each file with
+            matching records.
+        """
+        condition, parameters = _range_condition(start_time, end_time, bbox)
+        for indexed_file in self.files(start_time, end_time, bbox, ship_name):
+            blocks = self.connection.execute(
+                f"SELECT byte_offset, byte_length FROM blocks WHERE file_id = ? AND {condition} ORDER BY byte_offset",
+                [indexed_file.id, *parameters]
+            ).fetchall()
+            if not blocks:
+                continue
+
+            chunks = []
+            with open(indexed_file.path, "rb") as f:
+                for byte_offset, byte_length in blocks:
+                    f.seek(byte_offset)
+                    data = f.read(byte_length)
+                    if indexed_file.format == "binary":
+                        raw = np.frombuffer(data[:len(data) - len(data) % pingbinary.RECORD_STRUCT.size],
+                                            pingbinary.record_dtype())
+                        records = _binary_to_ping_records(raw)
+                    else:
+                        records = pingreader.parse_lines(data)
+                    chunks.append(records[_record_mask(records, start_time, end_time, bbox)])
+
+            records = np.concatenate(chunks)
+            if len(records):
+                yield indexed_file, records
+
+
+def _parse_time(value: str) -> float:
+    """ISO 8601 -> UTC epoch seconds. Without a time zone, UTC is assumed."""
+    value = datetime.datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog="pingindex", description="Index and query ping files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = commands.add_parser("update", help="Index new or changed files.")
+    update_parser.add_argument("index", help="sqlite index file")
+    update_parser.add_argument("directories", nargs="+")
+
+    query_parser = commands.add_parser("query", help="Print the records in a time window and/or bounding box.")
+    query_parser.add_argument("index", help="sqlite index file")
+    query_parser.add_argument("--start", type=_parse_time, help="ISO 8601, UTC if no time zone")
+    query_parser.add_argument("--end", type=_parse_time, help="ISO 8601, UTC if no time zone")
+    query_parser.add_argument("--bbox", type=float, nargs=4, metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    query_parser.add_argument("--ship", help="ship name")
+
+    args = parser.parse_args(argv)
+
+    with PingIndex(args.index) as index:
+        if args.command == "update":
+            for directory in args.directories:
+                print(f"{directory}: {index.update(directory)}")
+            return 0
+
+        bbox = BoundingBox(*args.bbox) if args.bbox else None
+        print("path,timestamp,gps_datetime,latitude,longitude,heading")
+        for indexed_file, records in index.query(args.start, args.end, bbox, args.ship):
+            for record in records:
+                print(f"{indexed_file.path},{record['timestamp']}Z,{record['gps_datetime']},"
+                      f"{record['latitude']:.6f},{record['longitude']:.6f},{record['heading']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,11 +5,13 @@ Fields should look like this:
 """
 
 
+import math
 import time
 import datetime
 import logging
 import threading
 
+from typing import NamedTuple
 from dataclasses import dataclass
 
 from pathlib import Path
@@ -17,49 +19,112 @@ from pathlib import Path
 try:
     from hydrophone_ping_gps_logger.gps import GpsController
     from hydrophone_ping_gps_logger.transponder import TransponderController
+    from hydrophone_ping_gps_logger.scheduler import PingScheduler, MissedPingPolicy
+    from hydrophone_ping_gps_logger.writer import RecordWriter, DurabilityPolicy
+    from hydrophone_ping_gps_logger.tracklogger import TrackLogger, TRACK_FIELD_NAME, format_fix
+    from hydrophone_ping_gps_logger.events import EventBus, PingEvent, RunStateEvent, RunState
+    from hydrophone_ping_gps_logger.clock import Clock, REAL_CLOCK
+    from hydrophone_ping_gps_logger import pingbinary, metrics, logsetup
 except ImportError:
     from gps import GpsController
     from transponder import TransponderController
+    from scheduler import PingScheduler, MissedPingPolicy
+    from writer import RecordWriter, DurabilityPolicy
+    from tracklogger import TrackLogger, TRACK_FIELD_NAME, format_fix
+    from events import EventBus, PingEvent, RunStateEvent, RunState
+    from clock import Clock, REAL_CLOCK
+    import pingbinary
+    import metrics
+    import logsetup
 
 
 GARMIN_19XHVS_SAMPLING_INTERVAL = 1/20
 
 FIELD_NAME = ["timestamp", "gsp_date", "gps_time", "gps_lat", "gps_lon", "heading"]
 FIELD_PADDING = [21, 11, 15, 12, 13, 8] # review heading FIXME
+WINDOW_FIELD_NAME = ["ping", "offset_second", *TRACK_FIELD_NAME]
 
 @dataclass
 class PingRunParameters:
     output_directory_path: str = None
     ship_name: str = None
     transponder_depth: float = None
-    ping_interval: int = None
+    ping_interval: float = None
     number_of_pings: int = None
     start_delay_seconds: int = None
+    missed_ping_policy: str = MissedPingPolicy.SKIP
+    output_format: str = "text"  # `text` (.ping) or `binary` (.pingb, see `pingbinary`)
+    track_log: bool = False  # every GPS fix written to a `.track` file (see `tracklogger`)
+    track_min_interval: float = 0  # seconds between the fixes written. 0: every fix
+    track_min_distance: float = 0  # meters between the fixes written. 0: every fix
+    track_compress: bool = True  # `.track.gz`
+    window_pre_seconds: float = 0  # GPS fixes before each ping written to a `.window` file
+    window_post_seconds: float = 0  # GPS fixes after each ping written to a `.window` file
+    run_log: bool = False  # log records of the run written to a `.log.jsonl` file (JSON lines)
+
+
+class PingRecord(NamedTuple):
+    """Handed off by the ping thread, formatted by the writer thread."""
+    epoch_ns: int  # computer time
+    utc_offset_minutes: int  # computer time zone
+    date: str
+    time: str
+    latitude: str
+    longitude: str
+    heading: str
+
+
+class PingWindow(NamedTuple):
+    """GPS fixes around a ping (see `PingLoggerController.capture_ping_window`)."""
+    ping_number: int
+    ping_time: float  # `clock.monotonic()`
+    fixes: list
 
 
 class PingLoggerController:
 
-    def __init__(self):
+    def __init__(self, clock: Clock = REAL_CLOCK):
+        """:param clock: Time source of the controllers, a `clock.VirtualClock` for accelerated simulations."""
+        self.clock = clock
 
-        self.gps_controller = GpsController()
-        self.transponder_controller = TransponderController()
+        self.gps_controller = GpsController(clock=clock)
+        self.transponder_controller = TransponderController(clock=clock)
+
+        # Run events and the events of both controllers: one place to subscribe to.
+        self.events = EventBus()
+        self.gps_controller.events = self.events
+        self.transponder_controller.events = self.events
         self.ping_run_thread: threading.Thread = None
+        self.scheduler: PingScheduler = None
 
         self.is_running = False
 
         self.ping_run_parameters: PingRunParameters = None
 
         self.ping_count = 0
-        self.count_down_delay = 0
-
-        self.ping_paused_event = threading.Event()
-        self.ping_paused_event.set()
 
         self.output_filename: str = None
+        self.header_lines: list = None
+        self.ping_writer: RecordWriter = None
+        self.ping_file_durability = DurabilityPolicy()
+        self.track_logger: TrackLogger = None
+        self.window_writer: RecordWriter = None
+        self.window_timers = {}  # {ping number: `clock` timer} of the windows waiting for their post-trigger fixes.
+        self.window_lock = threading.Lock()
+        self.metrics_snapshot: dict = None  # `metrics.REGISTRY.collect()` at the start of the run.
+        self.run_start_time: float = None  # `clock.monotonic()`
+        self.run_log_handler: logging.Handler = None
         self.bypass_gps = False
 
-    def connect_gps(self, port, baudrate):
-        self.gps_controller.connect(port=port, baudrate=baudrate)
+    @property
+    def count_down_delay(self) -> int:
+        """Seconds left before the first ping."""
+        if self.scheduler is None:
+            return 0
+        return math.ceil(self.scheduler.time_until_start())
+
+    def connect_gps(self, port, baudrate, capture_path=None):
+        self.gps_controller.connect(port=port, baudrate=baudrate, capture_path=capture_path)
 
     def disconnect_gps(self):
         self.gps_controller.disconnect()
@@ -91,13 +156,29 @@ class PingLoggerController:
                 and self.transponder_controller.is_connected):
 
             self.is_running = True
+            self.metrics_snapshot = metrics.REGISTRY.collect()
+            self.run_start_time = self.clock.monotonic()
 
             self.init_ping_file()
+            if self.ping_run_parameters.run_log:
+                self.init_run_log()
+            if self.ping_run_parameters.track_log:
+                self.init_track_file()
+            if self.ping_run_parameters.window_pre_seconds or self.ping_run_parameters.window_post_seconds:
+                self.init_window_file()
+
+            self.clock.sleep(0.1)
+
+            self.scheduler = PingScheduler(
+                interval=self.ping_run_parameters.ping_interval,
+                start_delay=self.ping_run_parameters.start_delay_seconds,
+                policy=self.ping_run_parameters.missed_ping_policy,
+                clock=self.clock
+            )
+            self.scheduler.start()
 
-            time.sleep(0.1)
-
-            self.ping_run_thread = threading.Thread(target=self._ping_run, name="ping_thread", daemon=True)
-            self.ping_run_thread.start()
+            self.events.publish(RunStateEvent(RunState.STARTED, 0))
+            self.ping_run_thread = self.clock.start_thread(self._ping_run, name="ping_thread")
         else:
             logging.warning("Devices (GPS or transponder) not connected. Ping Run not started")
 
@@ -105,18 +186,36 @@ class PingLoggerController:
         self.ping_count = 0
 
         logging.info(f"Start delay: {self.ping_run_parameters.start_delay_seconds} seconds.")
-
-        self.count_down_delay = self.ping_run_parameters.start_delay_seconds
-        while self.count_down_delay > 0:
-            self.count_down_delay -= 1
-            time.sleep(1)
-
-        logging.info(f"Ping mission started. Interval: {self.ping_run_parameters.ping_interval} seconds.")
+        logging.info(f"Ping mission scheduled. Interval: {self.ping_run_parameters.ping_interval} seconds.")
+
+        try:
+            self._ping_loop()
+        finally:
+            self.is_running = False
+            self.events.publish(RunStateEvent(RunState.STOPPED, self.ping_count))
+            self.ping_writer.stop()
+            if self.window_writer is not None:
+                self.wait_ping_windows()
+                self.window_writer.stop()
+                self.window_writer = None
+            if self.track_logger is not None:
+                self.gps_controller.track_logger = None
+                self.track_logger.stop()
+                self.track_logger = None
+            self.write_metrics_file()
+
+            logging.info(f"Ping schedule error (seconds): {self.scheduler.errors.summary()}, "
+                         f"skipped: {self.scheduler.skipped_count}")
+            logging.info(f"Relay latency (seconds): {self.transponder_controller.client.latency_summary()}")
+            if self.run_log_handler is not None:
+                logsetup.remove_handler(self.run_log_handler)
+                self.run_log_handler = None
+
+    def _ping_loop(self):
         while self.is_running:
-            if not self.ping_paused_event.is_set():
-                logging.info("Enter ping run wait section")
-                self.ping_paused_event.wait()
-                logging.info("Enter ping run wait released")
+            # Blocks until the next deadline. Returns None once stopped. Pause is handled by the scheduler.
+            if self.scheduler.wait_next() is None:
+                break
 
             # if self.bypass_gps:
             #     if (not self.gps_controller.is_running):
@@ -124,9 +223,20 @@ class PingLoggerController:
             #         logging.info("Ping Run Break GPS Disconnected")
             #         break
 
-            if self.transponder_controller.ping():
-                self.write_data_to_ping_file()
+            if self.transponder_controller.is_pulsing:
+                logging.warning("Ping skipped, the previous relay pulse is still active.")
+                metrics.PINGS_SKIPPED.inc()
+                continue
+
+            # Returns as soon as the relays are closed, they are released in the background.
+            ping_time = self.transponder_controller.ping()
+            if ping_time is not None:
+                self.write_data_to_ping_file(ping_time=ping_time)
                 self.ping_count += 1
+                metrics.PINGS.inc()
+                self.events.publish(PingEvent(self.ping_count, ping_time))
+                if self.window_writer is not None:
+                    self.capture_ping_window(self.ping_count, ping_time)
             else:
                 self.is_running = False
                 logging.info("Ping Run Break Ping Failed")
@@ -137,69 +247,217 @@ class PingLoggerController:
                 logging.info("Ping Run Break Ping Count Reach")
                 break
 
-            time.sleep(self.ping_run_parameters.ping_interval)
-
     def pause_ping_run(self):
-        self.ping_paused_event.clear()
-        logging.info("pause event clear")
+        if self.scheduler is not None:
+            self.scheduler.pause()
+        self.events.publish(RunStateEvent(RunState.PAUSED, self.ping_count))
+        logging.info("ping run paused")
 
     def unpause_ping_run(self):
-        self.ping_paused_event.set()
-        logging.info("pause event set")
+        if self.scheduler is not None:
+            self.scheduler.resume()
+        self.events.publish(RunStateEvent(RunState.RESUMED, self.ping_count))
+        logging.info("ping run resumed")
 
     def stop_ping_run(self):
-        self.unpause_ping_run()
-        time.sleep(0.1)
         self.is_running = False
-        self.ping_count = 0
+        if self.scheduler is not None:
+            self.scheduler.stop()
         if self.ping_run_thread:
-            self.ping_run_thread.join()
+            self.clock.join(self.ping_run_thread)
+        self.ping_count = 0
 
     def init_ping_file(self):
+        nmea_data = self.gps_controller.nmea_data
         timestamp = (
-                self.gps_controller.nmea_data.date.replace("-", "")
-                + self.gps_controller.nmea_data.time.split("+")[0].replace(":", "")
+                nmea_data.date.replace("-", "")
+                + nmea_data.time.split("+")[0].replace(":", "")
         )
 
         if timestamp == "": # if no gps use the computer time.
-            timestamp = get_timestamp()
+            timestamp = get_timestamp(self.clock)
+
+        binary = self.ping_run_parameters.output_format == "binary"
 
         Path(self.ping_run_parameters.output_directory_path).mkdir(parents=True, exist_ok=True)
         self.output_filename = Path(self.ping_run_parameters.output_directory_path).joinpath(
-            f"{timestamp}_{self.ping_run_parameters.ship_name}.ping"
+            f"{timestamp}_{self.ping_run_parameters.ship_name}.{'pingb' if binary else 'ping'}"
         )
 
-        with open(self.output_filename, "w") as f:
-            f.write(f"# datetime: {timestamp}\n")
-            f.write(f"# ship_name: {self.ping_run_parameters.ship_name}\n")
-            f.write(f"# ping_interval_second: {self.ping_run_parameters.ping_interval}\n")
-            f.write(f"# number_of_pings: {int(self.ping_run_parameters.number_of_pings) or -1}\n")
-            f.write(f"# start_delay_second: {self.ping_run_parameters.start_delay_seconds}\n")
-            f.write(f"# transponder_depth_meter: {self.ping_run_parameters.transponder_depth}\n")
-            f.write(format_data_line(FIELD_NAME) + "\n")
-
-    def write_data_to_ping_file(self):
-        with open(self.output_filename, "a") as f:
-            f.write(
-                format_data_line(
-                    [
-                        get_timestamp(),
-                        self.gps_controller.nmea_data.date,
-                        self.gps_controller.nmea_data.time,
-                        self.gps_controller.nmea_data.latitude,
-                        self.gps_controller.nmea_data.longitude,
-                        self.gps_controller.nmea_data.heading,
-                    ]
-
-                )+"\n"
+        self.header_lines = [
+            f"# datetime: {timestamp}",
+            f"# ship_name: {self.ping_run_parameters.ship_name}",
+            f"# ping_interval_second: {self.ping_run_parameters.ping_interval}",
+            f"# number_of_pings: {int(self.ping_run_parameters.number_of_pings) or -1}",
+            f"# start_delay_second: {self.ping_run_parameters.start_delay_seconds}",
+        ]
+        if self.ping_run_parameters.transponder_depth is not None:  # optional in the headless config.
+            self.header_lines.append(f"# transponder_depth_meter: {self.ping_run_parameters.transponder_depth}")
+
+        if binary:
+            with open(self.output_filename, "wb") as f:
+                f.write(pingbinary.encode_header(self.header_lines))
+            format_record = lambda record: pingbinary.pack_record(*record)
+        else:
+            with open(self.output_filename, "w") as f:
+                for line in self.header_lines:
+                    f.write(line + "\n")
+                f.write(format_data_line(FIELD_NAME) + "\n")
+            format_record = format_ping_record
+
+        # Kept open for the whole run, written from its own thread.
+        self.ping_writer = RecordWriter(
+            self.output_filename,
+            format_record=format_record,
+            mode="ab" if binary else "a",
+            durability=self.ping_file_durability,
+            name="ping_writer"
+        )
+        self.ping_writer.start()
+
+    def init_run_log(self):
+        """Starts writing the log records to a JSON lines file named after the ping file. Call after `init_ping_file`."""
+        self.run_log_handler = logsetup.json_lines_handler(Path(self.output_filename).with_suffix(".log.jsonl"))
+        logsetup.add_handler(self.run_log_handler)
+
+    def init_track_file(self):
+        """Starts logging every GPS fix to a track file named after the ping file. Call after `init_ping_file`."""
+        run_parameters = self.ping_run_parameters
+        self.track_logger = TrackLogger(
+            Path(self.output_filename).with_suffix(".track.gz" if run_parameters.track_compress else ".track"),
+            min_interval=run_parameters.track_min_interval,
+            min_distance=run_parameters.track_min_distance,
+            compress=run_parameters.track_compress,
+            header_lines=self.header_lines,
+        )
+        self.track_logger.start()
+        self.gps_controller.track_logger = self.track_logger
+
+    def init_window_file(self):
+        """Starts writing the GPS fixes around each ping to a `.window` file. Call after `init_ping_file`."""
+        duration = self.ping_run_parameters.window_pre_seconds + self.ping_run_parameters.window_post_seconds
+        history_duration = self.gps_controller.fix_history.capacity * GARMIN_19XHVS_SAMPLING_INTERVAL
+        if duration >= history_duration:
+            logging.warning(f"Ping window ({duration} seconds) longer than the GPS fix history "
+                            f"(~{history_duration:.0f} seconds at 20 Hz). Windows will be truncated.")
+
+        path = Path(self.output_filename).with_suffix(".window")
+        with open(path, "w") as f:
+            for line in self.header_lines:
+                f.write(line + "\n")
+            f.write(f"# window_pre_second: {self.ping_run_parameters.window_pre_seconds}\n")
+            f.write(f"# window_post_second: {self.ping_run_parameters.window_post_seconds}\n")
+            f.write(",".join(WINDOW_FIELD_NAME) + "\n")
+
+        self.window_writer = RecordWriter(
+            path,
+            format_record=format_ping_window,
+            durability=self.ping_file_durability,
+            name="window_writer"
+        )
+        self.window_writer.start()
+
+    def capture_ping_window(self, ping_number: int, ping_time: float):
+        """
+        The fixes before the ping are already in the GPS fix history: the window is read from it
+        once the post-trigger fixes are in too, `window_post_seconds` later, from a timer thread.
+
+        :param ping_time: `clock.monotonic()` when the transponder was pinged.
+        """
+        with self.window_lock:  # the timer removes itself from `window_timers` once submitted.
+            self.window_timers[ping_number] = self.clock.timer(self.ping_run_parameters.window_post_seconds,
+                                                               self._emit_ping_window, args=(ping_number, ping_time))
+
+    def _emit_ping_window(self, ping_number: int, ping_time: float):
+        try:
+            fixes = self.gps_controller.fix_history.fixes(
+                ping_time - self.ping_run_parameters.window_pre_seconds,
+                ping_time + self.ping_run_parameters.window_post_seconds
+            )
+            self.window_writer.submit(PingWindow(ping_number, ping_time, fixes))
+        finally:
+            # Only once submitted: until then `wait_ping_windows` joins this timer, the writer stays open.
+            with self.window_lock:
+                del self.window_timers[ping_number]
+
+    def wait_ping_windows(self):
+        """Waits (up to `window_post_seconds`) for the windows still waiting for their post-trigger fixes."""
+        with self.window_lock:
+            timers = list(self.window_timers.values())
+        for timer in timers:
+            self.clock.join(timer)
+
+    def write_metrics_file(self):
+        """Writes the metrics of the run (changes since it started) next to the ping file."""
+        path = Path(self.output_filename).with_suffix(".metrics.json")
+        try:
+            metrics.REGISTRY.write_json(
+                path,
+                since=self.metrics_snapshot,
+                ping_file=str(self.output_filename),
+                ping_count=self.ping_count,
+                duration_seconds=self.clock.monotonic() - self.run_start_time,
             )
+        except OSError as e:
+            logging.error(f"Could not write the run metrics to {path}: {e}")
+
+    def write_data_to_ping_file(self, ping_time: float = None):
+        """
+        :param ping_time: `clock.monotonic()` when the transponder was pinged. The GPS position is
+            interpolated at that time if possible, else the last fix received is used.
+        """
+        nmea_data = None
+        if ping_time is not None:
+            nmea_data = self.gps_controller.nmea_data_at(ping_time)
+        if nmea_data is None:
+            nmea_data = self.gps_controller.nmea_data
+
+        if ping_time is not None:
+            last_fix = self.gps_controller.fix_history.latest()
+            if last_fix is not None:
+                metrics.FIX_AGE_AT_PING.observe(ping_time - last_fix.receive_time)
+
+        # Formatted and written by the writer thread, never blocks on file I/O.
+        epoch_ns = self.clock.time_ns()
+        self.ping_writer.submit(
+            PingRecord(
+                epoch_ns,
+                time.localtime(epoch_ns // 1_000_000_000).tm_gmtoff // 60,
+                nmea_data.date,
+                nmea_data.time,
+                nmea_data.latitude,
+                nmea_data.longitude,
+                str(nmea_data.heading),
+            )
+        )
 
 
 def format_data_line(data: list) -> str:
     line = ",".join(f"{d:>{p}}" for d, p in zip(data, FIELD_PADDING))
-    logging.debug(f"Data written: {line}")
+    if logging.root.isEnabledFor(logging.DEBUG):  # every record: skip the call when DEBUG is off.
+        logging.debug("Data written: %s", line)
     return line
 
 
-def get_timestamp():
-    return datetime.datetime.now().astimezone().strftime("%Y%m%dT%H%M%S%z")
+def format_ping_record(record: PingRecord) -> str:
+    return format_data_line(
+        [
+            pingbinary.format_timestamp(record.epoch_ns, record.utc_offset_minutes),
+            record.date,
+            record.time,
+            record.latitude,
+            record.longitude,
+            record.heading,
+        ]
+    ) + "\n"
+
+
+def format_ping_window(window: PingWindow) -> str:
+    """One line per fix, `offset_second` is relative to the ping."""
+    return "".join(
+        f"{window.ping_number},{fix.receive_time - window.ping_time:.3f},{format_fix(fix)}\n" for fix in window.fixes
+    ) or None
+
+
+def get_timestamp(clock: Clock = REAL_CLOCK):
+    return datetime.datetime.fromtimestamp(clock.time()).astimezone().strftime("%Y%m%dT%H%M%S%z")
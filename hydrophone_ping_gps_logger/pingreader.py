@@ -0,0 +1,224 @@
+"""
+Vectorized reader of the text `.ping` files, for post-processing.
+
+The `# key: value` header is parsed into a `PingRunParameters` and the body is loaded
+in chunks of raw bytes into numpy structured arrays (`PING_DTYPE`), without a Python
+loop over the lines. Fields are located from the comma positions and, since they are
+right aligned, parsed from a fixed width window ending at the comma:
+
+    timestamp  `20240424T083551-0400` -> datetime64[s] (UTC) + utc_offset_minutes
+    date, time `2024-04-24`, `12:35:54[.ffffff]+00:00` -> gps_datetime, datetime64[us] (UTC)
+    lat, lon   `4838.4572 N`, `06809.4211 W` -> signed decimal degrees
+    heading    `274.07` -> float
+
+Missing values are NaT/nan. Lines without the 6 fields are skipped.
+`iter_ping_chunks` streams files larger than memory.
+"""
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from hydrophone_ping_gps_logger.pingloggercontroller import PingRunParameters
+except ImportError:
+    from pingloggercontroller import PingRunParameters
+
+PING_DTYPE = np.dtype([
+    ("timestamp", "M8[s]"),
+    ("utc_offset_minutes", "i2"),
+    ("gps_datetime", "M8[us]"),
+    ("latitude", "f8"),
+    ("longitude", "f8"),
+    ("heading", "f8"),
+])
+
+CHUNK_SIZE = 64 * 1024 * 1024  # bytes
+
+NUMBER_OF_FIELDS = 6
+SPACE, COMMA, NEWLINE, CARRIAGE_RETURN, DOT, ZERO = b" ,\n\r.0"
+
+HEADER_KEYS = {  # header key: (PingRunParameters attribute, type)
+    "ship_name": ("ship_name", str),
+    "transponder_depth_meter": ("transponder_depth", float),
+    "ping_interval_second": ("ping_interval", float),
+    "number_of_pings": ("number_of_pings", int),
+    "start_delay_second": ("start_delay_seconds", int),
+}
+
+
+def read_header(f, path=None) -> tuple:
+    """
+    :param f: Binary file object at the start of a `.ping` file. Left at the first data line.
+    :return: (PingRunParameters, header as a {key: value} dict of strings)
+    """
+    header = {}
+    while True:
+        line = f.readline()
+        if not line.startswith(b"#"):
+            break  # column names
+        key, _, value = line[1:].decode("utf-8").partition(":")
+        header[key.strip()] = value.strip()
+
+    run_parameters = PingRunParameters(
+        output_directory_path=str(Path(path).parent) if path is not None else None
+    )
+    for key, (attribute, _type) in HEADER_KEYS.items():
+        if key in header and header[key] not in ("", "None"):
+            setattr(run_parameters, attribute, _type(float(header[key])) if _type is int else _type(header[key]))
+    if run_parameters.number_of_pings == -1:  # written as -1 for "until stopped"
+        run_parameters.number_of_pings = 0
+
+    return run_parameters, header
+
+
+def _window(buffer: np.ndarray, starts: np.ndarray, ends: np.ndarray, width: int) -> np.ndarray:
+    """
+    :return: (lines, width) uint8 array of the last `width` bytes of each field (`starts` to `ends`),
+        left padded with spaces.
+    """
+    index = ends.astype(np.int64)[:, None] + np.arange(-width, 0)
+    window = buffer.take(index, mode="clip")
+    window[index < starts[:, None]] = SPACE
+    return window
+
+
+def _digits(window: np.ndarray, first: int, last: int) -> np.ndarray:
+    """Integer value of the digits in columns `first` to `last` (exclusive)."""
+    digits = window[:, first:last].astype(np.int64) - ZERO
+    return digits @ (10 ** np.arange(last - first - 1, -1, -1))
+
+
+def _to_float(window: np.ndarray) -> np.ndarray:
+    """Float value of right aligned text windows, nan if blank."""
+    window = window.copy()
+    window[(window == SPACE).all(axis=1), -3:] = np.frombuffer(b"nan", np.uint8)
+    return window.view(f"S{window.shape[1]}").ravel().astype(np.float64)
+
+
+def _parse_timestamp(window: np.ndarray) -> tuple:
+    """`20240424T083551-0400` (20 bytes) -> (datetime64[s] UTC, utc offset in minutes)"""
+    blank = window[:, -1] == SPACE
+    window = np.where(blank[:, None], ZERO, window)  # parses as zeros, masked below.
+
+    days = (
+        (_digits(window, 0, 4) - 1970).astype("M8[Y]")
+        + (_digits(window, 4, 6) - 1).astype("m8[M]")
+    ).astype("M8[D]") + (_digits(window, 6, 8) - 1).astype("m8[D]")
+    seconds = _digits(window, 9, 11) * 3600 + _digits(window, 11, 13) * 60 + _digits(window, 13, 15)
+
+    offset = (_digits(window, 16, 18) * 60 + _digits(window, 18, 20)) * np.where(window[:, 15] == ord("-"), -1, 1)
+    timestamp = days.astype("M8[s]") + (seconds - offset * 60).astype("m8[s]")
+    timestamp[blank] = np.datetime64("NaT")
+    return timestamp, offset.astype(np.int16)
+
+
+def _parse_gps_datetime(date: np.ndarray, time: np.ndarray) -> np.ndarray:
+    """
+    :param date: `2024-04-24` (10 bytes)
+    :param time: `12:35:54+00:00` or `12:35:54.500000+00:00` (21 bytes)
+    """
+    blank = (date[:, -1] == SPACE) | (time[:, -1] == SPACE)
+    date = np.where(blank[:, None], np.frombuffer(b"1970-01-01", np.uint8), date)
+
+    fraction = time[:, -13] == DOT
+    time = np.where(fraction[:, None], time, np.roll(time, -7, axis=1))  # aligns `hh:mm:ss` in both cases
+    time = np.where(blank[:, None], ZERO, time)
+    time[:, 9:15] = np.where(fraction[:, None], time[:, 9:15], ZERO)  # no fraction: 0 microsecond
+
+    microseconds = (
+        (_digits(time, 0, 2) * 3600 + _digits(time, 3, 5) * 60 + _digits(time, 6, 8)) * 1_000_000
+        + _digits(time, 9, 15)
+    )
+    gps_datetime = date.view("S10").ravel().astype("M8[D]").astype("M8[us]") + microseconds.astype("m8[us]")
+    gps_datetime[blank] = np.datetime64("NaT")
+    return gps_datetime
+
+
+def _parse_coordinate(window: np.ndarray) -> np.ndarray:
+    """`4838.4572 N` -> 48.640953..."""
+    value = _to_float(window[:, :-2])
+    degrees = np.floor(value / 100)
+    degrees += (value - degrees * 100) / 60
+    return np.where(np.isin(window[:, -1], np.frombuffer(b"SW", np.uint8)), -degrees, degrees)
+
+
+def parse_lines(data: bytes, with_offsets: bool = False):
+    """
+    :param data: Complete data lines (no header).
+    :param with_offsets: Also returns the offset of each record line in `data`.
+    :return: Structured array of `PING_DTYPE`, or (records, offsets) if `with_offsets`.
+    """
+    buffer = np.frombuffer(data, np.uint8)
+    if not len(buffer):
+        records = np.empty(0, PING_DTYPE)
+        return (records, np.empty(0, np.int64)) if with_offsets else records
+    if buffer[-1] != NEWLINE:
+        buffer = np.append(buffer, np.uint8(NEWLINE))
+
+    newlines = np.flatnonzero(buffer == NEWLINE)
+    line_starts = np.concatenate(([0], newlines[:-1] + 1))
+    commas = np.flatnonzero(buffer == COMMA)
+
+    # Keeps the lines with the right number of fields
+    comma_lines = np.searchsorted(newlines, commas)
+    valid = np.bincount(comma_lines, minlength=len(newlines)) == NUMBER_OF_FIELDS - 1
+    commas = commas[valid[comma_lines]].reshape(-1, NUMBER_OF_FIELDS - 1)
+    line_starts, line_ends = line_starts[valid], newlines[valid]
+    line_ends = line_ends - (buffer[np.maximum(line_ends - 1, 0)] == CARRIAGE_RETURN)  # written on Windows
+
+    starts = np.column_stack((line_starts, commas + 1))
+    ends = np.column_stack((commas, line_ends))
+
+    records = np.empty(len(starts), PING_DTYPE)
+    records["timestamp"], records["utc_offset_minutes"] = _parse_timestamp(_window(buffer, starts[:, 0], ends[:, 0], 20))
+    records["gps_datetime"] = _parse_gps_datetime(
+        _window(buffer, starts[:, 1], ends[:, 1], 10),
+        _window(buffer, starts[:, 2], ends[:, 2], 21),
+    )
+    records["latitude"] = _parse_coordinate(_window(buffer, starts[:, 3], ends[:, 3], 16))
+    records["longitude"] = _parse_coordinate(_window(buffer, starts[:, 4], ends[:, 4], 16))
+    records["heading"] = _to_float(_window(buffer, starts[:, 5], ends[:, 5], 12))
+    return (records, line_starts.astype(np.int64)) if with_offsets else records
+
+
+def iter_ping_chunks(path, chunk_size: int = CHUNK_SIZE, with_offsets: bool = False):
+    """
+    Streams a `.ping` file.
+
+    :param chunk_size: Bytes read at once, i.e. roughly the memory used.
+    :param with_offsets: Also yields the byte offset of each record line in the file.
+    :return: Generator of (PingRunParameters, structured array of `PING_DTYPE`) for each chunk,
+        or (PingRunParameters, records, offsets) if `with_offsets`.
+    """
+    def _chunk(data: bytes, position: int):
+        if not with_offsets:
+            return run_parameters, parse_lines(data)
+        records, offsets = parse_lines(data, with_offsets=True)
+        return run_parameters, records, offsets + position
+
+    with open(path, "rb") as f:
+        run_parameters, _ = read_header(f, path)
+        position = f.tell()  # of the first byte of `remainder`
+        remainder = b""
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            data = remainder + data
+            end = data.rfind(b"\n") + 1
+            data, remainder = data[:end], data[end:]
+            if data:
+                yield _chunk(data, position)
+                position += len(data)
+        if remainder.strip():  # last line without line ending
+            yield _chunk(remainder, position)
+
+
+def read_ping_file(path, chunk_size: int = CHUNK_SIZE) -> tuple:
+    """
+    :return: (PingRunParameters, structured array of `PING_DTYPE`)
+    """
+    with open(path, "rb") as f:
+        run_parameters, _ = read_header(f, path)
+    chunks = [records for _, records in iter_ping_chunks(path, chunk_size)]
+    return run_parameters, np.concatenate(chunks) if chunks else np.empty(0, PING_DTYPE)
@@ -0,0 +1,247 @@
+"""
+USB HID relay board backends used by `TransponderClient`.
+
+ + `WinUsbRelayBackend`: Windows, through `pywinusb`.
+ + `HidrawRelayBackend`: Linux, feature reports written directly to `/dev/hidraw*` (one ioctl per command).
+ + `SimulatedRelayBackend`: in-process 8 relays board with configurable latency and faults.
+
+Reports are 9 bytes: [report id, command, relay number, 0, 0, 0, 0, 0, 1] and the status
+row read back has the relays bit mask at index 8.
+"""
+import os
+import sys
+import glob
+import random
+import logging
+from abc import ABC, abstractmethod
+
+try:
+    from hydrophone_ping_gps_logger.clock import Clock, REAL_CLOCK
+except ImportError:
+    from clock import Clock, REAL_CLOCK
+
+
+class RelayBackendType:
+    AUTO = "auto"  # hidraw on Linux, winusb on Windows.
+    WINUSB = "winusb"
+    HIDRAW = "hidraw"
+    SIMULATED = "simulated"
+
+
+REPORT_LENGTH = 9
+
+
+class RelayBackend(ABC):
+    name = "relay"
+
+    @abstractmethod
+    def is_active(self) -> bool:
+        """The device is still plugged in."""
+
+    @abstractmethod
+    def is_opened(self) -> bool:
+        pass
+
+    @abstractmethod
+    def open(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    @abstractmethod
+    def send_report(self, buffer: list):
+        """:param buffer: `REPORT_LENGTH` bytes."""
+
+    @abstractmethod
+    def get_report(self) -> list:
+        """:return: The status row, relays bit mask at index 8."""
+
+
+class WinUsbRelayBackend(RelayBackend):
+    name = RelayBackendType.WINUSB
+
+    def __init__(self, device):
+        """:param device: `pywinusb.hid.HidDevice`"""
+        self.device = device
+        self.report = None
+
+    @classmethod
+    def find(cls, vendor_id: int, product_id: int) -> "WinUsbRelayBackend":
+        import pywinusb.hid as hid  # Windows only
+
+        devices = hid.HidDeviceFilter(vendor_id=vendor_id, product_id=product_id).get_devices()
+        return cls(devices[0]) if devices else None
+
+    def is_active(self) -> bool:
+        return self.device.is_active()
+
+    def is_opened(self) -> bool:
+        return self.device.is_opened()
+
+    def open(self):
+        self.device.open()
+        # Resolved once per open. The last output/feature report is the one used for the commands.
+        reports = self.device.find_output_reports() + self.device.find_feature_reports()
+        self.report = reports[-1] if reports else None
+
+    def close(self):
+        self.device.close()
+        self.report = None
+
+    def send_report(self, buffer: list):
+        if self.report is None:
+            raise OSError("No report found for the device")
+        self.report.send(raw_data=buffer)
+
+    def get_report(self) -> list:
+        if self.report is None:
+            raise OSError("No report found for the device")
+        return self.report.get()
+
+
+def _hid_ioctl(number: int, length: int) -> int:
+    """`_IOC(_IOC_WRITE|_IOC_READ, 'H', number, length)` from linux/hidraw.h"""
+    return (3 << 30) | (length << 16) | (ord("H") << 8) | number
+
+
+HIDIOCSFEATURE = _hid_ioctl(0x06, REPORT_LENGTH)
+HIDIOCGFEATURE = _hid_ioctl(0x07, REPORT_LENGTH)
+
+
+class HidrawRelayBackend(RelayBackend):
+    name = RelayBackendType.HIDRAW
+
+    def __init__(self, path: str):
+        """:param path: `/dev/hidrawN`"""
+        self.path = path
+        self.fd: int = None
+        self.status_buffer = bytearray(REPORT_LENGTH)
+
+    @classmethod
+    def find(cls, vendor_id: int, product_id: int) -> "HidrawRelayBackend":
+        """Looks up `/sys/class/hidraw/*/device/uevent` for `HID_ID=<bus>:<vendor>:<product>`."""
+        for uevent_path in sorted(glob.glob("/sys/class/hidraw/hidraw*/device/uevent")):
+            try:
+                with open(uevent_path) as f:
+                    uevent = dict(line.strip().split("=", 1) for line in f if "=" in line)
+                _, vendor, product = uevent.get("HID_ID", "0:0:0").split(":")
+            except (OSError, ValueError):
+                continue
+            if int(vendor, 16) == vendor_id and int(product, 16) == product_id:
+                return cls("/dev/" + uevent_path.split("/")[4])
+        return None
+
+    def is_active(self) -> bool:
+        return os.path.exists(self.path)
+
+    def is_opened(self) -> bool:
+        return self.fd is not None
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDWR)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def send_report(self, buffer: list):
+        import fcntl  # Unix only
+
+        fcntl.ioctl(self.fd, HIDIOCSFEATURE, bytes(buffer))
+
+    def get_report(self) -> list:
+        import fcntl  # Unix only
+
+        self.status_buffer[0] = 0  # report id
+        fcntl.ioctl(self.fd, HIDIOCGFEATURE, self.status_buffer, True)
+        return list(self.status_buffer)
+
+
+class SimulatedRelayBackend(RelayBackend):
+    name = RelayBackendType.SIMULATED
+
+    serial_number = b"SIMUL"
+
+    def __init__(self, latency: float = 0, fault_rate: float = 0, ignore_rate: float = 0, seed: int = None,
+                 clock: Clock = REAL_CLOCK):
+        """
+        :param latency: Seconds taken by each USB transaction.
+        :param fault_rate: Probability of a transaction raising an `OSError`.
+        :param ignore_rate: Probability of a command being accepted but not switching the relays.
+        :param seed: Seed of the fault generator, for reproducible runs.
+        :param clock: Time source of the latency, see `clock`.
+        """
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.ignore_rate = ignore_rate
+        self.random = random.Random(seed)
+        self.clock = clock
+
+        self.relays = [False] * 8
+        self.opened = False
+        self.active = True  # set to False to simulate the board being unplugged.
+        self.transaction_count = 0
+
+    def _transaction(self):
+        if not self.active or not self.opened:
+            raise OSError("Simulated relay not available")
+        self.transaction_count += 1
+        if self.latency:
+            self.clock.sleep(self.latency)
+        if self.fault_rate and self.random.random() < self.fault_rate:
+            raise OSError("Simulated relay fault")
+
+    def is_active(self) -> bool:
+        return self.active
+
+    def is_opened(self) -> bool:
+        return self.opened
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.opened = False
+
+    def send_report(self, buffer: list):
+        self._transaction()
+        if self.ignore_rate and self.random.random() < self.ignore_rate:
+            return
+
+        command, relay_number = buffer[1], buffer[2]
+        if command == 0xFE:
+            self.relays = [True] * 8
+        elif command == 0xFC:
+            self.relays = [False] * 8
+        elif command in (0xFF, 0xFD) and 1 <= relay_number <= 8:
+            self.relays[relay_number - 1] = command == 0xFF
+        else:
+            logging.warning(f"Simulated relay: unknown command {buffer}")
+
+    def get_report(self) -> list:
+        self._transaction()
+        status = sum(1 << i for i, on in enumerate(self.relays) if on)
+        return [0, *self.serial_number, 0, 0, status]
+
+
+def find_relay_device(vendor_id: int, product_id: int, backend: str = RelayBackendType.AUTO,
+                      clock: Clock = REAL_CLOCK) -> RelayBackend:
+    """
+    :param backend: `RelayBackendType` value.
+    :param clock: Time source of the simulated relay.
+    :return: The first matching device or None if none was found.
+    """
+    if backend == RelayBackendType.AUTO:
+        backend = RelayBackendType.WINUSB if sys.platform == "win32" else RelayBackendType.HIDRAW
+
+    if backend == RelayBackendType.SIMULATED:
+        return SimulatedRelayBackend(clock=clock)
+    if backend == RelayBackendType.WINUSB:
+        return WinUsbRelayBackend.find(vendor_id, product_id)
+    if backend == RelayBackendType.HIDRAW:
+        return HidrawRelayBackend.find(vendor_id, product_id)
+
+    raise ValueError(f"Unknown relay backend: {backend}")
@@ -0,0 +1,119 @@
+"""
+Ping scheduler firing on absolute monotonic deadlines (start + n * interval), so the time
+taken to ping and log doesn't accumulate into drift over a long mission.
+"""
+import math
+import logging
+import threading
+
+try:
+    from hydrophone_ping_gps_logger import metrics
+    from hydrophone_ping_gps_logger.stats import RollingStatistics
+    from hydrophone_ping_gps_logger.clock import Clock, REAL_CLOCK
+except ImportError:
+    import metrics
+    from stats import RollingStatistics
+    from clock import Clock, REAL_CLOCK
+
+
+class MissedPingPolicy:
+    """What to do when a deadline is missed by more than one interval."""
+    CATCH_UP = "catch_up"  # Fire every missed ping, back to back, until back on schedule.
+    SKIP = "skip"  # Drop the older missed pings and only fire the latest one.
+
+
+class PingScheduler:
+    def __init__(self, interval: float, start_delay: float = 0, policy: str = MissedPingPolicy.SKIP,
+                 clock: Clock = REAL_CLOCK):
+        """
+        :param interval: Seconds between pings.
+        :param start_delay: Seconds before the first ping.
+        :param policy: `MissedPingPolicy` value.
+        :param clock: Time source, see `clock`.
+        """
+        if policy not in (MissedPingPolicy.CATCH_UP, MissedPingPolicy.SKIP):
+            raise ValueError(f"Invalid missed ping policy: {policy}")
+
+        self.interval = interval
+        self.start_delay = start_delay
+        self.policy = policy
+        self.clock = clock
+
+        self.condition = threading.Condition()
+        self.start_time: float = None
+        self.next_index = 0
+
+        self.is_paused = False
+        self.is_stopped = False
+
+        self.skipped_count = 0
+        self.errors = RollingStatistics()  # seconds late for each ping fired.
+
+    def start(self):
+        with self.condition:
+            self.start_time = self.clock.monotonic() + self.start_delay
+            self.next_index = 0
+            self.skipped_count = 0
+            self.is_stopped = False
+            self.errors.clear()
+
+    def time_until_start(self) -> float:
+        if self.start_time is None:
+            return self.start_delay
+        return max(self.start_time - self.clock.monotonic(), 0)
+
+    def next_deadline(self) -> float:
+        return self.start_time + self.next_index * self.interval
+
+    def wait_next(self) -> float:
+        """
+        Blocks until the next ping is due.
+
+        :return: The deadline (`clock.monotonic()`) of the ping to fire or None if stopped.
+        """
+        with self.condition:
+            while True:
+                if self.is_stopped:
+                    return None
+                if self.is_paused:
+                    self.clock.wait(self.condition)
+                    continue
+
+                deadline = self.next_deadline()
+                now = self.clock.monotonic()
+                if now < deadline:
+                    self.clock.wait(self.condition, deadline - now)
+                    continue
+
+                if self.policy == MissedPingPolicy.SKIP and now - deadline >= self.interval:
+                    missed = int((now - deadline) // self.interval)
+                    self.next_index += missed
+                    self.skipped_count += missed
+                    metrics.PINGS_SKIPPED.inc(missed)
+                    logging.warning(f"Ping schedule late, {missed} ping(s) skipped.")
+                    deadline = self.next_deadline()
+
+                self.next_index += 1
+                self.errors.add(now - deadline)
+                metrics.PING_SCHEDULE_ERROR.observe(now - deadline)
+                return deadline
+
+    def pause(self):
+        with self.condition:
+            self.is_paused = True
+            self.clock.notify_all(self.condition)
+
+    def resume(self):
+        """Deadlines that passed while paused are dropped, the schedule keeps its original phase."""
+        with self.condition:
+            if self.is_paused and self.start_time is not None:
+                now = self.clock.monotonic()
+                if self.next_deadline() < now:
+                    self.next_index = math.ceil((now - self.start_time) / self.interval)
+            self.is_paused = False
+            self.clock.notify_all(self.condition)
+
+    def stop(self):
+        with self.condition:
+            self.is_stopped = True
+            self.clock.notify_all(self.condition)
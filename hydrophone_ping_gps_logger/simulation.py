@@ -0,0 +1,211 @@
+"""
+Accelerated missions: the real controllers on a `VirtualClock`, with a simulated GPS (vessel moving
+at a constant speed and turn rate) and the simulated relay. A day of pings runs in seconds and
+writes the same `.ping` file as a real run would, to check scheduling, pause/resume and ping counts.
+
+Usage:
+    python -m hydrophone_ping_gps_logger.simulation --output-directory-path /tmp/sim --ping-interval 15
+        --duration 86400 [--pause 3600 600 ...] [--gps-rate 1] [--start-time 2024-04-24T08:00:00+00:00]
+"""
+import sys
+import math
+import time
+import logging
+import argparse
+import datetime
+from typing import NamedTuple
+
+try:
+    from hydrophone_ping_gps_logger import nmea
+    from hydrophone_ping_gps_logger.clock import Clock, VirtualClock
+    from hydrophone_ping_gps_logger.relay import RelayBackendType
+    from hydrophone_ping_gps_logger.pingloggercontroller import PingLoggerController, PingRunParameters
+except ImportError:
+    import nmea
+    from clock import Clock, VirtualClock
+    from relay import RelayBackendType
+    from pingloggercontroller import PingLoggerController, PingRunParameters
+
+SIMULATED_GPS_RATE = 1  # fixes per second. A Garmin 19x HVS gives 20, at the cost of a slower simulation.
+GPS_WARMUP = 2  # seconds of fixes before the run starts, for the interpolation of the first pings.
+EARTH_RADIUS = 6371000  # meters
+KNOTS = 1.943844  # per m/s
+
+
+def _sentence(body: str) -> str:
+    return f"${body}*{nmea.nmea_checksum(body.encode()):02X}"
+
+
+class SimulatedGpsClient:
+    """Stands in for `GpsClient`: RMC and HDT sentences of a moving vessel, timed by `clock`."""
+
+    def __init__(self, clock: Clock, rate: float = SIMULATED_GPS_RATE, latitude: float = 48.640953,
+                 longitude: float = -68.157018, speed: float = 4, course: float = 45, turn_rate: float = 0):
+        """
+        :param rate: Fixes per second.
+        :param latitude: Decimal degrees at `connect`.
+        :param longitude: Decimal degrees at `connect`.
+        :param speed: Meters per second.
+        :param course: Degrees (true) at `connect`.
+        :param turn_rate: Degrees per second, positive to starboard.
+        """
+        self.clock = clock
+        self.rate = rate
+        self.latitude = latitude
+        self.longitude = longitude
+        self.speed = speed
+        self.course = course
+        self.turn_rate = turn_rate
+
+        self.receive_time: float = None  # `clock.monotonic()` of the last fix.
+        self.next_fix_time: float = None
+        self.fix_count = 0
+        self.client_name = self.__class__.__name__  # for logging purposes
+
+    def connect(self) -> int:
+        self.next_fix_time = self.clock.monotonic()
+        logging.info(f"[{self.client_name}] Client connected")
+        return 1
+
+    def disconnect(self):
+        logging.info(f"[{self.client_name}] Client closed")
+
+    def write(self, msg: str):
+        pass
+
+    def move(self, seconds: float):
+        """Dead reckoning over `seconds`."""
+        distance = self.speed * seconds
+        course = math.radians(self.course)
+        self.latitude += math.degrees(distance * math.cos(course) / EARTH_RADIUS)
+        self.longitude += math.degrees(
+            distance * math.sin(course) / (EARTH_RADIUS * math.cos(math.radians(self.latitude))))
+        self.longitude = (self.longitude + 180) % 360 - 180
+        self.course = (self.course + self.turn_rate * seconds) % 360
+
+    def read_sentences(self) -> list:
+        """Waits for the next fix. :return: [RMC, HDT]"""
+        self.clock.sleep(self.next_fix_time - self.clock.monotonic())
+        self.receive_time = self.clock.monotonic()
+        if self.fix_count:
+            self.move(1 / self.rate)
+        self.fix_count += 1
+        self.next_fix_time += 1 / self.rate
+
+        gps_time = datetime.datetime.fromtimestamp(self.clock.time(), datetime.timezone.utc)
+        latitude, latitude_direction = nmea.degrees_to_nmea(self.latitude, True).split(" ")
+        longitude, longitude_direction = nmea.degrees_to_nmea(self.longitude, False).split(" ")
+        return [
+            _sentence(f"GPRMC,{gps_time:%H%M%S}.{gps_time.microsecond // 10000:02d},A,{latitude},{latitude_direction},"
+                      f"{longitude},{longitude_direction},{self.speed * KNOTS:05.1f},{self.course:05.1f},"
+                      f"{gps_time:%d%m%y},,,A"),
+            _sentence(f"GPHDT,{self.course:.1f},T"),
+        ]
+
+
+class MissionResult(NamedTuple):
+    ping_file: str
+    ping_count: int
+    virtual_seconds: float  # from the start of the ping run
+    real_seconds: float
+
+
+def run_mission(run_parameters: PingRunParameters, duration: float = None, pauses: list = (),
+                clock: VirtualClock = None, gps_client: SimulatedGpsClient = None) -> MissionResult:
+    """
+    Runs a whole ping run in virtual time.
+
+    :param duration: Virtual seconds after which the run is stopped. None: until `number_of_pings`.
+    :param pauses: [(virtual seconds since the start of the run, virtual seconds paused)]
+    :param clock: Defaults to a `VirtualClock` starting now (whole second). Closed once done.
+    :param gps_client: Defaults to a `SimulatedGpsClient` with its default vessel motion.
+    """
+    if duration is None and not run_parameters.number_of_pings:
+        raise ValueError("A mission needs a duration or a number of pings")
+
+    clock = clock or VirtualClock(start_time=math.floor(time.time()))
+    gps_client = gps_client or SimulatedGpsClient(clock)
+    controller = PingLoggerController(clock=clock)
+
+    real_start = time.perf_counter()
+    try:
+        with clock.participate():
+            controller.transponder_controller.connect(backend=RelayBackendType.SIMULATED)
+            controller.gps_controller.connect_client(gps_client)
+            clock.sleep(GPS_WARMUP)
+
+            start = clock.monotonic()
+            controller.start_ping_run(run_parameters)
+            if not controller.is_running:
+                raise RuntimeError("Simulated ping run not started")
+
+            for pause_start, pause_duration in sorted(pauses):
+                clock.sleep(start + pause_start - clock.monotonic())
+                if not controller.is_running:
+                    break
+                controller.pause_ping_run()
+                clock.sleep(pause_duration)
+                controller.unpause_ping_run()
+
+            if duration is None:
+                clock.join(controller.ping_run_thread)
+            else:
+                clock.sleep(start + duration - clock.monotonic())
+            ping_count = controller.ping_count
+            virtual_seconds = clock.monotonic() - start
+            controller.stop_all()
+    finally:
+        clock.close()
+
+    return MissionResult(str(controller.output_filename), ping_count, virtual_seconds,
+                         time.perf_counter() - real_start)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog="simulation", description="Accelerated simulated ping run.")
+    parser.add_argument("--output-directory-path", required=True)
+    parser.add_argument("--ship-name", default="simulation")
+    parser.add_argument("--transponder-depth", type=float, default=0)
+    parser.add_argument("--ping-interval", type=float, required=True)
+    parser.add_argument("--number-of-pings", type=int, default=0)
+    parser.add_argument("--start-delay-seconds", type=int, default=0)
+    parser.add_argument("--output-format", choices=["text", "binary"], default="text")
+    parser.add_argument("--duration", type=float, help="virtual seconds of ping run")
+    parser.add_argument("--pause", nargs=2, type=float, action="append", default=[], metavar=("START", "DURATION"),
+                        help="pause the run START seconds after it started, for DURATION seconds")
+    parser.add_argument("--start-time", type=datetime.datetime.fromisoformat, help="ISO 8601, defaults to now")
+    parser.add_argument("--gps-rate", type=float, default=SIMULATED_GPS_RATE, help="fixes per second")
+    parser.add_argument("--speed", type=float, default=4, help="m/s")
+    parser.add_argument("--course", type=float, default=45, help="degrees")
+    parser.add_argument("--turn-rate", type=float, default=0, help="degrees per second")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(threadName)s: %(message)s")
+
+    clock = VirtualClock(start_time=args.start_time.timestamp() if args.start_time else math.floor(time.time()))
+    gps_client = SimulatedGpsClient(clock, rate=args.gps_rate, speed=args.speed, course=args.course,
+                                    turn_rate=args.turn_rate)
+    run_parameters = PingRunParameters(
+        output_directory_path=args.output_directory_path,
+        ship_name=args.ship_name,
+        transponder_depth=args.transponder_depth,
+        ping_interval=args.ping_interval,
+        number_of_pings=args.number_of_pings,
+        start_delay_seconds=args.start_delay_seconds,
+        output_format=args.output_format,
+    )
+    try:
+        result = run_mission(run_parameters, duration=args.duration, pauses=args.pause,
+                             clock=clock, gps_client=gps_client)
+    except (ValueError, RuntimeError) as e:
+        logging.error(str(e))
+        return 1
+
+    print(f"{result.ping_count} pings in {result.virtual_seconds:.0f} virtual seconds, "
+          f"{result.real_seconds:.1f} real seconds (x{result.virtual_seconds / result.real_seconds:.0f}): "
+          f"{result.ping_file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Rolling statistics (percentiles) of timing measurements, readable while they are recorded.
+
+`percentile` is the one percentile of the package: rolling samples, histogram buckets
+(`metrics`) and the benchmarks all use it.
+"""
+import math
+import threading
+from collections import deque
+
+STATISTICS_WINDOW = 10000  # samples
+
+
+class RollingStatistics:
+    def __init__(self, window: int = STATISTICS_WINDOW):
+        """
+        :param window: Number of the latest samples used for the percentiles.
+            `count` and `maximum` cover every sample added since the last `clear`.
+        """
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.maximum = -math.inf
+        self.lock = threading.Lock()
+
+    def add(self, value: float):
+        with self.lock:
+            self.samples.append(value)
+            self.count += 1
+            if value > self.maximum:
+                self.maximum = value
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.count = 0
+            self.maximum = -math.inf
+
+    def percentile(self, q: float) -> float:
+        """:param q: 0 to 100. nan if there are no samples."""
+        with self.lock:
+            samples = sorted(self.samples)
+        return percentile(samples, q)
+
+    def summary(self) -> dict:
+        with self.lock:
+            samples = sorted(self.samples)
+            count, maximum = self.count, self.maximum
+        return {
+            "count": count,
+            "p50": percentile(samples, 50),
+            "p99": percentile(samples, 99),
+            "max": maximum if count else math.nan,
+        }
+
+
+def percentile(samples: list, q: float, counts: list = None) -> float:
+    """
+    Nearest rank percentile.
+
+    :param samples: Sorted values.
+    :param q: 0 to 100.
+    :param counts: Number of samples of each value (e.g. histogram buckets). None: one each.
+    :return: nan if there are no samples.
+    """
+    if counts is None:
+        if not samples:
+            return math.nan
+        return samples[max(math.ceil(q / 100 * len(samples)) - 1, 0)]
+
+    rank = max(math.ceil(q / 100 * sum(counts)), 1)
+    cumulative = 0
+    for value, count in zip(samples, counts):
+        cumulative += count
+        if cumulative >= rank:
+            return value
+    return math.nan
+
+
+def summarize(samples: list) -> dict:
+    """:return: The `RollingStatistics.summary` of a list of samples (unsorted)."""
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p99": percentile(samples, 99),
+        "max": samples[-1] if samples else math.nan,
+    }
@@ -0,0 +1,104 @@
+"""
+Full rate GPS track written alongside the ping file.
+
+The GPS thread only hands off each fix to a `RecordWriter` queue (never blocks, see `submit`);
+decimation, formatting and (optional) gzip compression all happen on the writer thread.
+
+Track lines: `gps_time, latitude, longitude, heading`, e.g.
+`2024-04-24T12:35:54.050+00:00,48.6409533,-68.1570183,274.07`
+"""
+import gzip
+import math
+import datetime
+
+try:
+    from hydrophone_ping_gps_logger.fixhistory import Fix
+    from hydrophone_ping_gps_logger.writer import RecordWriter, DurabilityPolicy
+except ImportError:
+    from fixhistory import Fix
+    from writer import RecordWriter, DurabilityPolicy
+
+TRACK_FIELD_NAME = ["gps_time", "latitude", "longitude", "heading"]
+EARTH_RADIUS = 6371008.8  # meters
+
+# Flushing a gzip stream after every line ruins the compression: synced every few seconds instead.
+TRACK_DURABILITY = DurabilityPolicy(flush_every_record=False, fsync_every_seconds=10)
+
+
+def distance(latitude_0: float, longitude_0: float, latitude_1: float, longitude_1: float) -> float:
+    """Equirectangular approximation (meters), good enough between successive fixes."""
+    x = math.radians((longitude_1 - longitude_0 + 180) % 360 - 180) * math.cos(math.radians((latitude_0 + latitude_1) / 2))
+    y = math.radians(latitude_1 - latitude_0)
+    return EARTH_RADIUS * math.hypot(x, y)
+
+
+def format_fix(fix: Fix) -> str:
+    """`gps_time,latitude,longitude,heading` (no line ending)"""
+    gps_time = datetime.datetime.fromtimestamp(fix.gps_time, tz=datetime.timezone.utc)
+    heading = "" if math.isnan(fix.heading) else f"{fix.heading:.2f}"
+    return f"{gps_time.isoformat(timespec='milliseconds')},{fix.latitude:.7f},{fix.longitude:.7f},{heading}"
+
+
+def format_track_line(fix: Fix) -> str:
+    return format_fix(fix) + "\n"
+
+
+class TrackLogger:
+    def __init__(self, path, min_interval: float = 0, min_distance: float = 0, compress: bool = None,
+                 header_lines: list = (), durability: DurabilityPolicy = TRACK_DURABILITY):
+        """
+        :param path: Track file. Overwritten by `start`.
+        :param min_interval: Seconds (GPS time) between the fixes written. 0: every fix.
+        :param min_distance: Meters between the fixes written. 0: every fix.
+            With both set, a fix is written once both are exceeded.
+        :param compress: gzip the track. Defaults to True if `path` ends with `.gz`.
+        :param header_lines: `# key: value` lines written at the top of the file.
+        """
+        self.path = path
+        self.min_interval = min_interval
+        self.min_distance = min_distance
+        self.compress = str(path).endswith(".gz") if compress is None else compress
+        self.header_lines = list(header_lines)
+
+        self.writer = RecordWriter(
+            path,
+            format_record=self._format_fix,
+            mode="at",
+            durability=durability,
+            name="track_writer",
+            opener=gzip.open if self.compress else open,
+        )
+        self.last_written: Fix = None  # only used by the writer thread.
+        self.decimated_count = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self.writer.is_running
+
+    def start(self):
+        with (gzip.open if self.compress else open)(self.path, "wt") as f:
+            for line in self.header_lines:
+                f.write(line + "\n")
+            f.write(",".join(TRACK_FIELD_NAME) + "\n")
+        self.last_written = None
+        self.writer.start()
+
+    def submit(self, fix: Fix) -> bool:
+        """Called from the GPS thread for every fix. Never blocks."""
+        return self.writer.submit(fix)
+
+    def stop(self):
+        self.writer.stop()
+
+    def _format_fix(self, fix: Fix) -> str:
+        last = self.last_written
+        if last is not None:
+            if self.min_interval and fix.gps_time - last.gps_time < self.min_interval:
+                self.decimated_count += 1
+                return None
+            if (self.min_distance
+                    and distance(last.latitude, last.longitude, fix.latitude, fix.longitude) < self.min_distance):
+                self.decimated_count += 1
+                return None
+        self.last_written = fix
+        return format_track_line(fix)
@@ -1,84 +1,170 @@
 import time
 import logging
-import pywinusb.hid as hid
+import threading
+
+try:
+    from hydrophone_ping_gps_logger import metrics
+    from hydrophone_ping_gps_logger.stats import RollingStatistics
+    from hydrophone_ping_gps_logger.relay import RelayBackend, RelayBackendType, find_relay_device
+    from hydrophone_ping_gps_logger.events import EventBus, ConnectionEvent, Device
+    from hydrophone_ping_gps_logger.clock import Clock, REAL_CLOCK
+except ImportError:
+    import metrics
+    from stats import RollingStatistics
+    from relay import RelayBackend, RelayBackendType, find_relay_device
+    from events import EventBus, ConnectionEvent, Device
+    from clock import Clock, REAL_CLOCK
 
 
 class TransponderController:
-    open_close_delay = 1
+    pulse_width = 1  # seconds the relays stay closed for a ping. Can be down to a few milliseconds.
 
-    def __init__(self):
-        self.client = TransponderClient()
+    def __init__(self, clock: Clock = REAL_CLOCK):
+        """:param clock: Time source, see `clock`."""
+        self.clock = clock
+        self.client = TransponderClient(clock=clock)
         self.is_connected = False
+        self.last_ping_time: float = None  # `clock.monotonic()` when the relays were closed.
+
+        self.io_lock = threading.Lock()  # the release timer and the ping thread share the device.
+        self.release_timer: threading.Timer = None  # or the `clock` equivalent.
+        self.is_pulsing = False
+
+        self.events = EventBus()  # `ConnectionEvent`. Shared with `PingLoggerController`.
 
     def check_connection(self):
         if self.client.device is not None:
             if not self.client.device.is_active():
                 return
         self.is_connected = False
+        self.events.publish(ConnectionEvent(Device.TRANSPONDER, False))
 
-    def connect(self):
-        self.client.get_device()
+    def connect(self, backend: str = None):
+        """
+        :param backend: `RelayBackendType` value. Defaults to `TransponderClient.backend`.
+        """
+        self.client.get_device(backend=backend)
         if self.client.open_device() is True:
             self.is_connected = True
             pass
         else:
             logging.info("Could not connect transponder.")
             self.is_connected = False
+        self.events.publish(ConnectionEvent(Device.TRANSPONDER, self.is_connected))
 
     def disconnect(self):
-        self.client.close_device()
+        with self.io_lock:
+            if self.release_timer is not None:
+                self.release_timer.cancel()
+            self.is_pulsing = False
+            self.client.close_device()  # also opens the relays.
         self.is_connected = False
+        self.events.publish(ConnectionEvent(Device.TRANSPONDER, False))
 
-    def ping(self):
+    def ping(self, pulse_width: float = None) -> float:
+        """
+        Closes the relays and returns right away, they are opened again by a timer
+        after `pulse_width` seconds. A ping is refused while the previous pulse is still active.
+
+        :param pulse_width: Seconds. Defaults to `TransponderController.pulse_width`.
+        :return: `clock.monotonic()` when the relays were closed or None if the ping failed.
+        """
+        pulse_width = self.pulse_width if pulse_width is None else pulse_width
         try:
-            if self.client.device.is_opened():
-                if self.client.on_all():
-                    time.sleep(self.open_close_delay)
-                    self.client.off_all()
-                    logging.debug("Transponder Pinged")
-                    return True
+            with self.io_lock:
+                if self.is_pulsing:
+                    logging.warning("Could not ping transponder, previous pulse still active")
+                    return None
+                if self.client.device.is_opened():
+                    start = time.perf_counter()
+                    closed = self.client.on_all()
+                    metrics.RELAY_PING_LATENCY.observe(time.perf_counter() - start)
+                    if closed:
+                        self.last_ping_time = self.client.last_write_time
+                        self.is_pulsing = True
+                        self.release_timer = self.clock.timer(pulse_width, self._release)
+                        logging.debug("Transponder Pinged")
+                        return self.last_ping_time
+                    else:
+                        logging.warning("Relay didn't close.")
+                        return None
                 else:
-                    logging.warning("Relay didn't close.")
-                    return False
-            else:
-                self.is_connected = False
-                logging.warning("Could not ping transponder not connected")
-                return False
+                    self.is_connected = False
+                    self.events.publish(ConnectionEvent(Device.TRANSPONDER, False))
+                    logging.warning("Could not ping transponder not connected")
+                    return None
         except Exception as e:
             logging.error(f"error: {e}")
             logging.error("Transponder Pinged failed")
             self.disconnect()
-            return False
+            return None
+
+    def _release(self):
+        try:
+            with self.io_lock:
+                if not self.is_pulsing:  # cancelled by a disconnect
+                    return
+                if not self.client.off_all():
+                    logging.warning("Relay didn't open.")
+                self.is_pulsing = False
+        except Exception as e:
+            logging.error(f"error: {e}")
+            logging.error("Transponder release failed")
+            self.disconnect()
+
+
+class RelayVerifyMode:
+    """When the relay status is read back after a command."""
+    ALWAYS = "always"
+    EVERY_N = "every_n"  # every `TransponderClient.verify_every` commands.
+    ON_ERROR = "on_error"  # only when sending the command failed.
 
 
 class TransponderClient:
     usb_cfg_vendor_id = 0x16c0  # Should suit, if not check ID with a tool like USBDeview
     usb_cfg_device_id = 0x05DF  # Should suit, if not check ID with a tool like USBDeview
 
-    def __init__(self):
-        self.device: hid.HidDevice = None
-        self.hid_filter: hid.HidDeviceFilter = None
-        self.report: hid.core.HidReport = None
+    backend = RelayBackendType.AUTO
+
+    verify_mode = RelayVerifyMode.ALWAYS
+    verify_every = 10
+
+    # Report buffers: [report id, command, relay number, 0, 0, 0, 0, 0, 1]
+    ON_ALL_COMMAND = [0, 0xFE, 0, 0, 0, 0, 0, 0, 1]
+    OFF_ALL_COMMAND = [0, 0xFC, 0, 0, 0, 0, 0, 0, 1]
+    ALL_RELAYS = 3  # status bit mask used to check the relays
+
+    def __init__(self, clock: Clock = REAL_CLOCK):
+        self.clock = clock
+        self.device: RelayBackend = None
         self.last_row_status = None # Type me
+        self.last_write_time: float = None  # `clock.monotonic()` right after the last report was sent.
+
+        self.on_relay_commands = {n: [0, 0xFF, n, 0, 0, 0, 0, 0, 1] for n in range(1, 9)}
+        self.off_relay_commands = {n: [0, 0xFD, n, 0, 0, 0, 0, 0, 1] for n in range(1, 9)}
 
-    def get_device(self):
-        self.hid_filter = hid.HidDeviceFilter(
+        self.command_count = 0
+        self.write_latency = RollingStatistics()  # seconds per report sent
+        self.read_latency = RollingStatistics()  # seconds per status read
+
+    def get_device(self, backend: str = None):
+        """
+        :param backend: `RelayBackendType` value. Defaults to `TransponderClient.backend`.
+        """
+        self.device = find_relay_device(
             vendor_id=self.usb_cfg_vendor_id,
-            product_id=self.usb_cfg_device_id
+            product_id=self.usb_cfg_device_id,
+            backend=backend or self.backend,
+            clock=self.clock,
         )
-        hid_device = self.hid_filter.get_devices()
-
-        if hid_device:
-            self.device = hid_device[0]
-        else:
-            self.device = None
+        if self.device is not None:
+            logging.info(f"Relay device found ({self.device.name})")
 
     def open_device(self):
         if self.device is not None:
             if self.device.is_active():
                 if not self.device.is_opened():
-                    self.device.open()
-                    self.get_report()
+                    self.device.open()  # the backend resolves its report once per open.
                     return True
                 else:
                     logging.info("Device already opened")
@@ -107,45 +193,59 @@ class TransponderClient:
         self.get_device()
         self.open_device()
 
-    def get_report(self):
-        if not self.device.is_active():
-            self.report = None
-
-        # FIXME this is weird. why no just take the last report ???
-        for rep in self.device.find_output_reports() + self.device.find_feature_reports():
-            self.report = rep
-
     def on_all(self):
-        if self.write_row_data(buffer=[0, 0xFE, 0, 0, 0, 0, 0, 0, 1]):
-            return self.read_relay_status(relay_number=3)
-        else:
-            logging.warning("Cannot put ON relays")
-            return False
+        return self.send_command(self.ON_ALL_COMMAND, self.ALL_RELAYS, True, "Cannot put ON relays")
 
     def off_all(self):
-        if self.write_row_data(buffer=[0, 0xFC, 0, 0, 0, 0, 0, 0, 1]):
-            return self.read_relay_status(relay_number=3)
-        else:
-            logging.warning("Cannot put OFF relays")
-            return False
+        return self.send_command(self.OFF_ALL_COMMAND, self.ALL_RELAYS, False, "Cannot put OFF relays")
 
     def on_relay(self, relay_number):
-        if self.write_row_data(buffer=[0, 0xFF, relay_number, 0, 0, 0, 0, 0, 1]):
-            return self.read_relay_status(relay_number)
-        else:
-            logging.warning("Cannot put ON relay number {}".format(relay_number))
-            return False
+        return self.send_command(
+            self.on_relay_commands[relay_number], relay_number, True,
+            "Cannot put ON relay number {}".format(relay_number)
+        )
 
     def off_relay(self, relay_number):
-        if self.write_row_data(buffer=[0, 0xFD, relay_number, 0, 0, 0, 0, 0, 1]):
-            return self.read_relay_status(relay_number)
-        else:
-            logging.warning("Cannot put OFF relay number {}".format(relay_number))
+        return self.send_command(
+            self.off_relay_commands[relay_number], relay_number, False,
+            "Cannot put OFF relay number {}".format(relay_number)
+        )
+
+    def send_command(self, buffer, relay_number, state: bool, error_message: str) -> bool:
+        """
+        :param buffer: Preallocated command report.
+        :param relay_number: Status bits checked when the command is verified.
+        :param state: Expected state of the relays (True: on) after the command.
+        :return: True if the command was sent (and verified, see `verify_mode`).
+        """
+        self.command_count += 1
+        try:
+            sent = self.write_row_data(buffer=buffer)
+        except Exception as e:
+            logging.warning(f"{error_message}: {e}")
+            if self.verify_mode != RelayVerifyMode.ON_ERROR:
+                raise
+            return (self.read_relay_status(relay_number) > 0) is state  # did it go through anyway ?
+
+        if not sent:
+            logging.warning(error_message)
             return False
 
+        if (self.verify_mode == RelayVerifyMode.ALWAYS
+                or (self.verify_mode == RelayVerifyMode.EVERY_N and self.command_count % self.verify_every == 0)):
+            if (self.read_relay_status(relay_number) > 0) is not state:
+                logging.warning(f"{error_message} (status read back)")
+                return False
+        return True
+
     def write_row_data(self, buffer):
-        if self.report is not None:
-            self.report.send(raw_data=buffer)
+        if self.device is not None and self.device.is_opened():
+            start = time.perf_counter()
+            self.device.send_report(buffer)
+            self.last_write_time = self.clock.monotonic()
+            latency = time.perf_counter() - start
+            self.write_latency.add(latency)
+            metrics.RELAY_IO_LATENCY.labels("write").observe(latency)
             return True
         else:
             logging.warning("Cannot write in the report. check if your device is still plugged")
@@ -159,9 +259,17 @@ class TransponderClient:
         return relay_number & buffer[8]
 
     def read_status_row(self):
-        if self.report is None:
+        if self.device is None or not self.device.is_opened():
             logging.warning("Cannot read report")
             self.last_row_status = [0, 1, 0, 0, 0, 0, 0, 0, 3]
         else:
-            self.last_row_status = self.report.get()
+            start = time.perf_counter()
+            self.last_row_status = self.device.get_report()
+            latency = time.perf_counter() - start
+            self.read_latency.add(latency)
+            metrics.RELAY_IO_LATENCY.labels("read").observe(latency)
         return self.last_row_status
+
+    def latency_summary(self) -> dict:
+        """Per USB transaction latency (seconds)."""
+        return {"write": self.write_latency.summary(), "read": self.read_latency.summary()}
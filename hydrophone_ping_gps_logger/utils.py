@@ -3,10 +3,6 @@
 
 import logging
 
-import serial.tools.list_ports
-
-import pywinusb.hid as hid # If it doesnt work try `hidapi`
-
 
 def find_usb_device(device_name) -> str:
     usb_devices = {} # fixme
@@ -20,6 +16,8 @@ def find_usb_device(device_name) -> str:
 
 
 def list_usb_devices() -> dict[str, str]:
+    import pywinusb.hid as hid # Windows only. If it doesnt work try `hidapi`
+
     devices = hid.HidDeviceFilter().get_devices()
 
     return {f"{d.vendor_name} {d.product_name} {d.product_id}": d.device_path for d in devices}
@@ -31,6 +29,8 @@ def list_serial_ports() -> list:
     :return dict of {device_name: device_path}
 
     """
+    import serial.tools.list_ports
+
     ports_info = serial.tools.list_ports.comports()
 
     return [pi.device for pi in ports_info]
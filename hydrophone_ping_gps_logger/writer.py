@@ -0,0 +1,189 @@
+"""
+Keep-open file writer running on its own thread.
+
+Other threads only hand off records to a bounded queue (`submit` never blocks); the
+records are formatted and written by the writer thread, which holds the file open
+for the whole run and syncs it to disk according to a `DurabilityPolicy`.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass
+
+try:
+    from hydrophone_ping_gps_logger import metrics
+    from hydrophone_ping_gps_logger.stats import RollingStatistics
+except ImportError:
+    import metrics
+    from stats import RollingStatistics
+
+WRITER_QUEUE_SIZE = 10000
+
+_STOP = object()
+
+
+@dataclass
+class DurabilityPolicy:
+    flush_every_record: bool = True  # flushed to the OS after each record.
+    fsync_every_records: int = 0  # fsync after that many records. 0: disabled
+    fsync_every_seconds: float = 0  # fsync at most that many seconds after a record was written. 0: disabled
+    fsync_on_stop: bool = True
+
+
+class RecordWriter:
+    def __init__(self, path, format_record=str, mode: str = "a", durability: DurabilityPolicy = None,
+                 name: str = "writer", opener=open, queue_size: int = WRITER_QUEUE_SIZE):
+        """
+        :param path: File to write to. Opened once, by `start`.
+        :param format_record: Called by the writer thread with each record, returns the text (or bytes)
+            to write. Records for which it returns None are skipped.
+        :param mode: File open mode, e.g. `a` or `ab`.
+        :param durability: When the file is synced to disk. Defaults to `DurabilityPolicy()`.
+        :param name: Thread name, for logging purposes.
+        :param opener: `open` or an equivalent (e.g. `gzip.open`).
+        :param queue_size: Records waiting to be written before `submit` starts dropping them.
+        """
+        self.path = path
+        self.format_record = format_record
+        self.mode = mode
+        self.durability = durability or DurabilityPolicy()
+        self.name = name
+        self.opener = opener
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread: threading.Thread = None
+        self.file = None
+
+        self.written_count = 0
+        self.dropped_count = 0
+        self.error_count = 0
+        self.max_queue_depth = 0
+        self.write_latency = RollingStatistics()  # seconds to write (and flush/sync) a record.
+        self.handoff_latency = RollingStatistics()  # seconds from `submit` to the record written.
+
+        self._unsynced_count = 0
+        self._unsynced_since: float = None
+
+        self._write_latency_metric = metrics.FILE_WRITE_LATENCY.labels(name)
+        self._dropped_metric = metrics.FILE_RECORDS_DROPPED.labels(name)
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.file = self.opener(self.path, self.mode)
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def submit(self, record) -> bool:
+        """
+        Hands off a record to the writer thread. Never blocks.
+
+        :return: False if the record was dropped because the queue is full.
+        """
+        try:
+            self.queue.put_nowait((time.perf_counter(), record))
+        except queue.Full:
+            self.dropped_count += 1
+            self._dropped_metric.inc()
+            logging.warning(f"[{self.name}] Queue full, record dropped")
+            return False
+
+        depth = self.queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return True
+
+    def stop(self):
+        """Writes the records still queued then closes the file."""
+        if self.thread is None:
+            return
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.thread = None
+
+    def summary(self) -> dict:
+        return {
+            "written": self.written_count,
+            "dropped": self.dropped_count,
+            "errors": self.error_count,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "write_latency": self.write_latency.summary(),
+            "handoff_latency": self.handoff_latency.summary(),
+        }
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self._sync_timeout())
+                except queue.Empty:
+                    self._sync()
+                    continue
+
+                if item is _STOP:
+                    break
+                self._write(*item)
+        finally:
+            self._close()
+
+    def _sync_timeout(self) -> float:
+        """Seconds until the time based fsync is due. None: nothing to sync."""
+        if not self.durability.fsync_every_seconds or self._unsynced_since is None:
+            return None
+        return max(self._unsynced_since + self.durability.fsync_every_seconds - time.perf_counter(), 0)
+
+    def _write(self, submit_time: float, record):
+        start = time.perf_counter()
+        try:
+            data = self.format_record(record)
+            if data is None:
+                return
+            self.file.write(data)
+            if self.durability.flush_every_record:
+                self.file.flush()
+        except Exception as e:
+            self.error_count += 1
+            logging.error(f"[{self.name}] Write failed: {e}")
+            return
+
+        self.written_count += 1
+        self._unsynced_count += 1
+        if self._unsynced_since is None:
+            self._unsynced_since = start
+
+        if ((self.durability.fsync_every_records and self._unsynced_count >= self.durability.fsync_every_records)
+                or (self.durability.fsync_every_seconds
+                    and start - self._unsynced_since >= self.durability.fsync_every_seconds)):
+            self._sync()
+
+        end = time.perf_counter()
+        self.write_latency.add(end - start)
+        self._write_latency_metric.observe(end - start)
+        self.handoff_latency.add(end - submit_time)
+
+    def _sync(self):
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except (OSError, ValueError, AttributeError) as e:  # not every opener gives a real file.
+            logging.warning(f"[{self.name}] Sync failed: {e}")
+        self._unsynced_count = 0
+        self._unsynced_since = None
+
+    def _close(self):
+        try:
+            if self.durability.fsync_on_stop:
+                self._sync()
+            self.file.close()
+        except Exception as e:
+            logging.error(f"[{self.name}] Close failed: {e}")
+        logging.info(f"[{self.name}] {self.summary()}")
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from hydrophone_ping_gps_logger.clock import VirtualClock
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock(start_time=1_700_000_000, start_monotonic=0)
+    yield clock
+    clock.close()
+
+
+def test_sleeping_threads_wake_in_deadline_order(clock):
+    wakes = []
+    lock = threading.Lock()
+
+    def sleeper(name, durations):
+        for duration in durations:
+            clock.sleep(duration)
+            with lock:
+                wakes.append((clock.monotonic(), name))
+
+    with clock.participate():
+        threads = [clock.start_thread(sleeper, name, args=(name, durations))
+                   for name, durations in (("a", (3, 3, 3)), ("b", (1, 4, 2.5)), ("c", (2, 5.5)))]
+        for thread in threads:
+            clock.join(thread)
+        assert clock.monotonic() == 9
+        assert clock.time() == 1_700_000_009
+
+    # same deadline: in the order the sleeps started, c at 2 before b at 5.
+    assert wakes == [(1, "b"), (2, "c"), (3, "a"), (5, "b"), (6, "a"), (7.5, "c"), (7.5, "b"), (9, "a")]
+
+
+def test_notify_wakes_a_timed_wait_before_its_timeout(clock):
+    condition = threading.Condition()
+    results = []
+
+    def waiter():
+        with condition:
+            results.append((clock.wait(condition, timeout=10), clock.monotonic()))
+
+    def notifier():
+        clock.sleep(4)
+        with condition:
+            clock.notify_all(condition)
+
+    with clock.participate():
+        threads = [clock.start_thread(waiter, "waiter"), clock.start_thread(notifier, "notifier")]
+        for thread in threads:
+            clock.join(thread)
+        with condition:
+            results.append((clock.wait(condition, timeout=10), clock.monotonic()))
+
+    assert results == [(True, 4), (False, 14)]
+
+
+def test_cancelled_timer_never_runs(clock):
+    calls = []
+    with clock.participate():
+        kept = clock.timer(2, calls.append, args=("kept",))
+        cancelled = clock.timer(1, calls.append, args=("cancelled",))
+        cancelled.cancel()
+        clock.join(cancelled)
+        clock.join(kept)
+        assert clock.monotonic() == 2
+    assert calls == ["kept"]
@@ -0,0 +1,108 @@
+import time
+import threading
+
+from hydrophone_ping_gps_logger.events import (EventBus, PingEvent, ConnectionEvent, RunStateEvent, RunState,
+                                               Device, FixEvent, Backpressure)
+from hydrophone_ping_gps_logger.gps import NmeaData
+from hydrophone_ping_gps_logger.relay import RelayBackendType
+from hydrophone_ping_gps_logger.pingloggercontroller import PingLoggerController, PingRunParameters
+
+
+def test_drop_oldest_keeps_the_latest_events():
+    bus = EventBus()
+    subscription = bus.subscribe((PingEvent,), maxsize=3)
+    for n in range(1, 6):
+        bus.publish(PingEvent(n, float(n)))
+    bus.publish(ConnectionEvent(Device.GPS, True))  # not subscribed to.
+    assert subscription.dropped_count == 2
+    assert [e.ping_number for e in subscription.get_all(timeout=0)] == [3, 4, 5]
+    assert subscription.get_all(timeout=0) == []
+
+
+def test_closed_subscription_receives_nothing():
+    bus = EventBus()
+    subscription = bus.subscribe()
+    subscription.close()
+    bus.publish(PingEvent(1, 1.))
+    assert subscription.get_all(timeout=0) == []
+    assert bus.subscriptions == ()
+
+
+def test_controller_events(tmp_path):
+    controller = PingLoggerController()
+    subscription = controller.events.subscribe()
+
+    controller.transponder_controller.connect(backend=RelayBackendType.SIMULATED)
+    controller.transponder_controller.pulse_width = 0.01
+    controller.gps_controller.events.publish(FixEvent(NmeaData()))  # the GPS publishes on the same bus.
+    controller.start_ping_run(PingRunParameters(
+        output_directory_path=str(tmp_path), ship_name="Leim", ping_interval=0.05, number_of_pings=2,
+        start_delay_seconds=0
+    ), bypass_gps=True)
+    controller.clock.join(controller.ping_run_thread)
+    controller.transponder_controller.disconnect()
+
+    events = []
+    while batch := subscription.get_all(timeout=0):
+        events += batch
+    assert [type(e) for e in events] == [ConnectionEvent, FixEvent, RunStateEvent, PingEvent, PingEvent,
+                                         RunStateEvent, ConnectionEvent]
+    assert [(e.state, e.ping_count) for e in events if isinstance(e, RunStateEvent)] == [(RunState.STARTED, 0),
+                                                                                       (RunState.STOPPED, 2)]
+    assert [e.ping_number for e in events if isinstance(e, PingEvent)] == [1, 2]
+    assert [(e.device, e.connected) for e in events if isinstance(e, ConnectionEvent)] == [
+        (Device.TRANSPONDER, True), (Device.TRANSPONDER, False)]
+
+
+def test_block_waits_for_the_consumer_and_keeps_the_order():
+    bus = EventBus()
+    subscription = bus.subscribe((PingEvent,), maxsize=2, backpressure=Backpressure.BLOCK)
+    received = []
+
+    def consume():
+        while len(received) < 50:
+            time.sleep(0.001)  # slower than the publisher: the queue is full most of the time.
+            event = subscription.get(timeout=2)
+            if event is None:
+                return
+            received.append(event.ping_number)
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    for n in range(1, 51):
+        bus.publish(PingEvent(n, float(n)))
+    consumer.join()
+    assert received == list(range(1, 51))
+    assert subscription.dropped_count == 0
+
+
+def test_block_timeout_drops_the_new_event():
+    bus = EventBus()
+    subscription = bus.subscribe(maxsize=1, backpressure=Backpressure.BLOCK, block_timeout=0.01)
+    bus.publish(PingEvent(1, 1.))
+    bus.publish(PingEvent(2, 2.))  # nobody consumes: dropped after 10 ms.
+    assert subscription.dropped_count == 1
+    assert [e.ping_number for e in subscription.get_all(timeout=0)] == [1]
+
+
+def test_close_releases_a_blocked_publisher():
+    bus = EventBus()
+    subscription = bus.subscribe(maxsize=1, backpressure=Backpressure.BLOCK)
+    bus.publish(PingEvent(1, 1.))
+    publisher = threading.Thread(target=bus.publish, args=(PingEvent(2, 2.),))
+    publisher.start()
+    time.sleep(0.05)
+    subscription.close()
+    publisher.join(timeout=2)
+    assert not publisher.is_alive()
+
+
+def test_callback_runs_on_the_publisher_thread():
+    bus = EventBus()
+    calls = []
+    bus.subscribe_callback(lambda e: calls.append((e.ping_number, threading.current_thread())), (PingEvent,))
+    bus.subscribe_callback(lambda e: 1 / 0)  # a failing callback doesn't stop the others.
+    bus.publish(ConnectionEvent(Device.GPS, True))
+    bus.publish(PingEvent(1, 1.))
+    bus.publish(PingEvent(2, 2.))
+    assert calls == [(1, threading.current_thread()), (2, threading.current_thread())]
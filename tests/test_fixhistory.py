@@ -0,0 +1,87 @@
+import math
+
+import pytest
+
+from hydrophone_ping_gps_logger.fixhistory import FixHistory, Fix
+from hydrophone_ping_gps_logger.gps import GpsController, NmeaData
+from hydrophone_ping_gps_logger.pingloggercontroller import FIELD_PADDING, FIELD_NAME
+
+
+def history(*fixes, capacity=10):
+    fix_history = FixHistory(capacity=capacity)
+    for fix in fixes:
+        fix_history.append(*fix)
+    return fix_history
+
+
+def test_empty():
+    assert history().interpolate(1.) is None
+    assert history().latest() is None
+
+
+def test_interpolate_between_fixes():
+    fix = history(Fix(10., 1000., 48., -68., 10.), Fix(11., 1001., 49., -67., 20.)).interpolate(10.25)
+    assert fix == pytest.approx(Fix(10.25, 1000.25, 48.25, -67.75, 12.5))
+
+
+def test_exact_fix():
+    fixes = [Fix(10., 1000., 48., -68., 10.), Fix(11., 1001., 49., -67., 20.)]
+    assert history(*fixes).interpolate(11.) == fixes[1]
+
+
+def test_older_than_history():
+    assert history(Fix(10., 1000., 48., -68., 10.)).interpolate(9.) is None
+
+
+def test_extrapolation_limit():
+    fix_history = history(Fix(10., 1000., 48., -68., 10.), Fix(11., 1001., 49., -67., 20.))
+    assert fix_history.interpolate(12.) == pytest.approx(Fix(12., 1002., 50., -66., 30.))
+    assert fix_history.interpolate(13.5) is None
+
+
+def test_heading_wraps_around_north():
+    fix = history(Fix(0., 0., 0., 0., 350.), Fix(1., 1., 0., 0., 10.)).interpolate(0.5)
+    assert fix.heading % 360 == pytest.approx(0.)
+
+
+def test_longitude_wraps_around_antimeridian():
+    fix = history(Fix(0., 0., 0., 179.5, 0.), Fix(1., 1., 0., -179.5, 0.)).interpolate(0.5)
+    assert abs(fix.longitude) == pytest.approx(180.)
+
+
+def test_unknown_heading():
+    fix = history(Fix(0., 0., 0., 0., math.nan), Fix(1., 1., 0., 0., 90.)).interpolate(0.5)
+    assert fix.heading == 90.
+
+
+def test_ring_overwrites_oldest():
+    fix_history = history(*(Fix(t, t, 0., 0., 0.) for t in range(15)), capacity=10)
+    assert len(fix_history) == 10
+    assert fix_history.interpolate(4.) is None
+    assert fix_history.interpolate(5.).receive_time == 5.
+    assert fix_history.latest().receive_time == 14.
+
+
+def test_out_of_order_fix_ignored():
+    fix_history = history(Fix(2., 2., 0., 0., 0.), Fix(1., 1., 0., 0., 0.))
+    assert len(fix_history) == 1
+
+
+def test_fixes_window():
+    fix_history = history(*(Fix(t, t, 0., 0., 0.) for t in range(10)))
+    assert [f.receive_time for f in fix_history.fixes(2.5, 5.)] == [3., 4., 5.]
+
+
+@pytest.mark.parametrize("gps_time, time", [("12:35:54+00:00", "12:35:54+00:00"),
+                                            ("12:35:54.500000+00:00", "12:35:54.250000+00:00")])
+def test_nmea_data_at_keeps_gps_time_resolution(gps_time, time):
+    controller = GpsController()
+    controller.nmea_data = NmeaData(date="2024-04-24", time=gps_time, latitude="4838.4572 N",
+                                    longitude="06809.4211 W", heading="45.0")
+    start = 1713962154.
+    controller.fix_history.append(10., start, 48.640953, -68.157018, 45.)
+    controller.fix_history.append(10.5, start + 0.5, 48.640953, -68.157018, 45.)
+    nmea_data = controller.nmea_data_at(10.25)
+    assert nmea_data.time == time
+    if "." not in gps_time:
+        assert len(nmea_data.time) <= FIELD_PADDING[FIELD_NAME.index("gps_time")]
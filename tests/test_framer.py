@@ -0,0 +1,51 @@
+from hydrophone_ping_gps_logger.gps import NmeaFramer
+
+RMC = b"$GPRMC,123554,A,4838.4572,N,06809.4211,W,007.5,045.2,240424,017.4,W,A*1A"
+HDT = b"$GPHDT,274.07,T*03"
+
+
+def test_whole_sentences():
+    framer = NmeaFramer()
+    assert framer.feed(RMC + b"\r\n" + HDT + b"\r\n") == [RMC, HDT]
+    assert framer.buffer == b""
+
+
+def test_sentence_split_across_reads():
+    framer = NmeaFramer()
+    data = RMC + b"\r\n" + HDT + b"\r\n"
+    sentences = []
+    for i in range(0, len(data), 7):
+        sentences += framer.feed(data[i:i + 7])
+    assert sentences == [RMC, HDT]
+
+
+def test_partial_tail_kept_until_line_ending():
+    framer = NmeaFramer()
+    assert framer.feed(RMC + b"\r\n" + HDT[:5]) == [RMC]
+    assert framer.buffer == HDT[:5]
+    assert framer.feed(HDT[5:] + b"\n") == [HDT]
+
+
+def test_truncated_sentence_dropped():
+    framer = NmeaFramer()
+    assert framer.feed(RMC[:20] + HDT + b"\r\n") == [HDT]
+
+
+def test_line_without_sentence_dropped():
+    framer = NmeaFramer()
+    assert framer.feed(b"garbage\r\n" + HDT + b"\r\n") == [HDT]
+
+
+def test_garbage_without_line_ending_trimmed():
+    framer = NmeaFramer(max_sentence_length=32)
+    assert framer.feed(b"x" * 100) == []
+    assert framer.buffer == b""
+    assert framer.feed(b"x" * 100 + HDT[:5]) == []
+    assert framer.buffer == HDT[:5]
+
+
+def test_clear():
+    framer = NmeaFramer()
+    framer.feed(RMC[:20])
+    framer.clear()
+    assert framer.feed(HDT + b"\n") == [HDT]
@@ -0,0 +1,90 @@
+import sys
+import math
+import subprocess
+import urllib.request
+
+import pytest
+
+from hydrophone_ping_gps_logger import metrics
+from hydrophone_ping_gps_logger.gps import GpsController
+from hydrophone_ping_gps_logger.metrics import MetricsRegistry, MetricsServer, Metric, _histogram_summary
+from hydrophone_ping_gps_logger.stats import RollingStatistics, percentile, summarize
+
+
+@pytest.mark.parametrize("q, expected", [(0, 1), (1, 1), (50, 50), (99, 99), (99.5, 100), (100, 100)])
+def test_percentile_nearest_rank(q, expected):
+    assert percentile(list(range(1, 101)), q) == expected
+
+
+def test_percentile_without_samples():
+    assert math.isnan(percentile([], 50))
+    assert math.isnan(percentile([1, 2], 50, counts=[0, 0]))
+
+
+def test_percentile_with_counts_matches_the_samples():
+    samples = [1] * 3 + [2] * 90 + [5] * 7
+    for q in (0, 1, 3, 4, 50, 93, 94, 99, 100):
+        assert percentile([1, 2, 5], q, counts=[3, 90, 7]) == percentile(samples, q)
+
+
+def test_summarize_matches_rolling_statistics():
+    values = [0.5, 0.1, 0.3, 0.2, 0.4]
+    rolling = RollingStatistics()
+    for value in values:
+        rolling.add(value)
+    assert summarize(values) == rolling.summary()
+    assert summarize([])["count"] == 0
+
+
+def test_histogram_summary():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "", buckets=(0.1, 1))
+    for value in (0.05, 0.05, 0.5):
+        histogram.observe(value)
+    child = histogram.children[()]
+    summary = _histogram_summary(histogram.buckets, child.counts, child.sum)
+    assert summary["count"] == 3
+    assert summary["p50"] == 0.1
+    assert summary["p99"] == 1
+
+    histogram.observe(10)
+    summary = _histogram_summary(histogram.buckets, child.counts, child.sum)
+    assert summary["p99"] == "+Inf"
+    assert _histogram_summary((0.1,), [0, 0], 0)["p50"] is None
+
+
+def sentence_counts() -> dict:
+    return {labels: child.value for labels, child in metrics.NMEA_SENTENCES.children.items()}
+
+
+def test_unknown_sentence_types_share_one_label():
+    controller = GpsController()
+    controller.process_sentence("$GPXY\x00,garbage*00")
+    controller.process_sentence("$GPZDA,123554.00,24,04,2024,00,00*6B")
+    controller.process_sentence("$GPHDT,274.07,T*03")
+    counts = sentence_counts()
+    assert set(counts) <= {("RMC",), ("HDT",), ("GGA",), ("VTG",), ("other",)}
+    assert counts[("other",)] >= 2
+    assert counts[("HDT",)] >= 1
+
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("base", "no value type")
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.counter("test_pings_total", "Pings.").inc(3)
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            assert "test_pings_total 3" in response.read().decode()
+    finally:
+        server.stop()
+
+
+def test_import_does_not_load_the_http_server():
+    code = "import sys, hydrophone_ping_gps_logger.metrics; print('http.server' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", code], capture_output=True, text=True).stdout.strip() == "False"
@@ -0,0 +1,131 @@
+import socket
+import time
+import logging
+
+import pytest
+
+from hydrophone_ping_gps_logger.netgps import (UdpGpsClient, TcpGpsClient, parse_network_address,
+                                               network_gps_client, NetworkAddress)
+
+HDT = "$GPHDT,274.07,T*03"
+RMC = "$GPRMC,123554.00,A,4838.4572,N,06809.4211,W,0.0,0.0,240424,,,A*63"
+
+
+def read_until(client, count: int, timeout: float = 2) -> list:
+    sentences = []
+    deadline = time.monotonic() + timeout
+    while len(sentences) < count and time.monotonic() < deadline:
+        sentences += client.read_sentences()
+    return sentences
+
+
+@pytest.fixture
+def server():
+    server = socket.create_server(("127.0.0.1", 0))
+    server.settimeout(2)
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def tcp_client(server):
+    client = TcpGpsClient("127.0.0.1", server.getsockname()[1])
+    assert client.connect() == 1
+    yield client
+    client.disconnect()
+
+
+def test_parse_network_address():
+    assert parse_network_address("udp://:10110") == NetworkAddress("udp", "", 10110)
+    assert parse_network_address("tcp://192.168.1.20:2000") == NetworkAddress("tcp", "192.168.1.20", 2000)
+    assert isinstance(network_gps_client("tcp://127.0.0.1:2000"), TcpGpsClient)
+    for address in ("serial://x", "tcp://:2000", "tcp://host"):
+        with pytest.raises(ValueError):
+            parse_network_address(address)
+
+
+def test_tcp_sentence_split_across_reads(server, tcp_client):
+    connection, _ = server.accept()
+    with connection:
+        connection.sendall(f"{HDT}\r\n{RMC[:20]}".encode())
+        assert read_until(tcp_client, 1) == [HDT]
+        assert tcp_client.read_sentences() == []  # the rest of RMC didn't arrive yet.
+        connection.sendall(f"{RMC[20:]}\r\n".encode())
+        assert read_until(tcp_client, 1) == [RMC]
+
+
+def test_tcp_reconnects_after_the_server_closes(server, tcp_client):
+    tcp_client.reconnect_interval = 0
+    connection, _ = server.accept()
+    connection.sendall(f"{HDT}\r\n{RMC[:20]}".encode())
+    assert read_until(tcp_client, 1) == [HDT]
+    connection.close()
+
+    assert tcp_client.read_sentences() == []  # connection lost, the partial RMC with it.
+    assert tcp_client.socket is None and tcp_client.next_reconnect is not None
+    tcp_client.read_sentences()  # reconnects
+    assert tcp_client.socket is not None and tcp_client.reconnect_count == 1
+
+    connection, _ = server.accept()
+    with connection:
+        connection.sendall(f"{RMC}\r\n".encode())
+        assert read_until(tcp_client, 1) == [RMC]
+
+
+def test_tcp_server_started_after_the_client():
+    probe = socket.create_server(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()  # nothing listens on `port` anymore.
+
+    client = TcpGpsClient("127.0.0.1", port)
+    client.reconnect_interval = 0
+    assert client.connect() == 1
+    assert client.socket is None and client.next_reconnect is not None
+    try:
+        with socket.create_server(("127.0.0.1", port)) as server:
+            server.settimeout(2)
+            client.read_sentences()  # first successful connection
+            assert client.socket is not None
+            connection, _ = server.accept()
+            with connection:
+                connection.sendall(f"{HDT}\r\n".encode())
+                assert read_until(client, 1) == [HDT]
+    finally:
+        client.disconnect()
+
+
+def test_udp_datagrams_with_and_without_line_ending():
+    client = UdpGpsClient("127.0.0.1", 0)
+    assert client.connect() == 1
+    try:
+        address = client.socket.getsockname()
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sender:
+            sender.sendto(f"{HDT}\r\n".encode(), address)
+            sender.sendto(RMC.encode(), address)  # no line ending: the datagram is the sentence.
+            sender.sendto(f"{HDT}\r\n{RMC}".encode(), address)
+            sender.sendto(HDT.encode(), address)
+        assert read_until(client, 5) == [HDT, RMC, HDT, RMC, HDT]
+    finally:
+        client.disconnect()
+
+
+def test_tcp_failed_reconnections_warned_at_most_every_interval(caplog):
+    probe = socket.create_server(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    client = TcpGpsClient("127.0.0.1", port)
+    client.reconnect_interval = 0
+    with caplog.at_level(logging.DEBUG):
+        assert client.connect() == 1
+        for _ in range(3):
+            client.read_sentences()
+        client.next_reconnect_warning = time.monotonic()  # the warning interval elapsed.
+        client.read_sentences()
+    client.disconnect()
+
+    assert client.failed_reconnect_count == 4
+    warnings = [r.getMessage() for r in caplog.records
+                if r.levelno == logging.WARNING and "Reconnection" in r.getMessage()]
+    assert len(warnings) == 2
+    assert "failed (1 attempts)" in warnings[0] and "failed (4 attempts)" in warnings[1]
@@ -0,0 +1,68 @@
+import pytest
+import pynmea2
+
+from hydrophone_ping_gps_logger import nmea
+from hydrophone_ping_gps_logger.gps import from_pynmea2
+
+SENTENCES = [
+    "$GPRMC,123554,A,4838.4572,N,06809.4211,W,007.5,045.2,240424,017.4,W,A",
+    "$GNRMC,123554.50,A,4838.45721,N,06809.42113,W,7.512,45.21,240424,,,A,V",
+    "$GPRMC,,V,,,,,,,,,,N",
+    "$GPHDT,274.07,T",
+    "$GPGGA,123554,4838.4572,N,06809.4211,W,1,09,0.9,12.3,M,-22.1,M,,",
+    "$GNGGA,123554.50,4838.45721,N,06809.42113,W,1,12,0.61,12.3,M,-22.1,M,,",
+    "$GPVTG,045.2,T,062.6,M,007.5,N,013.9,K,A",
+]
+
+
+def with_checksum(sentence: str) -> str:
+    body = sentence[1:]
+    return f"${body}*{nmea.nmea_checksum(body.encode()):02X}"
+
+
+@pytest.mark.parametrize("sentence", [with_checksum(s) for s in SENTENCES])
+def test_decode_matches_pynmea2(sentence):
+    assert nmea.decode(sentence) == from_pynmea2(pynmea2.parse(sentence))
+
+
+@pytest.mark.parametrize("fraction", ["", ".0", ".00", ".5", ".05", ".123", ".999", ".25", ".10", ".01"])
+@pytest.mark.parametrize("hhmmss", ["000000", "095959", "123554", "235959", "120000", "000001", "010203",
+                                    "235900", "121212", "000059"])
+def test_time_variants_match_pynmea2(hhmmss, fraction):
+    sentence = with_checksum(f"$GPRMC,{hhmmss}{fraction},A,4838.4572,N,06809.4211,W,007.5,045.2,240424,,,A")
+    assert nmea.decode(sentence) == from_pynmea2(pynmea2.parse(sentence))
+
+
+def test_checksum_of_pynmea2_sentence():
+    sentence = "$GPHDT,274.07,T*03"
+    assert nmea.nmea_checksum(sentence[1:-3].encode()) == 0x03
+
+
+def test_checksum_mismatch():
+    with pytest.raises(nmea.NmeaChecksumError):
+        nmea.decode("$GPHDT,274.07,T*04")
+
+
+def test_unsupported_sentences():
+    assert nmea.decode(with_checksum("$GPGSA,A,3,02,05,12,,,,,,,,,,1.7,0.9,1.4")) is None
+    assert nmea.decode("$PGRME,2.6,M,3.7,M,4.5,M*2E") is None
+    assert nmea.decode("garbage") is None
+
+
+def test_malformed_sentence():
+    with pytest.raises(nmea.NmeaDecodeError):
+        nmea.decode(with_checksum("$GPRMC,123554,A"))
+
+
+@pytest.mark.parametrize("datestamp, date", [("240424", "2024-04-24"), ("311268", "2068-12-31"),
+                                             ("010169", "1969-01-01"), ("", "")])
+def test_format_nmea_date(datestamp, date):
+    assert nmea.format_nmea_date(datestamp) == date
+
+
+@pytest.mark.parametrize("value, direction, is_latitude", [
+    ("4838.4572", "N", True), ("06809.4211", "W", False), ("0000.0000", "N", True), ("17959.9999", "E", False),
+])
+def test_degrees_round_trip(value, direction, is_latitude):
+    degrees = nmea.nmea_to_degrees(value, direction)
+    assert nmea.degrees_to_nmea(degrees, is_latitude) == f"{value} {direction}"
@@ -0,0 +1,70 @@
+import os
+import time
+
+import pytest
+
+from hydrophone_ping_gps_logger.clock import VirtualClock
+from hydrophone_ping_gps_logger.gps import GpsClient, ReplayGpsClient
+from hydrophone_ping_gps_logger.nmeacapture import CaptureReader
+
+BURSTS = [
+    ["$GPRMC,123554.00,A,4838.4572,N,06809.4211,W,0.1,274.0,240424,,,A*7A", "$GPHDT,274.07,T*03"],
+    ["$GPRMC,123555.00,A,4838.4573,N,06809.4212,W,0.1,274.1,240424,,,A*7B", "$GPHDT,274.10,T*0B"],
+    ["$GPRMC,123556.00,A,4838.4574,N,06809.4213,W,0.1,274.2,240424,,,A*7F"],
+]
+BURST_INTERVAL = 0.2
+
+
+def capture_bursts(capture_path) -> list:
+    """:return: The sentences received by a `GpsClient` reading a pseudo-terminal, captured to `capture_path`."""
+    master, slave = os.openpty()
+    try:
+        client = GpsClient(port=os.ttyname(slave), baudrate=4800, capture_path=capture_path)
+        client.timeout = 0.05  # `connect` waits a read timeout to clear the input buffer.
+        assert client.connect() == 1
+        received = []
+        for n, burst in enumerate(BURSTS):
+            if n:
+                time.sleep(BURST_INTERVAL)
+            os.write(master, "".join(s + "\r\n" for s in burst).encode())
+            deadline = time.monotonic() + 5
+            while len(received) < sum(map(len, BURSTS[:n + 1])) and time.monotonic() < deadline:
+                received += client.read_sentences()
+        client.disconnect()
+    finally:
+        os.close(master)
+        os.close(slave)
+    return received
+
+
+@pytest.mark.parametrize("name", ["session.nmeacap", "session.nmeacap.gz"])
+def test_capture_then_replay(tmp_path, name):
+    capture_path = tmp_path / name
+    sent = [s for burst in BURSTS for s in burst]
+    assert capture_bursts(capture_path) == sent
+
+    with CaptureReader(capture_path) as reader:
+        assert reader.metadata_lines[1:] == ["# baudrate: 4800"]
+        chunks = list(reader)
+    assert b"".join(data for _, data in chunks) == "".join(s + "\r\n" for s in sent).encode()
+    offsets = [offset for offset, _ in chunks]
+    assert offsets == sorted(offsets) and 0 <= offsets[0] < 1
+    assert offsets[-1] - offsets[0] >= (len(BURSTS) - 1) * BURST_INTERVAL
+
+    clock = VirtualClock(start_monotonic=0)
+    client = ReplayGpsClient(capture_path, speed=1, clock=clock)
+    replayed, replay_offsets = [], []
+    try:
+        with clock.participate():
+            assert client.connect() == 1
+            while True:
+                sentences = client.read_sentences()
+                if client.finished:
+                    break
+                replayed += sentences
+                replay_offsets.append(client.receive_time - client.replay_start)
+            client.disconnect()
+    finally:
+        clock.close()
+    assert replayed == sent
+    assert replay_offsets == pytest.approx(offsets, abs=1e-9)  # the virtual clock sleeps exactly.
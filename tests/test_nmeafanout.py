@@ -0,0 +1,69 @@
+import time
+import socket
+
+import pytest
+
+from hydrophone_ping_gps_logger.nmeafanout import NmeaFanout, parse_udp_targets, parse_sentence_types, _datagrams
+
+HDT = "$GPHDT,274.07,T*03"
+RMC = "$GPRMC,123554.00,A,4838.4572,N,06809.4211,W,0.0,0.0,240424,,,A*63"
+
+
+def receive_lines(sock: socket.socket, count: int) -> list:
+    data = b""
+    while data.count(b"\r\n") < count:
+        data += sock.recv(4096)
+    return data.decode().splitlines()
+
+
+def test_parse_targets_and_types():
+    assert parse_udp_targets("127.0.0.1:10110, 192.168.1.255:2000") == [("127.0.0.1", 10110), ("192.168.1.255", 2000)]
+    with pytest.raises(ValueError):
+        parse_udp_targets("127.0.0.1")
+    assert parse_sentence_types("rmc, HDT") == {"RMC", "HDT"}
+    assert parse_sentence_types(" ") is None
+
+
+def test_datagrams_split_between_sentences():
+    data = "".join(f"{RMC}\r\n" for _ in range(50)).encode()
+    datagrams = _datagrams(data)
+    assert len(datagrams) > 1
+    assert b"".join(datagrams) == data
+    assert all(d.endswith(b"\r\n") for d in datagrams)
+
+
+def test_tcp_and_udp_consumers_receive_the_filtered_sentences():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(2)
+    fanout = NmeaFanout(udp_targets=[receiver.getsockname()], tcp_port=0, sentence_types={"RMC"})
+    fanout.start()
+    try:
+        with socket.create_connection(("127.0.0.1", fanout.tcp_port), timeout=2) as client:
+            while not fanout.clients:  # accepted by the fan-out thread.
+                time.sleep(0.01)
+            fanout.submit([HDT, RMC])
+            fanout.submit([HDT])  # nothing left once filtered: not sent.
+            fanout.submit([RMC])
+            assert receive_lines(client, 2) == [RMC, RMC]
+        assert receiver.recv(4096) == f"{RMC}\r\n".encode()
+        assert receiver.recv(4096) == f"{RMC}\r\n".encode()
+    finally:
+        fanout.stop()
+        receiver.close()
+    assert fanout.burst_count == 2
+
+
+def test_pending_bursts_are_bounded(monkeypatch):
+    fanout = NmeaFanout(queue_size=3)
+    fanout.start()
+    try:
+        monkeypatch.setattr(fanout, "_wakeup", lambda: None)  # the fan-out thread stalls.
+        for i in range(5):
+            fanout.submit([f"$GPHDT,{i},T"])
+        assert len(fanout.pending) == 3
+        assert fanout.dropped_burst_count == 2
+        assert fanout.pending[0] == b"$GPHDT,2,T\r\n"  # the oldest were dropped.
+    finally:
+        monkeypatch.undo()
+        fanout.stop()
@@ -0,0 +1,81 @@
+import math
+
+import pytest
+
+from hydrophone_ping_gps_logger import pingbinary
+from hydrophone_ping_gps_logger.pingbinary import (pack_record, unpack_record, RECORD_STRUCT, FLAG_GPS_TIME,
+                                                   FLAG_GPS_TIME_OF_DAY)
+from hydrophone_ping_gps_logger.pingloggercontroller import format_data_line, FIELD_NAME
+
+EPOCH_NS = 1713962151_123456789
+
+
+def flags(record: bytes) -> int:
+    return RECORD_STRUCT.unpack(record)[-1]
+
+
+@pytest.mark.parametrize("fields", [
+    ("2024-04-24", "12:35:54+00:00", "4838.4572 N", "06809.4211 W", "274.07"),
+    ("2024-04-24", "12:35:54.250000+00:00", "4838.45720 N", "06809.42110 W", "274.1"),
+    ("2024-04-24", "00:00:00+00:00", "0000.0000 N", "00000.0000 E", "0"),
+    ("", "", "", "", ""),
+])
+def test_round_trip(fields):
+    assert unpack_record(pack_record(EPOCH_NS, -240, *fields)) == (EPOCH_NS, -240, *fields)
+
+
+@pytest.mark.parametrize("time", ["12:35:54+00:00", "12:35:54.500000+00:00", "23:59:59+00:00", "00:00:00+00:00"])
+def test_time_without_date_round_trip(time):
+    record = pack_record(EPOCH_NS, 0, "", time, "4838.4572 N", "06809.4211 W", "")
+    assert flags(record) & FLAG_GPS_TIME_OF_DAY and not flags(record) & FLAG_GPS_TIME
+    assert unpack_record(record) == (EPOCH_NS, 0, "", time, "4838.4572 N", "06809.4211 W", "")
+
+
+def test_time_without_date_is_stored_as_seconds_since_midnight():
+    gps_time = RECORD_STRUCT.unpack(pack_record(EPOCH_NS, 0, "", "01:00:01.5+00:00", "", "", ""))[1]
+    assert gps_time == 3601.5
+
+
+def test_missing_values_are_nan():
+    _, gps_time, lat, lon, head, _, record_flags = RECORD_STRUCT.unpack(pack_record(EPOCH_NS, 0, "", "", "", "", ""))
+    assert all(math.isnan(v) for v in (gps_time, lat, lon, head))
+    assert record_flags == 0
+
+
+def test_header_round_trip(tmp_path):
+    path = tmp_path / "out.pingb"
+    lines = ["# transponder_id: 3", "# ping_interval_s: 5"]
+    path.write_bytes(pingbinary.encode_header(lines) + pack_record(EPOCH_NS, 0, "", "", "", "", ""))
+    with open(path, "rb") as f:
+        metadata_lines, offset = pingbinary.read_header(f)
+        assert metadata_lines == lines
+        assert offset % 8 == 0
+        assert f.read() == pack_record(EPOCH_NS, 0, "", "", "", "", "")
+
+
+def test_text_binary_text_is_lossless(tmp_path):
+    rows = [
+        ["20240424T083551-0400", "2024-04-24", "12:35:51+00:00", "4838.4572 N", "06809.4211 W", "274.07"],
+        ["20240424T083556-0400", "", "12:35:56+00:00", "4838.4580 N", "06809.4200 W", ""],
+        ["20240424T083601-0400", "", "", "", "", ""],
+    ]
+    text = "# transponder_id: 3\n" + "".join(format_data_line(row) + "\n" for row in [FIELD_NAME, *rows])
+    (tmp_path / "in.ping").write_text(text)
+    pingbinary.text_to_binary(tmp_path / "in.ping", tmp_path / "out.pingb")
+    pingbinary.binary_to_text(tmp_path / "out.pingb", tmp_path / "out.ping")
+    assert (tmp_path / "out.ping").read_text() == text
+
+
+@pytest.mark.parametrize("fields, expected", [
+    (("2024-04-24", "12:35:54+00:00", " N", "06809.4211 W", "274.07"),
+     ("2024-04-24", "12:35:54+00:00", "", "", "274.07")),
+    (("2024-04-24", "12:35:54+00:00", "4838.4572 N", "068x9.4211 W", "27?.07"),
+     ("2024-04-24", "12:35:54+00:00", "", "", "")),
+    (("2024-04-24", "12:3#:54+00:00", "4838.4572 N", "06809.4211 W", ""),
+     ("", "", "4838.4572 N", "06809.4211 W", "")),
+    (("2024-13-24", "12:35:54+00:00", "48.5 N", "06809.4211 W", "T"),
+     ("", "", "", "", "")),
+])
+def test_malformed_fields_are_stored_as_missing(fields, expected):
+    record = pack_record(EPOCH_NS, 60, *fields)
+    assert unpack_record(record) == (EPOCH_NS, 60, *expected)
@@ -0,0 +1,96 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from hydrophone_ping_gps_logger import pingbinary
+from hydrophone_ping_gps_logger.pingindex import PingIndex, BoundingBox
+from hydrophone_ping_gps_logger.pingloggercontroller import format_data_line, FIELD_NAME
+
+START = datetime.datetime(2024, 4, 24, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+def rows(count: int, start: datetime.datetime, latitude: int, longitude: int) -> list:
+    """One ping every 15 s, moving north."""
+    result = []
+    for i in range(count):
+        time = start + datetime.timedelta(seconds=15 * i)
+        result.append([time.strftime("%Y%m%dT%H%M%S%z"), str(time.date()), f"{time.time()}+00:00",
+                       f"{latitude:02d}{i:02d}.0000 N", f"{abs(longitude):03d}00.0000 {'W' if longitude < 0 else 'E'}",
+                       "90.00"])
+    return result
+
+
+def write_ping_file(path, ship_name: str, data_rows: list):
+    lines = [f"# ship_name: {ship_name}", format_data_line(FIELD_NAME), *(format_data_line(r) for r in data_rows)]
+    path.write_text("".join(line + "\n" for line in lines))
+    return path
+
+
+@pytest.fixture
+def ping_directory(tmp_path):
+    directory = tmp_path / "pings"
+    (directory / "2024").mkdir(parents=True)
+    write_ping_file(directory / "leim.ping", "Leim", rows(10, START, 48, -68))
+    later = START + datetime.timedelta(hours=1)
+    text = write_ping_file(tmp_path / "coriolis.ping", "Coriolis", rows(10, later, 47, -69))
+    pingbinary.text_to_binary(text, directory / "2024" / "coriolis.pingb")
+    return directory
+
+
+@pytest.fixture
+def index(tmp_path):
+    with PingIndex(tmp_path / "index.sqlite", block_records=3) as ping_index:
+        yield ping_index
+
+
+def epoch(minutes: float) -> float:
+    return (START + datetime.timedelta(minutes=minutes)).timestamp()
+
+
+def test_update_indexes_only_changed_files(ping_directory, index):
+    assert index.update(ping_directory) == {"indexed": 2, "unchanged": 0, "removed": 0, "failed": 0}
+    assert index.update(ping_directory) == {"indexed": 0, "unchanged": 2, "removed": 0, "failed": 0}
+
+    write_ping_file(ping_directory / "leim.ping", "Leim", rows(12, START, 48, -68))
+    (ping_directory / "2024" / "coriolis.pingb").unlink()
+    assert index.update(ping_directory) == {"indexed": 1, "unchanged": 0, "removed": 1, "failed": 0}
+    (leim,) = index.files()
+    assert (leim.ship_name, leim.record_count) == ("Leim", 12)
+    assert (leim.start_time, leim.end_time) == (epoch(0), epoch(11 * 0.25))
+
+
+def test_time_query(ping_directory, index):
+    index.update(ping_directory)
+    results = list(index.query(start_time=epoch(0.5), end_time=epoch(1)))
+    assert len(results) == 1
+    indexed_file, records = results[0]
+    assert indexed_file.ship_name == "Leim"
+    assert records["timestamp"].astype(np.int64).tolist() == [epoch(0.5), epoch(0.75), epoch(1)]
+
+    results = list(index.query(start_time=epoch(60 + 2.25)))  # the binary file, last record only
+    assert [(f.format, len(r)) for f, r in results] == [("binary", 1)]
+    assert results[0][1]["latitude"][0] == pytest.approx(47 + 9 / 60)
+
+
+def test_bbox_and_ship_queries(ping_directory, index):
+    index.update(ping_directory)
+    bbox = BoundingBox(lat_min=47.05, lon_min=-69.5, lat_max=47.11, lon_max=-68.5)
+    ((indexed_file, records),) = index.query(bbox=bbox)
+    assert indexed_file.ship_name == "Coriolis"
+    assert records["latitude"] == pytest.approx([47 + 3 / 60, 47 + 4 / 60, 47 + 5 / 60, 47 + 6 / 60])
+
+    assert [f.ship_name for f in index.files(ship_name="Leim")] == ["Leim"]
+    assert list(index.query(bbox=bbox, ship_name="Leim")) == []
+    assert list(index.query(bbox=BoundingBox(0, 0, 1, 1))) == []
+
+
+def test_truncated_binary_file(ping_directory, index):
+    path = ping_directory / "2024" / "coriolis.pingb"
+    path.write_bytes(path.read_bytes()[:-5])  # interrupted write of the last record.
+
+    assert index.update(ping_directory)["failed"] == 0
+    (coriolis,) = index.files(ship_name="Coriolis")
+    assert coriolis.record_count == 9
+    ((_, records),) = index.query(ship_name="Coriolis")
+    assert len(records) == 9
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from hydrophone_ping_gps_logger import pingreader
+from hydrophone_ping_gps_logger.relay import RelayBackendType
+from hydrophone_ping_gps_logger.events import RunStateEvent, RunState
+from hydrophone_ping_gps_logger.writer import RecordWriter
+from hydrophone_ping_gps_logger.pingloggercontroller import PingLoggerController, PingRunParameters
+
+
+def ping_file_header(tmp_path, **parameters) -> list:
+    controller = PingLoggerController()
+    controller.ping_run_parameters = PingRunParameters(
+        output_directory_path=str(tmp_path), ship_name="Leim", ping_interval=15, number_of_pings=0,
+        start_delay_seconds=0, **parameters
+    )
+    controller.init_ping_file()
+    controller.ping_writer.stop()
+    return controller.header_lines
+
+
+@pytest.mark.parametrize("output_format", ["text", "binary"])
+def test_transponder_depth_header(tmp_path, output_format):
+    lines = ping_file_header(tmp_path, transponder_depth=5.5, output_format=output_format)
+    assert "# transponder_depth_meter: 5.5" in lines
+
+
+def test_unset_transponder_depth_is_left_out(tmp_path):
+    lines = ping_file_header(tmp_path)
+    assert not any(line.startswith("# transponder_depth_meter") for line in lines)
+
+    (path,) = tmp_path.glob("*.ping")
+    with open(path, "rb") as f:
+        run_parameters, header = pingreader.read_header(f, path)
+    assert run_parameters.transponder_depth is None
+    assert header["ship_name"] == "Leim"
+
+
+def test_stop_waits_for_the_window_being_submitted(tmp_path, monkeypatch):
+    submit = RecordWriter.submit
+
+    def slow_submit(writer, record):
+        if writer.name == "window_writer":
+            time.sleep(0.2)  # the run ends while the last window is being handed off.
+        return submit(writer, record)
+
+    monkeypatch.setattr(RecordWriter, "submit", slow_submit)
+    controller = PingLoggerController()
+    controller.transponder_controller.connect(backend=RelayBackendType.SIMULATED)
+    controller.transponder_controller.pulse_width = 0.01
+    controller.gps_controller.fix_history.append(time.monotonic(), time.time(), 48.6, -68.1, 90.)
+
+    def on_stopped(event):
+        if event.state == RunState.STOPPED:
+            time.sleep(0.1)  # the window timer (0.05 s) fires before the writers are stopped.
+
+    controller.events.subscribe_callback(on_stopped, (RunStateEvent,))
+    controller.start_ping_run(PingRunParameters(
+        output_directory_path=str(tmp_path), ship_name="Leim", ping_interval=1, number_of_pings=1,
+        start_delay_seconds=0, window_pre_seconds=5, window_post_seconds=0.05
+    ), bypass_gps=True)
+    controller.clock.join(controller.ping_run_thread)
+    controller.transponder_controller.disconnect()
+
+    assert controller.window_writer is None and not controller.window_timers
+    (path,) = tmp_path.glob("*.window")
+    assert path.read_text().splitlines()[-1].startswith("1,")
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from hydrophone_ping_gps_logger import pingbinary, pingreader
+from hydrophone_ping_gps_logger.pingloggercontroller import format_data_line, FIELD_NAME
+
+HEADER = [
+    "# datetime: 20240424T123551",
+    "# ship_name: Leim",
+    "# ping_interval_second: 15",
+    "# number_of_pings: -1",
+    "# start_delay_second: 0",
+    "# transponder_depth_meter: 5.5",
+]
+ROWS = [
+    ["20240424T083551-0400", "2024-04-24", "12:35:51+00:00", "4838.4572 N", "06809.4211 W", "274.07"],
+    ["20240424T123556+0000", "2024-04-24", "12:35:56.250000+00:00", "4838.4580 S", "06809.4200 E", "0.5"],
+    ["20240424T180101+0530", "", "12:31:01+00:00", "", "", ""],
+    ["20240424T123606-0400", "", "", "", "", ""],
+]
+
+
+def write_ping_file(path, rows=ROWS, line_ending="\n"):
+    lines = [*HEADER, format_data_line(FIELD_NAME), *(format_data_line(row) for row in rows)]
+    path.write_bytes("".join(line + line_ending for line in lines).encode())
+    return path
+
+
+@pytest.mark.parametrize("line_ending", ["\n", "\r\n"])
+def test_read_ping_file(tmp_path, line_ending):
+    run_parameters, records = pingreader.read_ping_file(write_ping_file(tmp_path / "a.ping", line_ending=line_ending))
+    assert run_parameters.ship_name == "Leim"
+    assert run_parameters.transponder_depth == 5.5
+    assert run_parameters.number_of_pings == 0  # -1: until stopped
+
+    assert len(records) == 4
+    assert records["timestamp"].tolist() == [np.datetime64("2024-04-24T12:35:51", "s").item(),
+                                            np.datetime64("2024-04-24T12:35:56", "s").item(),
+                                            np.datetime64("2024-04-24T12:31:01", "s").item(),
+                                            np.datetime64("2024-04-24T16:36:06", "s").item()]
+    assert records["utc_offset_minutes"].tolist() == [-240, 0, 330, -240]
+
+    assert records["gps_datetime"][0] == np.datetime64("2024-04-24T12:35:51", "us")
+    assert records["gps_datetime"][1] == np.datetime64("2024-04-24T12:35:56.250000", "us")
+    assert np.isnat(records["gps_datetime"][2:]).all()  # a time without a date is not a datetime.
+
+    assert records["latitude"][:2] == pytest.approx([48 + 38.4572 / 60, -(48 + 38.4580 / 60)])
+    assert records["longitude"][:2] == pytest.approx([-(68 + 9.4211 / 60), 68 + 9.4200 / 60])
+    assert records["heading"][:2] == pytest.approx([274.07, 0.5])
+    for field in ("latitude", "longitude", "heading"):
+        assert np.isnan(records[field][2:]).all()
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = write_ping_file(tmp_path / "a.ping")
+    with open(path, "a") as f:
+        f.write("20240424T123611-0400, 2024-04-24\n\n")
+        f.write(format_data_line(ROWS[0]))  # interrupted before the line ending
+    _, records = pingreader.read_ping_file(path)
+    assert len(records) == 5
+    assert records["heading"][-1] == pytest.approx(274.07)
+
+
+def test_chunks_and_offsets(tmp_path):
+    path = write_ping_file(tmp_path / "a.ping", rows=ROWS * 50)
+    _, whole = pingreader.read_ping_file(path)
+    chunks = list(pingreader.iter_ping_chunks(path, chunk_size=1000, with_offsets=True))
+    assert len(chunks) > 1
+    records = np.concatenate([c[1] for c in chunks])
+    offsets = np.concatenate([c[2] for c in chunks])
+    np.testing.assert_array_equal(records.view(np.uint8), whole.view(np.uint8))
+
+    data = path.read_bytes()
+    for i in (0, 1, 77, 199):
+        line = data[offsets[i]:data.index(b"\n", offsets[i])].decode()
+        assert [v.strip() for v in line.split(",")] == ROWS[i % len(ROWS)]
+
+
+def test_matches_the_binary_file(tmp_path):
+    text_path = write_ping_file(tmp_path / "a.ping")
+    pingbinary.text_to_binary(text_path, tmp_path / "a.pingb")
+    metadata_lines, raw = pingbinary.load(tmp_path / "a.pingb")
+    _, records = pingreader.read_ping_file(text_path)
+
+    assert metadata_lines == HEADER
+    np.testing.assert_array_equal(raw["epoch_ns"] // 1_000_000_000, records["timestamp"].astype(np.int64))
+    np.testing.assert_array_equal(raw["utc_offset_minutes"], records["utc_offset_minutes"])
+    full_time = (raw["flags"] & pingbinary.FLAG_GPS_TIME) != 0
+    np.testing.assert_array_equal(full_time, ~np.isnat(records["gps_datetime"]))
+    np.testing.assert_array_equal(np.round(raw["gps_time"][full_time] * 1e6).astype(np.int64),
+                                  records["gps_datetime"][full_time].astype(np.int64))
+    for field in ("latitude", "longitude", "heading"):
+        np.testing.assert_allclose(raw[field], records[field], rtol=0, atol=1e-12, equal_nan=True)
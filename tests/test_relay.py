@@ -0,0 +1,41 @@
+import pytest
+
+from hydrophone_ping_gps_logger.clock import VirtualClock
+from hydrophone_ping_gps_logger.relay import (RelayBackend, RelayBackendType, SimulatedRelayBackend,
+                                              find_relay_device)
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        RelayBackend()
+
+
+def test_simulated_relay_switches_relays():
+    relay = SimulatedRelayBackend()
+    relay.open()
+    relay.send_report([0, 0xFF, 3, 0, 0, 0, 0, 0, 0])
+    assert relay.get_report()[8] == 0b100
+    relay.send_report([0, 0xFE, 0, 0, 0, 0, 0, 0, 0])
+    assert relay.get_report()[8] == 0xFF
+    relay.send_report([0, 0xFC, 0, 0, 0, 0, 0, 0, 0])
+    assert relay.get_report()[8] == 0
+
+
+def test_simulated_relay_latency_runs_on_the_clock():
+    clock = VirtualClock()
+    try:
+        relay = find_relay_device(0, 0, RelayBackendType.SIMULATED, clock=clock)
+        relay.latency = 10
+        relay.open()
+        start = clock.monotonic()
+        relay.send_report([0, 0xFF, 1, 0, 0, 0, 0, 0, 0])
+        relay.get_report()
+        assert clock.monotonic() - start == pytest.approx(20)
+    finally:
+        clock.close()
+
+
+def test_simulated_relay_closed_raises():
+    relay = SimulatedRelayBackend()
+    with pytest.raises(OSError):
+        relay.get_report()
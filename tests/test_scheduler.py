@@ -0,0 +1,84 @@
+import pytest
+
+from hydrophone_ping_gps_logger.clock import Clock
+from hydrophone_ping_gps_logger.scheduler import PingScheduler, MissedPingPolicy
+
+
+class SteppingClock(Clock):
+    """Single threaded: a timed wait moves the time to its end."""
+
+    def __init__(self, now: float = 100.):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def wait(self, condition, timeout: float = None) -> bool:
+        if timeout is None:
+            raise AssertionError("would wait forever")
+        self.now += timeout
+        return False
+
+    def notify_all(self, condition):
+        pass
+
+
+def scheduler(policy=MissedPingPolicy.SKIP, start_delay=0.):
+    clock = SteppingClock()
+    ping_scheduler = PingScheduler(interval=1., start_delay=start_delay, policy=policy, clock=clock)
+    ping_scheduler.start()
+    return ping_scheduler, clock
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        PingScheduler(interval=1., policy="later")
+
+
+def test_start_delay():
+    ping_scheduler, clock = scheduler(start_delay=5.)
+    assert ping_scheduler.time_until_start() == 5.
+    assert ping_scheduler.wait_next() == 105.
+    assert clock.now == 105.
+
+
+def test_deadlines_do_not_drift():
+    ping_scheduler, clock = scheduler()
+    deadlines = []
+    for _ in range(5):
+        deadlines.append(ping_scheduler.wait_next())
+        clock.now += 0.3  # ping and log
+    assert deadlines == [100., 101., 102., 103., 104.]
+
+
+def test_skip_fires_only_the_latest_missed_ping():
+    ping_scheduler, clock = scheduler(MissedPingPolicy.SKIP)
+    assert ping_scheduler.wait_next() == 100.
+    clock.now += 3.5
+    assert ping_scheduler.wait_next() == 103.
+    assert ping_scheduler.skipped_count == 2
+    assert ping_scheduler.wait_next() == 104.
+
+
+def test_catch_up_fires_every_missed_ping():
+    ping_scheduler, clock = scheduler(MissedPingPolicy.CATCH_UP)
+    assert ping_scheduler.wait_next() == 100.
+    clock.now += 3.5
+    assert [ping_scheduler.wait_next() for _ in range(4)] == [101., 102., 103., 104.]
+    assert ping_scheduler.skipped_count == 0
+    assert clock.now == 104.
+
+
+def test_resume_keeps_the_phase():
+    ping_scheduler, clock = scheduler(MissedPingPolicy.CATCH_UP)
+    assert ping_scheduler.wait_next() == 100.
+    ping_scheduler.pause()
+    clock.now += 10.4
+    ping_scheduler.resume()
+    assert ping_scheduler.wait_next() == 111.
+
+
+def test_stop():
+    ping_scheduler, _ = scheduler()
+    ping_scheduler.stop()
+    assert ping_scheduler.wait_next() is None
@@ -0,0 +1,20 @@
+import pytest
+
+from hydrophone_ping_gps_logger import simulation
+
+ARGS = ["--ping-interval", "2", "--number-of-pings", "20", "--start-time", "2024-04-24T12:00:00+00:00",
+        "--pause", "10", "5", "--turn-rate", "1"]
+
+
+@pytest.mark.parametrize("output_format, suffix", [("text", ".ping"), ("binary", ".pingb")])
+def test_same_arguments_same_ping_file(tmp_path, output_format, suffix):
+    contents = []
+    for run in ("first", "second"):
+        assert simulation.main(["--output-directory-path", str(tmp_path / run), "--output-format", output_format,
+                                *ARGS]) == 0
+        ping_files = list((tmp_path / run).glob(f"*{suffix}"))
+        assert [p.name for p in ping_files] == ["20240424120001_simulation" + suffix]
+        contents.append(ping_files[0].read_bytes())
+    assert contents[0] == contents[1]
+    if output_format == "text":
+        assert len(contents[0].decode().splitlines()) == 7 + 20
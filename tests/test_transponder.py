@@ -0,0 +1,97 @@
+import pytest
+
+from hydrophone_ping_gps_logger.clock import VirtualClock
+from hydrophone_ping_gps_logger.relay import RelayBackendType
+from hydrophone_ping_gps_logger.transponder import TransponderController, TransponderClient, RelayVerifyMode
+
+
+@pytest.fixture
+def clock():
+    clock = VirtualClock()
+    yield clock
+    clock.close()
+
+
+def simulated_transponder(clock: VirtualClock) -> TransponderController:
+    controller = TransponderController(clock=clock)
+    controller.connect(backend=RelayBackendType.SIMULATED)
+    assert controller.is_connected
+    return controller
+
+
+def relays_closed(controller: TransponderController) -> bool:
+    return controller.client.is_relay_on(controller.client.ALL_RELAYS)
+
+
+def test_relays_released_after_pulse_width(clock):
+    controller = simulated_transponder(clock)
+    with clock.participate():
+        ping_time = controller.ping(pulse_width=2)
+        assert ping_time == clock.monotonic()
+        assert relays_closed(controller) and controller.is_pulsing
+
+        clock.sleep(1.9)
+        assert relays_closed(controller)
+        assert controller.ping(pulse_width=2) is None  # previous pulse still active.
+
+        clock.sleep(0.2)
+        assert not relays_closed(controller) and not controller.is_pulsing
+        assert controller.ping(pulse_width=2) == clock.monotonic()
+        controller.disconnect()
+
+
+def test_disconnect_cancels_the_release(clock):
+    controller = simulated_transponder(clock)
+    with clock.participate():
+        controller.ping(pulse_width=5)
+        controller.disconnect()  # opens the relays itself.
+        assert not controller.is_pulsing
+        clock.sleep(10)
+    assert not controller.client.device.relays[0]
+
+
+def simulated_client(verify_mode: str, **relay) -> TransponderClient:
+    client = TransponderClient()
+    client.verify_mode = verify_mode
+    client.get_device(backend=RelayBackendType.SIMULATED)
+    for name, value in relay.items():
+        setattr(client.device, name, value)
+    assert client.open_device()
+    return client
+
+
+def test_verify_reports_a_command_that_did_not_switch_the_relays():
+    client = simulated_client(RelayVerifyMode.ALWAYS, ignore_rate=1)
+    assert client.on_all() is False
+    assert client.read_latency.count == 1
+
+
+def test_failed_verify_refuses_the_ping(clock):
+    controller = simulated_transponder(clock)
+    controller.client.device.ignore_rate = 1
+    assert controller.ping() is None
+    assert not controller.is_pulsing
+
+
+def test_verify_every_n_commands():
+    client = simulated_client(RelayVerifyMode.EVERY_N, ignore_rate=1)
+    client.verify_every = 3
+    assert [client.on_all() for _ in range(6)] == [True, True, False, True, True, False]
+    assert client.read_latency.count == 2
+
+
+def test_verify_on_error_only_reads_back_after_a_failed_send():
+    client = simulated_client(RelayVerifyMode.ON_ERROR)
+    assert client.on_all() is True
+    assert client.read_latency.count == 0
+
+    client.device.fault_rate = 0.5
+    client.device.random.seed(1)  # the send fails, the read back goes through.
+    assert client.off_all() is False  # reported: the relays are still on.
+    assert client.read_latency.count == 1
+
+
+def test_send_failure_is_raised_when_verifying():
+    client = simulated_client(RelayVerifyMode.ALWAYS, fault_rate=1)
+    with pytest.raises(OSError):
+        client.on_all()